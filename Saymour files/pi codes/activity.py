@@ -0,0 +1,316 @@
+"""
+Idle mode: scale sensing and inference down while the user stands still.
+
+Standing at a crossing for a minute, the control loop would still range
+three ultrasonics at the full loop rate and the detector would still run
+the model on every frame. Here an activity detector watches cheap motion
+evidence and drops the system into a low-power state after IDLE_AFTER
+seconds without any:
+
+  * ultrasonic    - smoothed rate of change of the ranges (RangeMotion),
+                    fed by main_combined.py
+  * camera        - mean absolute difference of small greyscale frames
+                    (FrameMotion), fed by yolo_detect.py
+  * imu           - acceleration away from 1 g or rotation (ImuMotion),
+                    for an IMU reader to feed; none is wired in by default
+
+The processes share the time of the last motion per source through a small
+shared-memory block (ActivityBoard), so a person walking into the camera
+view also wakes the control loop, and ranges starting to change wake the
+detector. While idle:
+
+  * main_combined.py ticks every idle_loop_interval, skips the fuzzy
+    controllers and keeps the motor and servo PWM off
+  * yolo_detect.py takes a frame every idle_frame_interval for the frame
+    differencing and runs the model only every idle_infer_interval
+
+Motion is therefore noticed within one idle tick or idle frame, which bounds
+the wake-up latency (wake_bound()). Single 8-byte stores and loads are
+atomic on the Pi, so the board needs no seqlock.
+
+EnergyMeter estimates the energy of the work a process gates, from counted
+work (pings, frames, inferences) and held outputs (servo pulses), and
+reports it per hour of use against the same process running always-on.
+The per-unit figures below are bench estimates for a Pi 5 with an SG90
+servo and HC-SR04 sensors; measure with a USB power meter to refine them.
+"""
+import collections
+import math
+import time
+
+import numpy as np
+
+from shm_util import REATTACH_AFTER, attach_shm, create_shm, shm_inode
+from telemetry import counter, gauge
+
+# --- Constants -------------------------------------------------------
+SHM_NAME        = 'saymour_activity'
+SOURCES         = ('ultrasonic', 'camera', 'imu')
+IDLE_AFTER      = 20.0      # s without motion before going idle
+IDLE_FRAME_INTERVAL = 0.2   # s between detector frames while idle
+IDLE_INFER_INTERVAL = 2.0   # s between inferences while idle
+RANGE_RATE_CM_S = 12.0      # smoothed range change that counts as motion
+RANGE_ALPHA     = 0.5       # EMA weight of the newest rate
+FRAME_DIFF      = 0.04      # mean abs difference (0-1) of the small frames that counts as motion
+FRAME_SMALL     = (64, 48)  # frame size compared
+IMU_ACCEL_MS2   = 0.8       # |a| away from gravity that counts as motion
+IMU_GYRO_DPS    = 15.0      # rotation rate that counts as motion
+GRAVITY         = 9.81
+
+# Energy per unit of work (J) and power of held outputs (W)
+UNIT_J = {
+    'ping':      0.004,     # one HC-SR04 ranging with its 50 ms settle (~75 mW)
+    'tick':      0.010,     # controllers + PWM update on one core
+    'frame':     0.020,     # capture, colour convert, frame difference
+    'inference': 0.900,     # one NCNN inference at 640 px on 3 cores (~3.5 W for ~0.25 s)
+}
+HOLD_W = {
+    'servo':     0.6,       # SG90 holding its position under 50 Hz pulses
+}
+
+
+class ActivityBoard:
+    """
+    Last motion time per source, shared between the processes. A board that
+    attached to another process's block checks every REATTACH_AFTER s that
+    the block is still the named one, and follows a restarted owner.
+    """
+
+    def __init__(self, create=False, name=SHM_NAME):
+        self.name = name
+        self.owner = create
+        self.shm = None
+        self.slots = None
+        self.inode = None
+        self.t_check = 0.0
+        if create:
+            self.shm = create_shm(name, 8 * len(SOURCES))
+            self.slots = np.ndarray((len(SOURCES),), dtype=np.int64, buffer=self.shm.buf)
+            self.slots[:] = 0
+
+    def _attach(self):
+        try:
+            self.shm = attach_shm(self.name)
+        except FileNotFoundError:
+            return False
+        self.inode = shm_inode(self.name)
+        self.slots = np.ndarray((len(SOURCES),), dtype=np.int64, buffer=self.shm.buf)
+        self.t_check = time.monotonic()
+        return True
+
+    def _ready(self):
+        """Attach if needed, or again if the owner has replaced the block; False while there is none."""
+        if self.slots is None:
+            return self._attach()
+        if self.owner:
+            return True
+        now = time.monotonic()
+        if now - self.t_check >= REATTACH_AFTER:
+            self.t_check = now
+            if shm_inode(self.name) != self.inode:
+                self.close()
+                return self._attach()
+        return True
+
+    def mark(self, source, t_ns):
+        if self._ready():
+            self.slots[SOURCES.index(source)] = t_ns
+
+    def last(self):
+        """Latest motion time over all sources (ns), or 0 when nothing is published yet."""
+        if not self._ready():
+            return 0
+        return int(self.slots.max())
+
+    def close(self):
+        if self.shm is not None:
+            del self.slots
+            self.slots = None
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+            self.shm = None
+
+
+class ActivityDetector:
+    """Active/idle state from the motion reported by this process and the board."""
+
+    def __init__(self, process, idle_after=IDLE_AFTER, board=None, log=print):
+        self.process = process
+        self.idle_after_ns = int(idle_after * 1e9)
+        self.board = board
+        self.log = log
+        self.last_motion = time.monotonic_ns()     # start active
+        self.idle = False
+        self.m_idle = gauge('saymour_activity_idle', '1 while the process is in idle mode',
+                            {'process': process})
+        self.m_changes = {state: counter('saymour_activity_transitions_total', 'Idle/active changes',
+                                         {'process': process, 'state': state})
+                          for state in ('idle', 'active')}
+
+    def motion(self, source, t_ns=None):
+        t_ns = time.monotonic_ns() if t_ns is None else t_ns
+        self.last_motion = max(self.last_motion, t_ns)
+        if self.board is not None:
+            self.board.mark(source, t_ns)
+
+    def update(self, now_ns=None):
+        """The state for this tick/frame; logs the transitions. Returns True while idle."""
+        now_ns = time.monotonic_ns() if now_ns is None else now_ns
+        last = self.last_motion
+        if self.board is not None:
+            last = max(last, self.board.last())
+        idle = now_ns - last > self.idle_after_ns
+        if idle != self.idle:
+            self.idle = idle
+            state = 'idle' if idle else 'active'
+            self.m_idle.set(int(idle))
+            self.m_changes[state].inc()
+            self.log(f"ACTIVITY: {state}", flush=True)
+        return idle
+
+
+class RangeMotion:
+    """Motion from the rate of change of a set of ultrasonic ranges."""
+
+    def __init__(self, threshold=RANGE_RATE_CM_S, alpha=RANGE_ALPHA):
+        self.threshold = threshold
+        self.alpha = alpha
+        self.prev = None
+        self.t_prev = None
+        self.rate = 0.0
+
+    def update(self, ranges, now=None):
+        """:param ranges: latest readings in cm (a missed echo may repeat the previous value)"""
+        now = time.monotonic() if now is None else now
+        if self.prev is not None and now > self.t_prev:
+            dt = now - self.t_prev
+            rate = max(abs(r - p) for r, p in zip(ranges, self.prev)) / dt
+            self.rate += self.alpha * (rate - self.rate)
+        self.prev = tuple(ranges)
+        self.t_prev = now
+        return self.rate > self.threshold
+
+
+class FrameMotion:
+    """Motion from the difference between consecutive small greyscale frames."""
+
+    def __init__(self, threshold=FRAME_DIFF, size=FRAME_SMALL):
+        self.threshold = threshold
+        self.size = size
+        self.prev = None
+        self.diff = 0.0
+
+    def update(self, frame):
+        import cv2
+        # every step-th pixel still leaves twice the compared size to average over
+        w, h = self.size
+        step = max(1, min(frame.shape[0] // (2 * h), frame.shape[1] // (2 * w)))
+        small = cv2.resize(frame[::step, ::step], self.size, interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.prev is None:
+            self.prev = small
+            return False
+        self.diff = float(cv2.absdiff(small, self.prev).mean()) / 255.0
+        self.prev = small
+        return self.diff > self.threshold
+
+
+class ImuMotion:
+    """Motion from accelerometer (m/s²) and gyroscope (°/s) samples."""
+
+    def __init__(self, accel=IMU_ACCEL_MS2, gyro=IMU_GYRO_DPS):
+        self.accel = accel
+        self.gyro = gyro
+
+    def update(self, accel_xyz, gyro_xyz=None):
+        moving = abs(math.hypot(*accel_xyz) - GRAVITY) > self.accel
+        if gyro_xyz is not None:
+            moving = moving or math.hypot(*gyro_xyz) > self.gyro
+        return moving
+
+
+def wake_bound(idle_interval, work=0.0):
+    """Worst case from motion to the state going active: one idle period plus its work."""
+    return idle_interval + work
+
+
+class EnergyMeter:
+    """Estimated energy of the gated work, against the same process always-on."""
+
+    def __init__(self, process, unit_j=UNIT_J, hold_w=HOLD_W):
+        self.process = process
+        self.unit_j = unit_j
+        self.hold_w = hold_w
+        self.idle = False
+        self.last = time.monotonic()
+        self.seconds = {False: 0.0, True: 0.0}
+        self.units = {False: collections.Counter(), True: collections.Counter()}
+        self.held = {False: collections.Counter(), True: collections.Counter()}
+        self.holding = set()
+        self.m_power = {mode: gauge('saymour_energy_wh_per_hour', 'Estimated energy per hour of use',
+                                    {'process': process, 'mode': mode})
+                        for mode in ('actual', 'baseline')}
+
+    def _advance(self, now=None):
+        now = time.monotonic() if now is None else now
+        dt = now - self.last
+        self.last = now
+        self.seconds[self.idle] += dt
+        for kind in self.holding:
+            self.held[self.idle][kind] += dt
+
+    def set_idle(self, idle, now=None):
+        if idle != self.idle:
+            self._advance(now)
+            self.idle = idle
+
+    def add(self, kind, n=1):
+        self.units[self.idle][kind] += n
+
+    def hold(self, kind, on, now=None):
+        """Mark an output (e.g. 'servo') as drawing power from now on, or not."""
+        if on != (kind in self.holding):
+            self._advance(now)
+            if on:
+                self.holding.add(kind)
+            else:
+                self.holding.discard(kind)
+
+    def report(self, now=None):
+        """
+        :return: dict with hours, idle_fraction, actual and baseline Wh per
+            hour of use, and saving (fraction of the baseline)
+        """
+        self._advance(now)
+        active, idle = self.seconds[False], self.seconds[True]
+        total = active + idle
+        actual = sum(n * self.unit_j.get(kind, 0.0) for state in (False, True)
+                     for kind, n in self.units[state].items())
+        actual += sum(s * self.hold_w.get(kind, 0.0) for state in (False, True)
+                      for kind, s in self.held[state].items())
+        if active > 0:
+            # always-on: the active rates for the whole run
+            baseline = sum(n / active * total * self.unit_j.get(kind, 0.0)
+                           for kind, n in self.units[False].items())
+            baseline += sum(s / active * total * self.hold_w.get(kind, 0.0)
+                            for kind, s in self.held[False].items())
+        else:
+            baseline = actual
+        actual_w = actual / total if total > 0 else 0.0
+        baseline_w = baseline / total if total > 0 else 0.0
+        self.m_power['actual'].set(actual_w)
+        self.m_power['baseline'].set(baseline_w)
+        return {
+            'hours': total / 3600.0,
+            'idle_fraction': idle / total if total > 0 else 0.0,
+            'actual_wh_per_hour': actual_w,
+            'baseline_wh_per_hour': baseline_w,
+            'saving': 1.0 - actual / baseline if baseline > 0 else 0.0,
+        }
+
+    def format(self, now=None):
+        r = self.report(now)
+        return (f"energy {self.process}: {r['actual_wh_per_hour']:.2f} Wh/h vs "
+                f"{r['baseline_wh_per_hour']:.2f} Wh/h always-on ({r['saving']:.0%} less), "
+                f"idle {r['idle_fraction']:.0%} of {r['hours'] * 60:.1f} min")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Offline batch inference over an image folder or a video file.
+
+The interactive loop in yolo_detect.py shows every frame and waits on the
+keyboard; for re-labelling or evaluating thousands of field captures this
+runs headless instead:
+
+  * the frames are cut into chunks (CHUNK_FRAMES images, or a frame range
+    of the video) and handed to a process pool, one model per worker
+  * in each worker a read-ahead thread decodes the chunk while the model
+    runs on the previous batch
+  * the model is called on BATCH frames at a time; NCNN exports are
+    single-image models, so they are called per frame and the parallelism
+    comes from the workers alone
+  * the thread budget is split across workers so they do not fight over cores
+
+Detections are written column by column to one .npz file:
+
+    frame (int32), cls (int16), conf (float32), xyxy (float32, N x 4),
+    names (class names by index), paths (image path per frame, folders only)
+
+    python batch_infer.py --model best_ncnn_model --source captures/ --output captures.npz
+    python yolo_detect.py --model best_ncnn_model --source field.mp4 --offline
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+# --- Constants -------------------------------------------------------
+CHUNK_FRAMES = 64       # frames per task handed to a worker
+BATCH        = 8        # frames per model call (1 for NCNN models)
+READ_AHEAD   = 16       # decoded frames buffered ahead of the model per worker
+OUTPUT       = 'detections.npz'
+
+# per-worker state, set up by _init_worker
+_model = None
+_threads = 1
+_ncnn_threads_set = False
+
+
+def is_ncnn(model_path):
+    return model_path.rstrip('/').endswith('_ncnn_model')
+
+
+def plan_chunks(n_frames, chunk=CHUNK_FRAMES):
+    """[(start, stop), ...] covering frames 0..n_frames-1."""
+    return [(start, min(start + chunk, n_frames)) for start in range(0, n_frames, chunk)]
+
+
+def _init_worker(model_path, threads):
+    global _model, _threads
+    # keep per-worker pools small; the pool supplies the parallelism
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    from resource_plan import set_library_threads
+    set_library_threads(threads)
+    from ultralytics import YOLO
+    _model = YOLO(model_path, task='detect')
+    _threads = threads
+
+
+def _read_frames(source_type, source, paths, start, stop, out):
+    """Decode frames start..stop-1 into `out`, then a None sentinel. paths[0] is frame `start`."""
+    import cv2
+    try:
+        if source_type == 'video':
+            cap = cv2.VideoCapture(source)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            for index in range(start, stop):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.put((index, frame))
+            cap.release()
+        else:
+            for index in range(start, stop):
+                frame = cv2.imread(paths[index - start])
+                if frame is not None:
+                    out.put((index, frame))
+    finally:
+        out.put(None)
+
+
+def _run_chunk(task):
+    """Worker: infer one chunk. Returns (columns dict, frames read, class names)."""
+    global _ncnn_threads_set
+    from resource_plan import set_ncnn_threads
+    from yolo_detect import extract_detections
+
+    source_type, source, paths, start, stop, batch, imgsz, thresh, class_thresh = task
+    frames = queue.Queue(maxsize=READ_AHEAD)
+    reader = threading.Thread(target=_read_frames,
+                              args=(source_type, source, paths, start, stop, frames), daemon=True)
+    reader.start()
+
+    names = _model.names
+    cols = {'frame': [], 'cls': [], 'conf': [], 'xyxy': []}
+    n_read = 0
+    done = False
+    kwargs = {'verbose': False}
+    if imgsz:
+        kwargs['imgsz'] = imgsz
+    while not done:
+        indices, images = [], []
+        while len(images) < batch:
+            item = frames.get()
+            if item is None:
+                done = True
+                break
+            indices.append(item[0])
+            images.append(item[1])
+        if not images:
+            break
+        n_read += len(images)
+        results = _model(images if len(images) > 1 else images[0], **kwargs)
+        if not _ncnn_threads_set:
+            # the NCNN net only exists after the first call
+            set_ncnn_threads(_model, _threads)
+            _ncnn_threads_set = True
+        for index, result in zip(indices, results):
+            xyxy, conf, cls = extract_detections(result)
+            limit = np.array([class_thresh.get(names[int(c)], thresh) for c in cls]) if class_thresh else thresh
+            keep = conf > limit
+            cols['frame'].append(np.full(int(keep.sum()), index, dtype=np.int32))
+            cols['cls'].append(cls[keep].astype(np.int16))
+            cols['conf'].append(conf[keep].astype(np.float32))
+            cols['xyxy'].append(xyxy[keep].astype(np.float32).reshape(-1, 4))
+    reader.join()
+    return cols, n_read, names
+
+
+def _concat(parts, key, dtype, shape=(0,)):
+    arrays = [a for part in parts for a in part[key]]
+    return np.concatenate(arrays).astype(dtype) if arrays else np.zeros(shape, dtype=dtype)
+
+
+def count_frames(source_type, source, paths):
+    if source_type == 'video':
+        import cv2
+        cap = cv2.VideoCapture(source)
+        n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        return n
+    return len(paths)
+
+
+def run_offline(model_path, source, output=OUTPUT, workers=None, batch=BATCH, imgsz=None,
+                thresh=0.5, class_thresh=None, chunk=CHUNK_FRAMES, log=print):
+    """
+    Run the model over every frame of `source` (image, folder or video) and
+    write the detections to `output`. Returns the throughput in images/s.
+    """
+    import multiprocessing
+    from yolo_detect import detect_source_type, list_images
+
+    source_type, _ = detect_source_type(source)
+    if source_type not in ('image', 'folder', 'video'):
+        raise ValueError(f"offline mode needs an image, folder or video, not {source_type}")
+    paths = sorted(list_images(source)) if source_type == 'folder' else \
+        [source] if source_type == 'image' else []
+    n_frames = count_frames(source_type, source, paths)
+    if n_frames == 0:
+        raise ValueError(f"no frames found in {source}")
+
+    cores = len(os.sched_getaffinity(0))
+    workers = max(1, min(workers or cores, n_frames))
+    threads = max(1, cores // workers)
+    if is_ncnn(model_path):
+        batch = 1
+    chunks = plan_chunks(n_frames, chunk)
+    tasks = [(source_type, source, paths[start:stop], start, stop, batch, imgsz, thresh, class_thresh)
+             for start, stop in chunks]
+    log(f"Offline: {n_frames} frames in {len(chunks)} chunks, {workers} workers x {threads} threads, "
+        f"batch {batch}")
+
+    t0 = time.perf_counter()
+    parts = []
+    names = {}
+    done = 0
+    ctx = multiprocessing.get_context('spawn')     # no fork of a loaded model or camera
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(model_path, threads)) as pool:
+        for cols, n_read, names in pool.imap_unordered(_run_chunk, tasks):
+            parts.append(cols)
+            done += n_read
+            elapsed = time.perf_counter() - t0
+            log(f"  {done}/{n_frames} frames, {done / elapsed:.1f} images/s")
+    elapsed = time.perf_counter() - t0
+
+    frame = _concat(parts, 'frame', np.int32)
+    order = np.argsort(frame, kind='stable')
+    np.savez_compressed(
+        output,
+        frame=frame[order],
+        cls=_concat(parts, 'cls', np.int16)[order],
+        conf=_concat(parts, 'conf', np.float32)[order],
+        xyxy=_concat(parts, 'xyxy', np.float32, (0, 4))[order],
+        names=np.array([names[i] for i in sorted(names)]),
+        paths=np.array(paths),
+    )
+    rate = done / elapsed if elapsed > 0 else float('inf')
+    log(f"Wrote {len(frame)} detections for {done} frames to {output}: "
+        f"{rate:.1f} images/s ({elapsed:.1f} s)")
+    return rate
+
+
+def main():
+    from hazards import CLASS_THRESHOLDS
+    parser = argparse.ArgumentParser(description='Offline batch inference over a folder or video')
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--source', required=True, help='image, image folder or video file')
+    parser.add_argument('--output', default=OUTPUT, help='columnar results file (.npz)')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: one per core)')
+    parser.add_argument('--batch', type=int, default=BATCH, help='frames per model call (NCNN: always 1)')
+    parser.add_argument('--imgsz', type=int, default=None, help='model input size')
+    parser.add_argument('--thresh', type=float, default=0.5)
+    args = parser.parse_args()
+    try:
+        run_offline(args.model, args.source, args.output, args.workers, args.batch,
+                    args.imgsz, args.thresh, CLASS_THRESHOLDS)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Timing of the detection pipeline around the model: frame read and
+pre-processing as done for the folder and picamera sources, and the
+threshold/draw/report post-processing, plus idle mode's frame
+differencing. The model itself is not run, so no
+weights or camera are needed.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from timing import time_per_call
+
+
+def _make_folder(rng, folder, n_images, size):
+    import cv2
+    w, h = size
+    for i in range(n_images):
+        img = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        cv2.imwrite(os.path.join(folder, f'frame_{i:04d}.jpg'), img)
+
+
+def _fake_detections(rng, n_boxes, size, n_classes):
+    w, h = size
+    x0 = rng.integers(0, w // 2, n_boxes)
+    y0 = rng.integers(0, h // 2, n_boxes)
+    x1 = x0 + rng.integers(20, w // 2, n_boxes)
+    y1 = y0 + rng.integers(20, h // 2, n_boxes)
+    xyxy = np.stack([x0, y0, x1, y1], axis=1)
+    conf = rng.uniform(0.2, 1.0, n_boxes)
+    cls = rng.integers(0, n_classes, n_boxes)
+    return xyxy, conf, cls
+
+
+def run(images=None, n_images=30, n_boxes=8, source_size=(1920, 1080), display_size=(1280, 720),
+        min_thresh=0.5, seed=0):
+    try:
+        import cv2
+        import yolo_detect
+    except ImportError as e:
+        return {}, {'detection': str(e)}
+
+    rng = np.random.default_rng(seed)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = images
+        if folder is None:
+            folder = tmp
+            _make_folder(rng, folder, n_images, source_size)
+        imgs_list = sorted(yolo_detect.list_images(folder))
+        if not imgs_list:
+            return {}, {'detection': f'no images found in {folder}'}
+
+        # Folder source: imread + resize to the display resolution
+        def read_folder_frame(path):
+            frame = cv2.imread(path)
+            return yolo_detect.preprocess_frame(frame, 'folder', display_size)
+        results['detection.folder_read_preprocess'] = time_per_call(
+            read_folder_frame, [(p,) for p in imgs_list])
+
+        frames = [cv2.imread(p) for p in imgs_list]
+
+    # Picamera source: XRGB8888 frame at the display resolution, colour convert only
+    w, h = display_size
+    bgra = [rng.integers(0, 256, (h, w, 4), dtype=np.uint8) for _ in range(len(frames))]
+    results['detection.picamera_preprocess'] = time_per_call(
+        lambda f: yolo_detect.preprocess_frame(f, 'picamera', None), [(f,) for f in bgra])
+
+    # Post-processing: threshold, draw boxes and labels, format DETECT lines
+    labels = {0: 'Car', 1: 'Motorcycle', 2: 'Person', 3: 'Stairs'}
+    dets = [_fake_detections(rng, n_boxes, display_size, len(labels)) for _ in frames]
+    display_frames = [yolo_detect.preprocess_frame(f, 'folder', display_size) for f in frames]
+
+    def postprocess(frame, det):
+        kept = yolo_detect.filter_detections(*det, labels, min_thresh)
+        yolo_detect.draw_detections(frame, kept)
+        return [f"DETECT:{classname}" for classname, _, _, _ in kept]
+    results['detection.postprocess'] = time_per_call(
+        postprocess, list(zip(display_frames, dets)))
+
+    # Cue planning on the same detections: track matching, scoring, rate limit
+    from cue_planner import CuePlanner
+    planner = CuePlanner()
+    kept = [yolo_detect.filter_detections(*det, labels, min_thresh) for det in dets]
+    results['detection.cue_plan'] = time_per_call(
+        lambda k: planner.update(k, w, h), [(k,) for k in kept])
+
+    # Idle mode's frame differencing, run on every frame while idle (activity.py)
+    from activity import FrameMotion
+    motion = FrameMotion()
+    results['detection.frame_motion'] = time_per_call(motion.update, [(f,) for f in display_frames])
+
+    return results, {}
@@ -0,0 +1,112 @@
+"""
+Timing of the fuzzy controllers' compute/evaluate paths, one call at a time
+(latency) and back to back (throughput). The steering FIS is timed without
+its memo cache, and through the cache on corridor-like readings that hover
+in a few-centimetre band. The Sugeno fits (sugeno.py) are timed the same way,
+with their approximation error recorded next to the timings. The occupancy
+grid (occupancy.py) is timed per 50 Hz control tick: dead-reckoned move,
+three echoes and the steering queries. Wang-Mendel rule learning
+(rule_learning.py) is timed on LEARN_SAMPLES logged samples per call.
+"""
+import numpy as np
+
+from timing import time_per_call, time_batch
+
+LEARN_SAMPLES = 200_000
+
+
+def _distance_inputs(rng, n):
+    dist = rng.uniform(0, 80, n)
+    delta = rng.uniform(-40, 40, n)
+    return [(float(d), float(dd)) for d, dd in zip(dist, delta)]
+
+
+def _steer_inputs(rng, n):
+    left = rng.uniform(0, 80, n)
+    right = rng.uniform(0, 80, n)
+    return [([float(l), float(r)],) for l, r in zip(left, right)]
+
+
+def _corridor_inputs(rng, n, left=40.0, right=45.0, band=3.0):
+    return [(float(l), float(r)) for l, r in
+            zip(left + rng.uniform(-band, band, n), right + rng.uniform(-band, band, n))]
+
+
+def _bench(results, name, fn, inputs, batch_inputs):
+    results[name + '.per_call'] = time_per_call(fn, inputs)
+    results[name + '.batch'] = time_batch(fn, batch_inputs)
+
+
+def run(n_calls=200, n_batch=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    results = {}
+    skipped = {}
+
+    try:
+        from fuzzy_controller_dist import FuzzyForDistance as SkfuzzyDistance
+    except ImportError as e:
+        skipped['fuzzy_controller_dist'] = str(e)
+    else:
+        ctrl = SkfuzzyDistance()
+        _bench(results, 'fuzzy_controller_dist.FuzzyForDistance.compute', ctrl.compute,
+               _distance_inputs(rng, n_calls), _distance_inputs(rng, n_batch))
+
+    from fuzzydisttest import FuzzyForDistance as MamdaniDistance
+    ctrl = MamdaniDistance()
+    _bench(results, 'fuzzydisttest.FuzzyForDistance.compute', ctrl.compute,
+           _distance_inputs(rng, n_calls), _distance_inputs(rng, n_batch))
+
+    from fuzzysteertest import FuzzyForSteering
+    fis = FuzzyForSteering(cache_size=0).fis
+    _bench(results, 'fuzzysteertest.MamdaniFIS.evaluate', fis.evaluate,
+           _steer_inputs(rng, n_calls), _steer_inputs(rng, n_batch))
+
+    steering = FuzzyForSteering()
+    _bench(results, 'fuzzysteertest.FuzzyForSteering.compute.corridor_cached', steering.compute,
+           _corridor_inputs(rng, n_calls), _corridor_inputs(rng, n_batch))
+    info = steering.fis.cache_info()
+    results['fuzzysteertest.FuzzyForSteering.compute.corridor_cached.batch']['hit_rate'] = \
+        info.hits / max(1, info.hits + info.misses)
+
+    import sugeno
+    for order in (0, 1):
+        steer = sugeno.steering_controller(order)
+        name = f'sugeno.steering.order{order}.compute'
+        _bench(results, name, steer.compute,
+               [tuple(args[0]) for args in _steer_inputs(rng, n_calls)],
+               [tuple(args[0]) for args in _steer_inputs(rng, n_batch)])
+        results[name + '.batch']['fit_error'] = steer.fis.fit_error
+    if 'fuzzy_controller_dist' not in skipped:
+        dist = sugeno.distance_controller()
+        name = 'sugeno.distance.order1.compute'
+        _bench(results, name, dist.compute, _distance_inputs(rng, n_calls), _distance_inputs(rng, n_batch))
+        results[name + '.batch']['fit_error'] = dist.fis.fit_error
+
+    from occupancy import OccupancyGrid, odometry
+    grid = OccupancyGrid()
+    clock = [0.0]
+
+    def grid_tick(front, left, right, servo):
+        grid.move(*odometry(0.5, 0.5, servo, 0.02))
+        clock[0] += 0.02
+        grid.update({'front': front, 'left': left, 'right': right}, clock[0])
+        grid.sector_ranges()
+        return grid.free_direction()
+
+    def grid_inputs(n):
+        return [(float(f), float(l), float(r), float(a)) for f, l, r, a in
+                zip(rng.uniform(20, 250, n), rng.uniform(5, 80, n), rng.uniform(5, 80, n),
+                    rng.uniform(-30, 30, n))]
+    _bench(results, 'occupancy.grid_tick', grid_tick, grid_inputs(n_calls), grid_inputs(n_batch))
+
+    from fuzzydisttest import FuzzyForDistance
+    from rule_learning import learn_rules, template
+    blank = template(FuzzyForDistance().to_fis(), (7, 7, 5))
+    dist = rng.uniform(0, 80, LEARN_SAMPLES)
+    delta = rng.normal(0, 12, LEARN_SAMPLES)
+    speed = np.clip(dist / 80 * 2.93 + delta / 40 + rng.normal(0, 0.1, LEARN_SAMPLES), 0, 2.93)
+    name = 'rule_learning.learn_rules'
+    results[name + '.per_call'] = time_per_call(learn_rules, [(blank, dist, delta, speed)] * 5, warmup=1)
+    results[name + '.per_call']['samples_per_s'] = LEARN_SAMPLES / (results[name + '.per_call']['mean_us'] * 1e-6)
+
+    return results, skipped
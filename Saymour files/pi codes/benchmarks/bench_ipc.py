@@ -0,0 +1,150 @@
+"""
+Round-trip latency of the stdout pipe path in run_all_final: a child
+process prints a line, monitor_yolo/monitor_ctrl read it and forward the
+command over a socket, and the benchmark reads it back off the socket.
+A local socketpair stands in for the ESP32. The hazard case sends a
+HAZARD line, which takes the outbox's priority lane; the cue case goes
+through the outbox's latest-only cue slot. The traced case carries a
+tracing.py context, which the monitor strips and hands to the link.
+
+The esp_link cases time one line from the Pi's EspServer to an esp_sim.py
+stand-in over loopback TCP, in the text and framed formats; the framed
+case also reports the send-to-ack latency the Pi records per command.
+"""
+import contextlib
+import io
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from esp_link import EspLink
+from timing import summarize
+from tracing import SEPARATOR
+
+# Child that answers every line on stdin with one canned line on stdout
+ECHO_CHILD = (
+    "import sys\n"
+    "reply = sys.argv[1]\n"
+    "for _ in sys.stdin:\n"
+    "    print(reply, flush=True)\n"
+)
+
+# case -> (monitor, line the child prints)
+CASES = {
+    'monitor_yolo': ('monitor_yolo', "DETECT:Person"),
+    'monitor_ctrl': ('monitor_ctrl', " Left: 30.0cm | Right: 42.0cm → angle=12.5°, duty=8.6%"),
+    'monitor_yolo.hazard': ('monitor_yolo', "HAZARD:Stairs:0"),
+    'monitor_yolo.cue': ('monitor_yolo', "CUE:Car_C3"),
+    'monitor_yolo.traced': ('monitor_yolo', "DETECT:Person" + SEPARATOR +
+                            "detect 1 capture=1000 convert=2000 infer=3000 emit=4000"),
+}
+
+
+def _recv_line(sock, buf):
+    while b"\n" not in buf:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("socket closed")
+        buf += chunk
+    line, _, rest = buf.partition(b"\n")
+    return line, rest
+
+
+def _round_trips(case, n):
+    import run_all_final
+
+    monitor_name, child_line = CASES[case]
+    proc = subprocess.Popen(
+        [sys.executable, "-c", ECHO_CHILD, child_line],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
+    )
+    pi_side, esp_side = socket.socketpair()
+    if monitor_name == 'monitor_yolo':
+        run_all_final.yolo_proc = proc
+    else:
+        run_all_final.ctrl_proc = proc
+    link = EspLink(pi_side, on_line=lambda line: None, framed=False).start()
+    run_all_final.outbox = run_all_final.Outbox(link)
+
+    monitor = threading.Thread(target=getattr(run_all_final, monitor_name), daemon=True)
+    samples = []
+    buf = b""
+    sink = io.StringIO()
+    # The monitors print every line they forward; keep that out of the report
+    with contextlib.redirect_stdout(sink):
+        try:
+            monitor.start()
+            for _ in range(n):
+                t0 = time.perf_counter()
+                proc.stdin.write("go\n")
+                proc.stdin.flush()
+                line, buf = _recv_line(esp_side, buf)
+                samples.append(time.perf_counter() - t0)
+                if SEPARATOR.encode() in line:
+                    raise ValueError(f"trace context reached the ESP32: {line!r}")
+                # keep the capture buffer from growing without bound
+                sink.seek(0)
+                sink.truncate()
+        finally:
+            proc.stdin.close()
+            proc.wait()
+            monitor.join(timeout=1.0)
+            run_all_final.outbox.close()
+            link.close()
+            esp_side.close()
+            run_all_final.outbox = None
+            run_all_final.yolo_proc = None
+            run_all_final.ctrl_proc = None
+    return summarize(samples[5:] if len(samples) > 10 else samples)
+
+
+def _link_latency(framed, n):
+    import esp_link
+    from esp_sim import EspSimulator
+
+    arrived = threading.Event()
+    server = esp_link.EspServer('127.0.0.1', 0, on_line=lambda line: None)
+    sim = EspSimulator('127.0.0.1', server.port, framed=framed, on_line=lambda line: arrived.set())
+    samples = []
+    acks_before = sum(esp_link.M_CMD_LATENCY.counts)
+    ack_sum_before = esp_link.M_CMD_LATENCY.sum
+    with contextlib.redirect_stdout(io.StringIO()):
+        server.start()
+        sim.start()
+        try:
+            server.wait_connected(2.0)
+            sim.connected.wait(2.0)
+            for _ in range(n):
+                arrived.clear()
+                t0 = time.perf_counter()
+                server.send_line("STEER:LEFT")
+                if not arrived.wait(1.0):
+                    raise ConnectionError("line never arrived")
+                samples.append(time.perf_counter() - t0)
+            time.sleep(0.05)    # let the last acks come back
+        finally:
+            sim.close()
+            server.close()
+    acks = sum(esp_link.M_CMD_LATENCY.counts) - acks_before
+    extra = {}
+    if acks:
+        extra['ack_mean_us'] = (esp_link.M_CMD_LATENCY.sum - ack_sum_before) / acks * 1e6
+    stats = summarize(samples[5:] if len(samples) > 10 else samples)
+    stats.update(extra)
+    return stats
+
+
+def run(n=300):
+    results = {}
+    for case in CASES:
+        results[f'ipc.run_all_final.{case}.round_trip'] = _round_trips(case, n)
+    for framed in (False, True):
+        name = 'framed' if framed else 'text'
+        results[f'ipc.esp_link.{name}.send_to_esp'] = _link_latency(framed, n)
+    return results, {}
@@ -0,0 +1,92 @@
+"""
+Latency of the emergency stop paths, idle and with every core saturated
+(standing in for detection running flat out):
+
+  * watchdog trip delay: control loop stops kicking, time from the deadline
+    expiring to stop_outputs() being called
+  * gesture to stop: run_all_final.stop_processes() on a child standing in
+    for main_combined.py, time from the request to the child having exited
+"""
+import contextlib
+import io
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+from timing import summarize
+
+# Child that idles like the control loop until SIGINT
+CTRL_CHILD = (
+    "import time\n"
+    "print('ready', flush=True)\n"
+    "while True:\n"
+    "    time.sleep(0.1)\n"
+)
+
+TRIP_DEADLINE = 0.05    # shorter than the real one to keep the run quick
+
+
+def _busy(stop_at):
+    while time.time() < stop_at:
+        pass
+
+
+@contextlib.contextmanager
+def _cpu_load(procs, seconds=60.0):
+    stop_at = time.time() + seconds
+    loaders = [multiprocessing.Process(target=_busy, args=(stop_at,), daemon=True) for _ in range(procs)]
+    for p in loaders:
+        p.start()
+    try:
+        yield
+    finally:
+        for p in loaders:
+            p.terminate()
+            p.join()
+
+
+def _trip_delays(n):
+    from watchdog import Watchdog
+    samples = []
+    # SCHED_FIFO may be refused here; the warning is not part of the report
+    with contextlib.redirect_stderr(io.StringIO()):
+        for _ in range(n):
+            cut = []
+            dog = Watchdog(lambda: cut.append(time.monotonic()), heartbeat_deadline=TRIP_DEADLINE,
+                           sensor_deadline=3600.0, log=lambda msg: None)
+            dog.start()
+            dog.kick()
+            kicked = dog.last_kick
+            while not cut:
+                time.sleep(0.005)
+            dog.stop()
+            samples.append(cut[0] - (kicked + TRIP_DEADLINE))
+    return summarize(samples)
+
+
+def _stop_latencies(n):
+    import run_all_final
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(n):
+            proc = subprocess.Popen([sys.executable, "-c", CTRL_CHILD],
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            proc.stdout.readline()
+            run_all_final.ctrl_proc = proc
+            t0 = time.monotonic()
+            run_all_final.stop_processes(t0)
+            samples.append(time.monotonic() - t0)
+            proc.stdout.close()
+    return summarize(samples)
+
+
+def run(n=20):
+    results = {}
+    load = os.cpu_count() or 1
+    for label, procs in (('idle', 0), ('loaded', load)):
+        with _cpu_load(procs):
+            results[f'safety.watchdog.trip_delay[{label}]'] = _trip_delays(n)
+            results[f'safety.run_all_final.gesture_to_stop[{label}]'] = _stop_latencies(n)
+    return results, {}
@@ -0,0 +1,232 @@
+"""
+Steady-state control tick (steady_state.py): per-tick cost next to the
+regular controllers, and a tracemalloc check that a tick allocates nothing.
+
+The tick is steps 2-6 of main_combined.py without the GPIO: fusion (with a
+camera target every other tick), distance and steering controllers, drive
+mixing, duty mapping, metrics and the steering line (TickLog in
+steady-state mode, an f-string and print() otherwise, both to os.devnull).
+After WARMUP ticks the steady-state tick must:
+
+  * allocate at most TICK_ALLOC_BUDGET bytes at its peak, measured tick by
+    tick over PEAK_TICKS ticks (traced memory before the tick against the
+    peak during it), so memory allocated and freed within a tick counts
+  * keep less than a byte per tick of what it allocates over CHECK_TICKS
+    ticks, and run no garbage collection. The totals move by a few objects
+    either way between two snapshots (the float free list running empty or
+    full, caches filling on first use); one float kept per tick is 24 B
+
+The budget covers what the interpreter allocates and frees within a single
+statement - the iterator of a for loop, an int past the small-int cache -
+and nothing else: one NumPy temporary of the sizes in the tick (the filter's
+matrices, a row of output samples) is more. The regular tick goes through
+the same measurement for comparison; only the steady-state one has to pass.
+
+    python benchmarks/bench_steady.py       # the check alone; exits 1 on failure
+"""
+import gc
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from timing import time_per_call
+
+WARMUP        = 500
+CHECK_TICKS   = 5000
+PEAK_TICKS    = 1000     # measured one by one, with the TickLog thread drained in between
+REGULAR_TICKS = 500      # the regular tick runs ~10 ms off-target; fewer is plenty to show its churn
+TICK_ALLOC_BUDGET = 256  # B; a for-loop iterator is 48-56 B, a 2x2 float array over 100 B
+
+
+def _duty(speed, max_speed=1.4):
+    # main_combined.map_speed_to_duty / map_angle_to_duty, without importing RPi.GPIO
+    return max(0.0, min(speed / max_speed, 1.0)) * 100.0
+
+
+def _servo_duty(angle):
+    a = max(-30, min(30, angle))
+    return 6.5 + (a / 30) * 5
+
+
+def make_tick(steady, devnull):
+    from drive_mixer import DriveMixer
+    from fusion import TargetFusion
+    from steady_state import TickLog, steady_controllers
+    from telemetry import Stopwatch, counter, gauge, histogram
+
+    if steady:
+        dist_ctrl, steer_ctrl = steady_controllers('mamdani')
+        log = TickLog(stream=devnull)
+        log.start()
+    else:
+        from fuzzy_controller_dist import FuzzyForDistance
+        from fuzzysteertest import FuzzyForSteering
+        dist_ctrl, steer_ctrl = FuzzyForDistance(), FuzzyForSteering()
+        log = None
+    mixer = DriveMixer('servo')
+    fusion = TargetFusion()
+    m_compute = histogram('saymour_bench_steady_compute_seconds', 'Tick compute time')
+    m_ticks = counter('saymour_bench_steady_ticks_total', 'Ticks run')
+    m_speed = gauge('saymour_bench_steady_speed_mps', 'Distance controller output')
+    m_angle = gauge('saymour_bench_steady_angle_deg', 'Steering angle')
+    watch = Stopwatch()
+    prev = [0.0]
+
+    def tick(raw_front, left, right, target):
+        watch.lap()
+        front, bearing = fusion.update(raw_front, target)
+        delta = front - prev[0]
+        speed = dist_ctrl.compute(front, delta)
+        duty_mot = _duty(speed)
+        angle = steer_ctrl.compute(left, right)
+        wheel_a, wheel_b, servo_angle = mixer.mix(speed, angle, 0.1)
+        duty_srv = _servo_duty(servo_angle)
+        m_compute.observe(watch.lap())
+        m_speed.set(speed)
+        m_angle.set(angle)
+        m_ticks.inc()
+        if log is not None:
+            log.steer(front, delta, speed, duty_mot, wheel_a, wheel_b, left, right, angle, duty_srv)
+        else:
+            print(f"angle={angle:.1f}°", file=devnull, flush=True)
+        prev[0] = front
+    return tick, log
+
+
+def _inputs(rng, n):
+    # a walk in front of the rover with a corridor either side; the camera
+    # sees the person every other tick (a TargetReader.read() tuple, stamped
+    # far in the future so it stays fresh)
+    front = np.clip(40 + np.cumsum(rng.normal(0, 1.5, n)), 5, 120)
+    bearing = rng.uniform(-20, 20, n)
+    return [(float(f), float(l), float(r), (2 ** 62, float(b), float(f) * 1.1, 0.9) if k % 2 else None)
+            for k, (f, l, r, b) in enumerate(zip(front, rng.uniform(10, 70, n), rng.uniform(10, 70, n), bearing))]
+
+
+def tick_peaks(tick, log, inputs):
+    """(largest per-tick allocation peak in B, ticks that allocated anything) over inputs."""
+    worst = allocating = 0
+    for args in inputs:
+        level = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        tick(*args)
+        grew = tracemalloc.get_traced_memory()[1] - level
+        if grew > 0:
+            allocating += 1
+            worst = max(worst, grew)
+        # the log thread formats its line outside the next tick's measurement
+        if log is not None:
+            log.drain()
+    return worst, allocating
+
+
+def allocations(tick, log, inputs, peak_ticks=PEAK_TICKS, warmup=WARMUP):
+    """
+    Per-tick allocation peaks over peak_ticks ticks, and memory left allocated
+    and garbage collections over len(inputs) ticks, after warmup.
+    """
+    for args in itertools.islice(itertools.cycle(inputs), warmup):
+        tick(*args)
+    collections = []
+
+    def on_gc(phase, info):
+        if phase == 'start':
+            collections.append(info['generation'])
+
+    gc.collect()
+    gc.freeze()
+    tracemalloc.start()
+    try:
+        for args in inputs[:warmup]:
+            tick(*args)
+        if log is not None:
+            log.drain()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        # the first filter_traces() compiles its pattern; keep that out of the comparison
+        tracemalloc.take_snapshot().filter_traces(ignore)
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        gc.callbacks.append(on_gc)
+        for args in inputs:
+            tick(*args)
+        gc.callbacks.remove(on_gc)
+        if log is not None:
+            log.drain()
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        peak = tracemalloc.get_traced_memory()[1]
+        tick_peak, allocating = tick_peaks(tick, log, inputs[:peak_ticks])
+    finally:
+        tracemalloc.stop()
+        gc.unfreeze()
+    # net over all sites: a float kept in a gauge is freed at one line and
+    # its successor allocated at another, which is not a leak
+    diff = after.compare_to(before, 'lineno')
+    return {
+        'ticks': len(inputs),
+        'leaked_bytes': sum(d.size_diff for d in diff),
+        'leaked_blocks': sum(d.count_diff for d in diff),
+        'peak_bytes': peak - start,
+        'tick_peak_bytes': tick_peak,
+        'allocating_ticks': allocating,
+        'peak_ticks': min(peak_ticks, len(inputs)),
+        'gc_collections': len(collections),
+        'where': [str(d) for d in diff[:5] if d.size_diff > 0],
+    }
+
+
+def check(n=CHECK_TICKS, seed=0):
+    """Allocation figures for both ticks; the steady-state one carries 'ok'."""
+    rng = np.random.default_rng(seed)
+    inputs = _inputs(rng, n)
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+        for steady in (True, False):
+            tick, log = make_tick(steady, devnull)
+            r = allocations(tick, log, inputs if steady else inputs[:REGULAR_TICKS])
+            if log is not None:
+                log.stop()
+            if steady:
+                r['ok'] = (r['tick_peak_bytes'] <= TICK_ALLOC_BUDGET and r['leaked_bytes'] < r['ticks']
+                           and r['gc_collections'] == 0)
+            results['steady.allocations.' + ('steady_state' if steady else 'regular')] = r
+    return results
+
+
+def run(n_calls=200, seed=0):
+    rng = np.random.default_rng(seed)
+    results = check(seed=seed)
+    with open(os.devnull, 'w') as devnull:
+        for steady in (True, False):
+            tick, log = make_tick(steady, devnull)
+            name = 'steady.tick.' + ('steady_state' if steady else 'regular')
+            results[name + '.per_call'] = time_per_call(tick, _inputs(rng, n_calls))
+            if log is not None:
+                log.stop()
+    return results, {}
+
+
+def main():
+    t0 = time.perf_counter()
+    failed = False
+    for name, r in check().items():
+        print(f"{name}: up to {r['tick_peak_bytes']} B allocated in a tick "
+              f"({r['allocating_ticks']}/{r['peak_ticks']} ticks allocated), "
+              f"{r['leaked_bytes']} B in {r['leaked_blocks']} blocks left over {r['ticks']} ticks, "
+              f"peak {r['peak_bytes']} B, {r['gc_collections']} collections")
+        if r.get('ok') is False:
+            failed = True
+            for where in r['where']:
+                print(f"    {where}")
+    print(f"{'FAIL' if failed else 'OK'} ({time.perf_counter() - t0:.1f} s)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    HERE = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(HERE))
+    main()
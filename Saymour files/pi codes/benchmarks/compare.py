@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark JSON files and flag regressions.
+
+    python benchmarks/compare.py base.json new.json --threshold 10
+
+Exits with status 1 if any shared benchmark got slower by more than the
+threshold (percent).
+"""
+import argparse
+import json
+import sys
+
+
+def headline(stats):
+    """The single number used to compare a benchmark between runs (microseconds)."""
+    if 'p50_us' in stats:
+        return stats['p50_us']
+    return stats.get('per_call_us')      # None for checks (e.g. steady.allocations.*)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"base: {base['meta'].get('commit')}  new: {new['meta'].get('commit')}")
+    regressions = 0
+    for name in sorted(set(base['results']) | set(new['results'])):
+        if name not in base['results']:
+            print(f"{name:70s} (new)")
+            continue
+        if name not in new['results']:
+            print(f"{name:70s} (missing)")
+            continue
+        old_us = headline(base['results'][name])
+        new_us = headline(new['results'][name])
+        if old_us is None or new_us is None:
+            continue
+        change = (new_us - old_us) / old_us * 100.0 if old_us else 0.0
+        flag = ''
+        if change > args.threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{name:70s} {old_us:10.1f} → {new_us:10.1f} us  ({change:+6.1f}%){flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Run the benchmark suite off-target (no Pi hardware needed) and write the
+results to JSON so runs from different commits can be compared with
+compare.py.
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --only fuzzy --images ~/captures
+
+Exits 1 when a check fails (the steady suite's allocation check).
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))   # the pi codes directory
+sys.path.insert(0, HERE)
+
+import numpy as np
+
+import bench_fuzzy
+import bench_detection
+import bench_ipc
+import bench_safety
+import bench_steady
+
+SUITES = ('fuzzy', 'detection', 'ipc', 'safety', 'steady')
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                             capture_output=True, text=True, check=True)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=HERE,
+                               capture_output=True, text=True, check=True)
+        return out.stdout.strip() + ('-dirty' if dirty.stdout.strip() else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_meta():
+    return {
+        'commit': git_revision(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Saymour benchmark suite')
+    parser.add_argument('--output', default='bench_results.json', help='JSON file to write')
+    parser.add_argument('--only', choices=SUITES, action='append',
+                        help='run only this suite (can be given more than once)')
+    parser.add_argument('--images', default=None,
+                        help='image folder for the detection suite (random frames if omitted)')
+    parser.add_argument('--calls', type=int, default=200, help='timed calls per latency measurement')
+    parser.add_argument('--batch', type=int, default=1000, help='calls per throughput measurement')
+    args = parser.parse_args()
+
+    suites = args.only or list(SUITES)
+    results = {}
+    skipped = {}
+
+    if 'fuzzy' in suites:
+        print('Running fuzzy benchmarks…', flush=True)
+        r, s = bench_fuzzy.run(n_calls=args.calls, n_batch=args.batch)
+        results.update(r)
+        skipped.update(s)
+    if 'detection' in suites:
+        print('Running detection benchmarks…', flush=True)
+        r, s = bench_detection.run(images=args.images)
+        results.update(r)
+        skipped.update(s)
+    if 'ipc' in suites:
+        print('Running IPC benchmarks…', flush=True)
+        r, s = bench_ipc.run(n=args.calls)
+        results.update(r)
+        skipped.update(s)
+    if 'safety' in suites:
+        print('Running safety benchmarks…', flush=True)
+        r, s = bench_safety.run()
+        results.update(r)
+        skipped.update(s)
+    if 'steady' in suites:
+        print('Running steady-state tick benchmarks…', flush=True)
+        r, s = bench_steady.run(n_calls=args.calls)
+        results.update(r)
+        skipped.update(s)
+
+    report = {'meta': run_meta(), 'results': results, 'skipped': skipped}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    failed = []
+    for name, stats in sorted(results.items()):
+        if 'p50_us' in stats:
+            print(f"{name:70s} p50={stats['p50_us']:10.1f} us  p95={stats['p95_us']:10.1f} us")
+        elif 'leaked_bytes' in stats:
+            status = {True: 'ok', False: 'FAIL'}.get(stats.get('ok'), '')
+            print(f"{name:52s} {stats['tick_peak_bytes']:8d} B/tick {stats['leaked_bytes']:10d} B left  "
+                  f"{stats['gc_collections']:6d} GCs  {status}")
+            if stats.get('ok') is False:
+                failed.append(name)
+        else:
+            print(f"{name:70s} {stats['per_call_us']:10.1f} us/call  {stats['calls_per_s']:10.0f} calls/s")
+    for name, reason in sorted(skipped.items()):
+        print(f"{name:70s} skipped: {reason}")
+    print(f"Results written to {args.output}")
+    if failed:
+        print(f"Failed checks: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import time
+import numpy as np
+
+
+def summarize(samples_s):
+    """Turn a list of per-call durations (seconds) into a stats dict in microseconds."""
+    us = np.asarray(samples_s, dtype=float) * 1e6
+    return {
+        'n': int(us.size),
+        'mean_us': float(us.mean()),
+        'min_us': float(us.min()),
+        'p50_us': float(np.percentile(us, 50)),
+        'p95_us': float(np.percentile(us, 95)),
+        'p99_us': float(np.percentile(us, 99)),
+        'max_us': float(us.max()),
+    }
+
+
+def time_per_call(fn, inputs, warmup=5):
+    """
+    Call fn(*args) once per entry of inputs and time each call on its own.
+    Good for latency percentiles; includes the timer overhead.
+    """
+    for args in inputs[:warmup]:
+        fn(*args)
+    samples = []
+    clock = time.perf_counter
+    for args in inputs:
+        t0 = clock()
+        fn(*args)
+        samples.append(clock() - t0)
+    return summarize(samples)
+
+
+def time_batch(fn, inputs, warmup=5):
+    """
+    Call fn(*args) for every entry of inputs back to back under one timer.
+    Good for throughput; the per-call figure is the amortised cost.
+    """
+    for args in inputs[:warmup]:
+        fn(*args)
+    clock = time.perf_counter
+    t0 = clock()
+    for args in inputs:
+        fn(*args)
+    total = clock() - t0
+    return {
+        'n': len(inputs),
+        'total_s': total,
+        'per_call_us': total / len(inputs) * 1e6,
+        'calls_per_s': len(inputs) / total if total > 0 else float('inf'),
+    }
@@ -0,0 +1,370 @@
+"""
+One configuration for every Saymour script.
+
+Pins, ports, motor model, loop rates and detector settings live in
+saymour.json next to this file (or the file named by SAYMOUR_CONFIG). The
+file is checked against the dataclasses below, validated, and loaded once
+per process by get_config(); the scripts only read values from it.
+
+A profile is a run mode (see saymour.py). The "profiles" section of the
+file holds per-profile overrides merged over the base sections, e.g. the
+standalone distance test uses its own START_V:
+
+    "profiles": {"distance": {"motor": {"start_v": 1.5}}}
+
+The launcher passes the file and profile to its children through
+SAYMOUR_CONFIG / SAYMOUR_PROFILE, so a supervisor and the processes it
+starts always see the same settings.
+"""
+import copy
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field, fields
+
+from drive_mixer import DRIVE_MODES
+from multi_detect import parse_sources
+from pwm_backend import PWM_BACKENDS
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(BASE, "saymour.json")
+CONFIG_ENV = 'SAYMOUR_CONFIG'
+PROFILE_ENV = 'SAYMOUR_PROFILE'
+PWM_BACKEND_ENV = 'SAYMOUR_PWM_BACKEND'
+
+
+class ConfigError(ValueError):
+    """The configuration file is malformed or has out-of-range values."""
+
+
+@dataclass
+class PinConfig:
+    """BCM pin numbers."""
+    trig_front: int = 23
+    echo_front: int = 24
+    trig_left: int = 5
+    echo_left: int = 6
+    trig_right: int = 16
+    echo_right: int = 20
+    trig_down: int = 4          # optional downward sonar (control.use_down_sonar)
+    echo_down: int = 7
+    ena: int = 18               # L298N motor A PWM
+    in1: int = 27
+    in2: int = 22
+    enb: int = 13               # L298N motor B PWM
+    in3: int = 26
+    in4: int = 19
+    servo: int = 12
+    enc_left: int = 17          # wheel encoders (motor.use_speed_loop)
+    enc_right: int = 25
+
+
+@dataclass
+class MotorConfig:
+    vin: float = 15.0           # motor driver supply (V)
+    max_speed: float = 1.4      # wheel speed at full duty (m/s)
+    start_v: float = 8.0        # voltage at which the motors just start to turn (V)
+    motor_pwm_hz: int = 1000
+    servo_pwm_hz: int = 50
+    pwm_backend: str = 'rpigpio'           # 'rpigpio', 'pigpio' or 'sysfs'; SAYMOUR_PWM_BACKEND overrides
+    drive_mode: str = 'servo'              # 'servo' or 'differential'
+    use_speed_loop: bool = False           # closed-loop wheel speed, needs encoders
+
+
+@dataclass
+class ControlConfig:
+    loop_interval: float = 0.1  # sleep between control ticks (s)
+    echo_timeout: float = 0.04  # give up on an ultrasonic echo after this (s)
+    use_fusion: bool = True     # fuse the detector's person estimate (fusion.py)
+    bearing_gain: float = 0.5   # steering degrees per degree of person bearing
+    use_down_sonar: bool = False
+    controller: str = 'mamdani'  # 'mamdani' or 'sugeno' (sugeno.py, fitted at start-up)
+    sugeno_order: int = 1        # 0: constant rule outputs, 1: linear
+    use_grid: bool = False       # steer on the occupancy grid's sector ranges (occupancy.py)
+    steady_state: bool = False   # preallocated, allocation-free ticks and background logging (steady_state.py)
+
+
+@dataclass
+class DetectionConfig:
+    model: str = 'best_ncnn_model'
+    source: str = 'picamera0'
+    resolution: str = '1280x720'
+    thresh: float = 0.5
+    threads: int = 3            # OpenCV/NCNN thread budget for the detector
+    share_target: bool = True   # publish the person estimate for the control loop
+    governor: bool = False      # adaptive quality (governor.py)
+    target_fps: float = 5.0
+    use_frame_bus: bool = False # capture in frame_bus.py and read from shared memory
+    cues: bool = False          # send planned CUE lines instead of DETECT lines (cue_planner.py)
+    sources: str = ''           # "front=picamera0,down=picamera1": several cameras, one model (multi_detect.py)
+
+
+@dataclass
+class ActivityConfig:
+    idle_mode: bool = False             # low power while the user stands still (activity.py)
+    idle_after: float = 20.0            # s without motion before going idle
+    idle_loop_interval: float = 0.5     # control tick period while idle (s)
+    idle_frame_interval: float = 0.2    # s between camera frames while idle
+    idle_infer_interval: float = 2.0    # s between inferences while idle
+
+
+@dataclass
+class NetworkConfig:
+    host: str = ''              # listen on all interfaces
+    full_port: int = 4000       # run_all_final.py (PI_PORT in the gesture sketch)
+    detect_port: int = 4002     # model_esp.py (PI_PORT in AudioPlayer.ino)
+    haptic_port: int = 5000     # rover_with_esp.py (PI_PORT in FlexHaptic.ino)
+    metrics_port: int = 9108
+
+
+@dataclass
+class Config:
+    pins: PinConfig = field(default_factory=PinConfig)
+    motor: MotorConfig = field(default_factory=MotorConfig)
+    control: ControlConfig = field(default_factory=ControlConfig)
+    detection: DetectionConfig = field(default_factory=DetectionConfig)
+    activity: ActivityConfig = field(default_factory=ActivityConfig)
+    network: NetworkConfig = field(default_factory=NetworkConfig)
+    profile: str = 'combined'
+
+
+# Run modes: script started by saymour.py and what it is for
+PROFILES = {
+    'full':         ('run_all_final.py', 'gestures start/stop detection and the rover; ESP32 on network.full_port'),
+    'rover-haptic': ('rover_with_esp.py', 'rover controllers driven by the flex glove; ESP32 on network.haptic_port'),
+    'model-only':   ('model_esp.py', 'detection only, DETECT lines to the ESP32 on network.detect_port'),
+    'distance':     ('main1.py', 'standalone distance controller'),
+    'steering':     ('main2.py', 'standalone steering controller'),
+    'combined':     ('main_combined.py', 'distance + steering controllers without an ESP32'),
+    'detect':       ('yolo_detect.py', 'detection with a preview window'),
+}
+
+# Used when the file has no "profiles" section; these keep the values the
+# standalone scripts were tuned with
+DEFAULT_PROFILE_OVERRIDES = {
+    'distance': {'motor': {'start_v': 1.5}},
+    'steering': {'control': {'loop_interval': 0.3}},
+}
+
+CONTROLLERS = ('mamdani', 'sugeno')
+
+SECTIONS = {f.name: f.default_factory for f in fields(Config) if f.name != 'profile'}
+
+
+def _merge(base, override):
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _check_type(path, value, kind, errors):
+    if kind is bool:
+        ok = isinstance(value, bool)
+    elif kind is int:
+        ok = isinstance(value, int) and not isinstance(value, bool)
+    elif kind is float:
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+        value = float(value) if ok else value
+    else:
+        ok = isinstance(value, kind)
+    if not ok:
+        errors.append(f"{path}: expected {kind.__name__}, got {value!r}")
+    return value
+
+
+def _build_section(name, cls, data, errors):
+    if not isinstance(data, dict):
+        errors.append(f"{name}: expected an object")
+        return cls()
+    known = {f.name: f for f in fields(cls)}
+    for key in data:
+        if key not in known:
+            errors.append(f"{name}.{key}: unknown setting")
+    values = {}
+    for key, f in known.items():
+        if key in data:
+            values[key] = _check_type(f"{name}.{key}", data[key], f.type, errors)
+    return cls(**values)
+
+
+def validate(cfg):
+    """Return a list of problems with an otherwise well-typed config."""
+    errors = []
+    p, m, c, d, n = cfg.pins, cfg.motor, cfg.control, cfg.detection, cfg.network
+    a = cfg.activity
+
+    used = ['trig_front', 'echo_front', 'trig_left', 'echo_left', 'trig_right', 'echo_right',
+            'ena', 'in1', 'in2', 'enb', 'in3', 'in4', 'servo']
+    if c.use_down_sonar:
+        used += ['trig_down', 'echo_down']
+    if m.use_speed_loop:
+        used += ['enc_left', 'enc_right']
+    owners = {}
+    for name in used:
+        pin = getattr(p, name)
+        if not 2 <= pin <= 27:
+            errors.append(f"pins.{name}: {pin} is not a BCM GPIO (2-27)")
+        elif pin in owners:
+            errors.append(f"pins.{name}: GPIO {pin} is already used by pins.{owners[pin]}")
+        else:
+            owners[pin] = name
+
+    if not 0 < m.start_v < m.vin:
+        errors.append(f"motor.start_v: must be between 0 and motor.vin ({m.vin}), got {m.start_v}")
+    if m.max_speed <= 0:
+        errors.append("motor.max_speed: must be positive")
+    if m.motor_pwm_hz <= 0 or m.servo_pwm_hz <= 0:
+        errors.append("motor: PWM frequencies must be positive")
+    if m.pwm_backend not in PWM_BACKENDS:
+        errors.append(f"motor.pwm_backend: {m.pwm_backend!r} is not one of {', '.join(PWM_BACKENDS)}")
+    if m.drive_mode not in DRIVE_MODES:
+        errors.append(f"motor.drive_mode: {m.drive_mode!r} is not one of {', '.join(DRIVE_MODES)}")
+
+    if not 0 < c.loop_interval <= 5.0:
+        errors.append(f"control.loop_interval: must be in (0, 5] s, got {c.loop_interval}")
+    if not 0 < c.echo_timeout <= 0.1:
+        errors.append(f"control.echo_timeout: must be in (0, 0.1] s, got {c.echo_timeout}")
+    if c.bearing_gain < 0:
+        errors.append("control.bearing_gain: must not be negative")
+    if c.controller not in CONTROLLERS:
+        errors.append(f"control.controller: {c.controller!r} is not one of {', '.join(CONTROLLERS)}")
+    if c.sugeno_order not in (0, 1):
+        errors.append(f"control.sugeno_order: must be 0 or 1, got {c.sugeno_order}")
+    if c.steady_state and c.use_grid:
+        errors.append("control.use_grid: allocates on every tick, not supported with control.steady_state")
+
+    if not re.fullmatch(r'\d+x\d+', d.resolution):
+        errors.append(f"detection.resolution: expected WxH, got {d.resolution!r}")
+    if not 0 < d.thresh < 1:
+        errors.append(f"detection.thresh: must be between 0 and 1, got {d.thresh}")
+    if d.threads < 1:
+        errors.append("detection.threads: must be at least 1")
+    if d.target_fps <= 0:
+        errors.append("detection.target_fps: must be positive")
+    if d.sources:
+        try:
+            parse_sources(d.sources)
+        except ValueError as e:
+            errors.append(f"detection.sources: {e}")
+        if d.governor:
+            errors.append("detection.governor: not supported with detection.sources")
+
+    if a.idle_after <= 0:
+        errors.append("activity.idle_after: must be positive")
+    if not c.loop_interval <= a.idle_loop_interval <= 5.0:
+        errors.append(f"activity.idle_loop_interval: must be in [control.loop_interval, 5] s, "
+                      f"got {a.idle_loop_interval}")
+    if a.idle_frame_interval < 0:
+        errors.append("activity.idle_frame_interval: must not be negative")
+    if a.idle_infer_interval < a.idle_frame_interval:
+        errors.append("activity.idle_infer_interval: must not be shorter than activity.idle_frame_interval")
+
+    ports = {}
+    for name in ('full_port', 'detect_port', 'haptic_port', 'metrics_port'):
+        port = getattr(n, name)
+        if not 1 <= port <= 65535:
+            errors.append(f"network.{name}: {port} is not a TCP port")
+        elif port in ports:
+            errors.append(f"network.{name}: port {port} is already used by network.{ports[port]}")
+        else:
+            ports[port] = name
+
+    if cfg.profile not in PROFILES:
+        errors.append(f"profile: {cfg.profile!r} is not one of {', '.join(PROFILES)}")
+    return errors
+
+
+def load_config(path=None, profile='combined'):
+    """
+    Read, merge and validate a configuration.
+    :param path: JSON file, or None for the built-in defaults
+    :raises ConfigError: listing every problem found
+    """
+    data = {}
+    if path is not None:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ConfigError(f"cannot read {path}: {e}")
+        if not isinstance(data, dict):
+            raise ConfigError(f"{path}: expected a JSON object")
+
+    errors = []
+    overrides = data.get('profiles', DEFAULT_PROFILE_OVERRIDES)
+    if not isinstance(overrides, dict):
+        errors.append("profiles: expected an object")
+        overrides = {}
+    for key in data:
+        if key not in SECTIONS and key != 'profiles':
+            errors.append(f"{key}: unknown section")
+    for name in overrides:
+        if name not in PROFILES:
+            errors.append(f"profiles.{name}: unknown profile")
+
+    merged = _merge({k: v for k, v in data.items() if k in SECTIONS}, overrides.get(profile, {}))
+    sections = {name: _build_section(name, cls, merged.get(name, {}), errors)
+                for name, cls in SECTIONS.items()}
+    cfg = Config(profile=profile, **sections)
+    # the environment override pwm_backend.py documents still wins over the file
+    if os.environ.get(PWM_BACKEND_ENV):
+        cfg.motor.pwm_backend = os.environ[PWM_BACKEND_ENV]
+    if not errors:
+        errors = validate(cfg)
+    if errors:
+        where = path or 'built-in defaults'
+        raise ConfigError(f"invalid configuration ({where}, profile {profile}):\n  " + "\n  ".join(errors))
+    return cfg
+
+
+_loaded = None
+
+
+def get_config(default_profile='combined'):
+    """
+    The process-wide configuration, loaded on first use from SAYMOUR_CONFIG
+    (or saymour.json next to the scripts) for SAYMOUR_PROFILE (or
+    default_profile). Child processes inherit both.
+    """
+    global _loaded
+    if _loaded is None:
+        path = os.environ.get(CONFIG_ENV) or (DEFAULT_PATH if os.path.exists(DEFAULT_PATH) else None)
+        profile = os.environ.get(PROFILE_ENV) or default_profile
+        _loaded = load_config(path, profile)
+        os.environ[PROFILE_ENV] = profile
+        if path is not None:
+            os.environ[CONFIG_ENV] = os.path.abspath(path)
+    return _loaded
+
+
+def to_dict(cfg, profiles=None):
+    """The config as a JSON-ready dict (base sections plus a profiles section)."""
+    data = {name: asdict(getattr(cfg, name)) for name in SECTIONS}
+    data['profiles'] = DEFAULT_PROFILE_OVERRIDES if profiles is None else profiles
+    return data
+
+
+def yolo_args(cfg, share_target=None):
+    """yolo_detect.py command-line flags for the detection settings."""
+    d = cfg.detection
+    source = 'bus:saymour_frames' if d.use_frame_bus else d.source
+    args = ["--model", d.model, "--source", source, "--resolution", d.resolution,
+            "--thresh", str(d.thresh), "--threads", str(d.threads)]
+    if d.share_target if share_target is None else share_target:
+        args.append("--share-target")
+    if d.governor:
+        args += ["--governor", "--target-fps", str(d.target_fps)]
+    if d.cues:
+        args.append("--cues")
+    if d.sources:
+        args += ["--sources", d.sources]
+    a = cfg.activity
+    if a.idle_mode:
+        args += ["--idle", "--idle-after", str(a.idle_after),
+                 "--idle-frame-interval", str(a.idle_frame_interval),
+                 "--idle-infer-interval", str(a.idle_infer_interval)]
+    return args
@@ -0,0 +1,193 @@
+"""
+Audio cue planning for the ESP32 wav player.
+
+Without it, yolo_detect.py prints one DETECT:<class> line per detection per
+frame and the ESP32 has to pick something to play out of a stream of bare
+class names. With --cues the Pi does the choosing. Each frame:
+
+  * detections are matched to tracks (same class, overlapping boxes), so an
+    object seen in consecutive frames builds persistence and a one-frame
+    false positive does not
+  * every track gets an urgency score from its class, how much of the frame
+    its box covers (a stand-in for how close it is), where it is (straight
+    ahead matters more than off to the side) and its persistence
+  * the most urgent track becomes at most one cue line:
+
+        CUE:<class>_<L|C|R><1-3>       e.g. CUE:Car_C3
+
+    direction from the box's x-centre (left/centre/right third of the
+    frame) and urgency level 1 (low) to 3 (high); the id is also the name
+    of the clip the ESP32 plays
+
+Cues are rate limited: at most one per MIN_GAP seconds, the same cue not
+again within REPEAT_GAP, with a more urgent cue allowed to cut in after
+PREEMPT_GAP. run_all_final.py keeps only the newest unsent cue in its
+outbox, so the ESP32 is never behind by more than the line being written.
+
+Stairs are not planned here; they already go out on the hazard fast path
+(hazards.py).
+"""
+import time
+
+from hazards import HAZARD_CLASSES
+from telemetry import counter
+
+# --- Constants -------------------------------------------------------
+# How much each class matters when everything else is equal
+CLASS_WEIGHTS = {
+    'Car': 1.0,
+    'Motorcycle': 0.9,
+    'Person': 0.6,
+}
+DEFAULT_WEIGHT = 0.5
+
+NEAR_AREA     = 0.20    # box covering this fraction of the frame counts as "close"
+SIDE_WEIGHT   = 0.6     # left/right thirds relative to straight ahead
+PERSIST_HITS  = 3       # frames a track needs for full persistence
+MAX_MISSES    = 2       # frames a track survives without a matching detection
+MATCH_IOU     = 0.3     # overlap needed to continue a track
+
+# Score thresholds for urgency levels 1, 2 and 3; below the first, no cue
+URGENCY_LEVELS = (0.15, 0.35, 0.6)
+
+MIN_GAP     = 1.2       # s between cues (about one clip)
+REPEAT_GAP  = 4.0       # s before the same cue is sent again
+PREEMPT_GAP = 0.3       # s after a cue before a more urgent one may cut in
+
+DIRECTIONS = ('L', 'C', 'R')
+
+M_CUES = {level: counter('saymour_yolo_cues_total', 'Cues sent to the ESP32', {'urgency': str(level)})
+          for level in (1, 2, 3)}
+M_HELD = counter('saymour_yolo_cues_held_total', 'Cues held back by the rate limit')
+
+
+def iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def direction(box, frame_w):
+    """'L', 'C' or 'R' from the box's x-centre."""
+    xc = (box[0] + box[2]) / 2.0
+    return DIRECTIONS[min(2, max(0, int(3 * xc / frame_w)))]
+
+
+def urgency_level(score):
+    """1-3, or 0 when the score is too low to announce."""
+    level = 0
+    for i, bound in enumerate(URGENCY_LEVELS):
+        if score >= bound:
+            level = i + 1
+    return level
+
+
+def format_cue(classname, side, level):
+    return f"CUE:{classname}_{side}{level}"
+
+
+def parse_cue(line):
+    """'CUE:<class>_<dir><level>' -> (class, dir, level), or None."""
+    if not line.startswith("CUE:"):
+        return None
+    body = line.strip()[4:]
+    classname, _, tail = body.rpartition('_')
+    if not classname or len(tail) != 2 or tail[0] not in DIRECTIONS or tail[1] not in '123':
+        return None
+    return classname, tail[0], int(tail[1])
+
+
+class Track:
+    __slots__ = ('classname', 'box', 'hits', 'misses')
+
+    def __init__(self, classname, box):
+        self.classname = classname
+        self.box = box
+        self.hits = 1
+        self.misses = 0
+
+
+class CuePlanner:
+    def __init__(self, min_gap=MIN_GAP, repeat_gap=REPEAT_GAP, preempt_gap=PREEMPT_GAP):
+        self.min_gap = min_gap
+        self.repeat_gap = repeat_gap
+        self.preempt_gap = preempt_gap
+        self.tracks = []
+        self.last_time = None       # when the last cue went out
+        self.last_level = 0
+        self.sent = {}              # cue -> time last sent
+
+    def _update_tracks(self, detections):
+        unmatched = list(self.tracks)
+        for classname, _, _, box in detections:
+            if classname in HAZARD_CLASSES:
+                continue
+            best, best_iou = None, MATCH_IOU
+            for track in unmatched:
+                if track.classname == classname:
+                    overlap = iou(track.box, box)
+                    if overlap >= best_iou:
+                        best, best_iou = track, overlap
+            if best is None:
+                self.tracks.append(Track(classname, box))
+            else:
+                unmatched.remove(best)
+                best.box = box
+                best.hits += 1
+                best.misses = 0
+        for track in unmatched:
+            track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= MAX_MISSES]
+
+    def score(self, track, frame_w, frame_h):
+        x0, y0, x1, y1 = track.box
+        size = min(1.0, (x1 - x0) * (y1 - y0) / float(frame_w * frame_h) / NEAR_AREA)
+        side = direction(track.box, frame_w)
+        position = 1.0 if side == 'C' else SIDE_WEIGHT
+        persistence = min(1.0, track.hits / float(PERSIST_HITS))
+        return CLASS_WEIGHTS.get(track.classname, DEFAULT_WEIGHT) * size * position * persistence
+
+    def plan(self, detections, frame_w, frame_h):
+        """
+        The most urgent cue for this frame as (cue, level), or None. Tracks
+        that were missed this frame still count, so a flickering box does
+        not drop out of the plan.
+        """
+        self._update_tracks(detections)
+        best, best_score = None, 0.0
+        for track in self.tracks:
+            s = self.score(track, frame_w, frame_h)
+            if s > best_score:
+                best, best_score = track, s
+        level = urgency_level(best_score)
+        if best is None or level == 0:
+            return None
+        return format_cue(best.classname, direction(best.box, frame_w), level), level
+
+    def update(self, detections, frame_w, frame_h, now=None):
+        """Plan this frame and apply the rate limit. Returns the cue line to send, or None."""
+        planned = self.plan(detections, frame_w, frame_h)
+        if planned is None:
+            return None
+        cue, level = planned
+        now = time.monotonic() if now is None else now
+        if self.last_time is not None:
+            since = now - self.last_time
+            preempt = level > self.last_level and since >= self.preempt_gap
+            if since < self.min_gap and not preempt:
+                M_HELD.inc()
+                return None
+        last = self.sent.get(cue)
+        if last is not None and now - last < self.repeat_gap:
+            M_HELD.inc()
+            return None
+        self.sent[cue] = now
+        self.last_time = now
+        self.last_level = level
+        M_CUES[level].inc()
+        return cue
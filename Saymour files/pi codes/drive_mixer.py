@@ -0,0 +1,130 @@
+"""
+Drive mixing: turns the fuzzy (speed, steering angle) pair into per-wheel
+commands for the L298N.
+
+Modes:
+  'servo'        - both wheels at the same speed and the servo steers
+                   (the original main_combined.py behaviour)
+  'differential' - the servo stays centred and the angle is turned into a
+                   left/right wheel speed split; at low speed with a large
+                   angle the rover pivots in place, driving the wheels in
+                   opposite directions through the IN1-IN4 pins
+
+Wheel speeds are acceleration limited and the steering angle is slew-rate
+limited, so mode changes and sudden controller jumps do not jerk the rover.
+"""
+from math import tan, radians
+
+# --- Constants -------------------------------------------------------
+TRACK_WIDTH_M   = 0.15   # distance between the wheel contact points (m)
+WHEELBASE_M     = 0.18   # axle to axle, used to turn an angle into a curvature (m)
+MAX_SPEED       = 1.4    # top wheel speed (m/s)
+MAX_ANGLE       = 30.0   # steering controller output range (deg)
+MAX_ACCEL       = 2.0    # per-wheel acceleration limit (m/s^2)
+ANGLE_SLEW      = 120.0  # steering angle slew rate (deg/s)
+PIVOT_BELOW     = 0.15   # pivot in place when slower than this (m/s)…
+PIVOT_ANGLE     = 20.0   # …and the steering angle is at least this large (deg)
+PIVOT_SPEED     = 0.4    # wheel speed used while pivoting (m/s)
+
+DRIVE_MODES = ('servo', 'differential')
+
+
+class SlewLimiter:
+    """Limits how fast a value may change, in units per second."""
+
+    def __init__(self, rate, value=0.0):
+        self.rate = rate
+        self.value = value
+
+    def update(self, target, dt):
+        step = self.rate * dt
+        if target > self.value + step:
+            self.value += step
+        elif target < self.value - step:
+            self.value -= step
+        else:
+            self.value = target
+        return self.value
+
+    def reset(self, value=0.0):
+        self.value = value
+
+
+class DriveMixer:
+    def __init__(self, mode='servo', track_width=TRACK_WIDTH_M, wheelbase=WHEELBASE_M,
+                 max_speed=MAX_SPEED, max_accel=MAX_ACCEL, angle_slew=ANGLE_SLEW):
+        self.track_width = track_width
+        self.wheelbase = wheelbase
+        self.max_speed = max_speed
+        self.left = SlewLimiter(max_accel)
+        self.right = SlewLimiter(max_accel)
+        self.angle = SlewLimiter(angle_slew)
+        self.mode = None
+        self.set_mode(mode)
+
+    def set_mode(self, mode):
+        if mode not in DRIVE_MODES:
+            raise ValueError(f"Unknown drive mode: {mode}")
+        self.mode = mode
+
+    def targets(self, speed, angle):
+        """
+        Unlimited wheel speed targets (m/s, negative is reverse) and servo angle.
+        :param angle: steering angle in degrees, negative steers left
+        """
+        angle = max(-MAX_ANGLE, min(MAX_ANGLE, angle))
+        if self.mode == 'servo':
+            return speed, speed, angle
+
+        if abs(speed) < PIVOT_BELOW and abs(angle) >= PIVOT_ANGLE:
+            spin = PIVOT_SPEED if angle > 0 else -PIVOT_SPEED
+            return spin, -spin, 0.0
+
+        # Ackermann-equivalent split: a right turn (angle > 0) speeds up the left wheel
+        g = tan(radians(angle)) * self.track_width / (2.0 * self.wheelbase)
+        left = speed * (1.0 + g)
+        right = speed * (1.0 - g)
+        peak = max(abs(left), abs(right))
+        if peak > self.max_speed:
+            scale = self.max_speed / peak
+            left *= scale
+            right *= scale
+        return left, right, 0.0
+
+    def mix(self, speed, angle, dt):
+        """
+        Acceleration/slew limited per-wheel commands for one control tick.
+        :return: (left wheel m/s, right wheel m/s, servo angle deg)
+        """
+        left, right, servo_angle = self.targets(speed, angle)
+        return (self.left.update(left, dt),
+                self.right.update(right, dt),
+                self.angle.update(servo_angle, dt))
+
+    def reset(self):
+        self.left.reset()
+        self.right.reset()
+        self.angle.reset()
+
+
+class WheelDirection:
+    """Drives one L298N direction pin pair, only touching the pins on a change."""
+
+    def __init__(self, gpio, pin_fwd, pin_rev):
+        self.gpio = gpio
+        self.pin_fwd = pin_fwd
+        self.pin_rev = pin_rev
+        self.forward = None
+
+    def set(self, forward):
+        if forward == self.forward:
+            return
+        self.gpio.output(self.pin_fwd, self.gpio.HIGH if forward else self.gpio.LOW)
+        self.gpio.output(self.pin_rev, self.gpio.LOW if forward else self.gpio.HIGH)
+        self.forward = forward
+
+    def release(self):
+        """Both pins low (motor off, whatever the duty); the next set() drives them again."""
+        self.gpio.output(self.pin_fwd, self.gpio.LOW)
+        self.gpio.output(self.pin_rev, self.gpio.LOW)
+        self.forward = None
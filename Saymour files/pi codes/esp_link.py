@@ -0,0 +1,367 @@
+"""
+Pi <-> ESP32 link used by run_all_final.py, model_esp.py and rover_with_esp.py.
+
+Every connection gets TCP_NODELAY (small STEER/DETECT writes go out at once
+instead of waiting for Nagle), TCP keepalive and TCP_USER_TIMEOUT (a dead
+Wi-Fi peer is dropped after a few seconds, not minutes), and the server keeps
+accepting, so an ESP32 that reconnects is picked up straight away. A new
+connection replaces the old one, which is usually already dead.
+
+Two wire formats, chosen per connection:
+
+  * text - newline-terminated lines, as the existing sketches speak
+  * framed - length-prefixed frames:
+
+        magic 0xA5 | type u8 | seq u16 | length u16 | payload
+
+    DATA frames carry one line and are acknowledged with an ACK carrying the
+    same seq; PING/PONG carry a monotonic timestamp. The Pi pings every
+    HEARTBEAT_INTERVAL and closes the link when nothing has arrived for
+    DEAD_AFTER. Send-to-ack time of every DATA frame is recorded as the
+    command latency, and ping round-trips as the link RTT.
+
+A line sent with a trace (tracing.py) gets its 'send' hop once it is in the
+kernel and is recorded then on a text link, or at its 'ack' on a framed one.
+
+A client selects framing by sending a HELLO frame as soon as it connects;
+anything else within HELLO_WAIT means text. esp_sim.py speaks both and
+stands in for the ESP32 when testing off-target.
+"""
+import select
+import socket
+import struct
+import threading
+import time
+
+from telemetry import counter, gauge, histogram
+import tracing
+
+# --- Constants -------------------------------------------------------
+MAGIC = 0xA5
+HEADER = struct.Struct('>BBHH')     # magic, type, seq, payload length
+STAMP = struct.Struct('>Q')         # PING/PONG payload: sender's monotonic_ns
+MAX_PAYLOAD = 0xFFFF
+
+HELLO, DATA, ACK, PING, PONG = 1, 2, 3, 4, 5
+
+HELLO_WAIT         = 0.2    # s after accept to wait for a HELLO before assuming text
+HEARTBEAT_INTERVAL = 0.5    # s between pings on a framed link
+DEAD_AFTER         = 1.5    # s of silence on a framed link before it is dropped
+KEEPALIVE_IDLE     = 1      # s idle before the first TCP keepalive probe
+KEEPALIVE_INTERVAL = 1      # s between probes
+KEEPALIVE_COUNT    = 3      # unanswered probes before the kernel drops the connection
+USER_TIMEOUT_MS    = 3000   # unacknowledged data older than this drops the connection
+MAX_PENDING        = 256    # unacknowledged DATA frames tracked for latency
+
+M_CMD_LATENCY = histogram('saymour_esp_command_latency_seconds', 'DATA frame sent to acknowledged by the ESP32')
+M_LINK_RTT    = histogram('saymour_esp_link_rtt_seconds', 'Heartbeat round-trip time to the ESP32')
+M_LINK_RTT_LAST = gauge('saymour_esp_link_rtt_last_seconds', 'Latest heartbeat round-trip time to the ESP32')
+M_CONNECTS    = counter('saymour_esp_connects_total', 'ESP32 connections accepted')
+M_DEAD        = counter('saymour_esp_dead_peer_total', 'Links dropped after missing heartbeats')
+M_CONNECTED   = gauge('saymour_esp_connected', '1 while an ESP32 is connected')
+
+
+def encode_frame(kind, seq, payload=b''):
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"payload too long ({len(payload)} bytes)")
+    return HEADER.pack(MAGIC, kind, seq & 0xFFFF, len(payload)) + payload
+
+
+class FrameDecoder:
+    """Incremental frame parser: feed() bytes, get back complete (type, seq, payload) frames."""
+
+    def __init__(self):
+        self.buf = b''
+
+    def feed(self, data):
+        self.buf += data
+        frames = []
+        while len(self.buf) >= HEADER.size:
+            magic, kind, seq, length = HEADER.unpack_from(self.buf)
+            if magic != MAGIC:
+                raise ValueError(f"bad frame magic 0x{magic:02x}")
+            end = HEADER.size + length
+            if len(self.buf) < end:
+                break
+            frames.append((kind, seq, self.buf[HEADER.size:end]))
+            self.buf = self.buf[end:]
+        return frames
+
+
+def tcp_rtt(sock):
+    """Kernel's smoothed round-trip time for a connected TCP socket, in seconds."""
+    info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+    return struct.unpack_from("I", info, 68)[0] / 1e6     # tcpi_rtt, microseconds
+
+
+def tune_socket(sock):
+    """Low-latency, fast-failing options for a link socket. Skips what the platform lacks."""
+    options = [(socket.IPPROTO_TCP, 'TCP_NODELAY', 1),
+               (socket.SOL_SOCKET, 'SO_KEEPALIVE', 1),
+               (socket.IPPROTO_TCP, 'TCP_KEEPIDLE', KEEPALIVE_IDLE),
+               (socket.IPPROTO_TCP, 'TCP_KEEPINTVL', KEEPALIVE_INTERVAL),
+               (socket.IPPROTO_TCP, 'TCP_KEEPCNT', KEEPALIVE_COUNT),
+               (socket.IPPROTO_TCP, 'TCP_USER_TIMEOUT', USER_TIMEOUT_MS)]
+    for level, name, value in options:
+        opt = getattr(socket, name, None)
+        if opt is None:
+            continue
+        try:
+            sock.setsockopt(level, opt, value)
+        except OSError:
+            pass    # e.g. a socketpair in the benchmarks
+
+
+class EspLink:
+    """
+    One connected peer. Incoming lines are passed to on_line(line) on the
+    reader thread; send_line() may be called from any thread.
+    """
+
+    def __init__(self, sock, on_line, framed=None, on_close=None,
+                 heartbeat=HEARTBEAT_INTERVAL, dead_after=DEAD_AFTER):
+        """
+        :param framed: True/False to fix the wire format, None to detect it
+            from the peer's first bytes (see HELLO_WAIT)
+        """
+        self.sock = sock
+        self.on_line = on_line
+        self.on_close = on_close
+        self.framed = framed
+        self.heartbeat = heartbeat
+        self.dead_after = dead_after
+        self.seq = 0
+        self.pending = {}           # seq -> (monotonic time the DATA frame was sent, trace or None)
+        self.rtt_last = None
+        self.last_rx = time.monotonic()
+        self.write_lock = threading.Lock()
+        self.closed = threading.Event()
+        self.ready = threading.Event()  # set once the wire format is known
+        if framed is not None:
+            self.ready.set()
+        tune_socket(sock)
+        self.reader = threading.Thread(target=self._read, daemon=True)
+
+    def start(self):
+        self.reader.start()
+        return self
+
+    # ---- sending ----
+
+    def _write(self, data):
+        with self.write_lock:
+            self.sock.sendall(data)
+
+    def _frame(self, kind, payload=b'', trace=None):
+        with self.write_lock:
+            self.seq = (self.seq + 1) & 0xFFFF
+            seq = self.seq
+            if kind == DATA:
+                if len(self.pending) >= MAX_PENDING:
+                    self.pending.clear()
+                self.pending[seq] = (time.monotonic(), trace)
+            self.sock.sendall(encode_frame(kind, seq, payload))
+            if trace is not None:
+                trace.mark('send')
+        return seq
+
+    def send_line(self, line, trace=None):
+        """
+        Send one line (trailing newline optional). Raises OSError once the link is down.
+        :param trace: tracing.Trace to extend with the send (and ack) hops
+        """
+        if self.closed.is_set():
+            raise OSError("ESP32 link closed")
+        line = line.rstrip("\n")
+        self.ready.wait(2 * HELLO_WAIT)
+        if self.framed:
+            self._frame(DATA, line.encode(), trace)
+        else:
+            self._write((line + "\n").encode())
+            if trace is not None:
+                tracing.record(trace.mark('send'))
+
+    def rtt(self):
+        """Latest heartbeat RTT on a framed link, else the kernel's estimate; None if unknown."""
+        if self.framed:
+            return self.rtt_last
+        try:
+            rtt = tcp_rtt(self.sock)
+        except OSError:
+            return None
+        return rtt if rtt > 0 else None
+
+    # ---- receiving ----
+
+    def _detect_format(self):
+        ready, _, _ = select.select([self.sock], [], [], HELLO_WAIT)
+        if not ready:
+            self.framed = False
+            return b''
+        first = self.sock.recv(4096)
+        self.framed = bool(first) and first[0] == MAGIC
+        return first
+
+    def _handle_frame(self, kind, seq, payload):
+        if kind == DATA:
+            self._write(encode_frame(ACK, seq))
+            self.on_line(payload.decode(errors='replace'))
+        elif kind == ACK:
+            # under the write lock, so the sender has finished marking the trace
+            with self.write_lock:
+                sent = self.pending.pop(seq, None)
+            if sent is not None:
+                M_CMD_LATENCY.observe(time.monotonic() - sent[0])
+                if sent[1] is not None:
+                    tracing.record(sent[1].mark('ack'))
+        elif kind == PING:
+            self._write(encode_frame(PONG, seq, payload))
+        elif kind == PONG and len(payload) == STAMP.size:
+            rtt = (time.monotonic_ns() - STAMP.unpack(payload)[0]) / 1e9
+            self.rtt_last = rtt
+            M_LINK_RTT.observe(rtt)
+            M_LINK_RTT_LAST.set(rtt)
+        elif kind == HELLO:
+            self._write(encode_frame(HELLO, seq))
+
+    def _heartbeat(self):
+        while not self.closed.wait(self.heartbeat):
+            if time.monotonic() - self.last_rx > self.dead_after:
+                M_DEAD.inc()
+                self.close()
+                return
+            try:
+                self._frame(PING, STAMP.pack(time.monotonic_ns()))
+            except OSError:
+                self.close()
+                return
+
+    def _read(self):
+        buf = b''
+        decoder = FrameDecoder()
+        try:
+            data = self._detect_format() if self.framed is None else b''
+            self.ready.set()
+            if self.framed:
+                threading.Thread(target=self._heartbeat, daemon=True).start()
+            while True:
+                if data:
+                    self.last_rx = time.monotonic()
+                    if self.framed:
+                        for frame in decoder.feed(data):
+                            self._handle_frame(*frame)
+                    else:
+                        buf += data
+                        *lines, buf = buf.split(b"\n")
+                        for line in lines:
+                            self.on_line(line.decode(errors='replace').rstrip("\r"))
+                data = self.sock.recv(4096)
+                if not data:
+                    break
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.ready.set()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        if self.on_close is not None:
+            self.on_close(self)
+
+
+class EspServer:
+    """
+    Listens for the ESP32 and keeps doing so: each accepted connection
+    becomes the current link, replacing any previous one.
+
+    on_line(line) is called for every line received; on_connect(link) and
+    on_disconnect(link) around each connection. All three run on link or
+    accept threads, never the caller's.
+    """
+
+    def __init__(self, host, port, on_line, on_connect=None, on_disconnect=None, framed=None):
+        self.on_line = on_line
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.framed = framed
+        self.link = None
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self._accept, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                sock, addr = self.server.accept()
+            except OSError:
+                return
+            link = EspLink(sock, self.on_line, framed=self.framed, on_close=self._closed)
+            with self.lock:
+                old, self.link = self.link, link
+            if old is not None:
+                old.close()
+            M_CONNECTS.inc()
+            M_CONNECTED.set(1)
+            self.connected.set()
+            print(f"✅ ESP32 connected from {addr}", flush=True)
+            if self.on_connect is not None:
+                self.on_connect(link)
+            link.start()
+
+    def _closed(self, link):
+        with self.lock:
+            current = self.link is link
+            if current:
+                self.link = None
+                self.connected.clear()
+                M_CONNECTED.set(0)
+        if current:
+            print("⚠ ESP32 disconnected, waiting for it to reconnect…", flush=True)
+            if self.on_disconnect is not None:
+                self.on_disconnect(link)
+
+    def send_line(self, line, trace=None):
+        """Send to the current link. Returns False when no ESP32 is connected."""
+        link = self.link
+        if link is None:
+            return False
+        try:
+            link.send_line(line, trace)
+        except OSError:
+            link.close()
+            return False
+        return True
+
+    def rtt(self):
+        link = self.link
+        return link.rtt() if link is not None else None
+
+    def wait_connected(self, timeout=None):
+        return self.connected.wait(timeout)
+
+    def close(self):
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)     # wakes the accept thread on Linux
+        except OSError:
+            pass
+        self.server.close()
+        link = self.link
+        if link is not None:
+            link.close()
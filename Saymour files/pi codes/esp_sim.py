@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+ESP32 stand-in for testing the Pi side without the glove.
+
+Connects to a Pi server (run_all_final.py, model_esp.py, rover_with_esp.py)
+the way the sketches do, prints what it receives, and sends gestures typed
+on stdin or scripted on the command line. It reconnects when the link
+drops, like the ESP32's Wi-Fi client loop.
+
+    python esp_sim.py --port 4000                       # framed protocol (esp_link.py)
+    python esp_sim.py --port 4000 --text                # newline text, like the current sketches
+    python esp_sim.py --port 4000 --script 1:GESTURE:INDEX --script 8:GESTURE:CLOSED
+
+In framed mode it acknowledges every DATA frame and answers pings, so the
+Pi's command latency and heartbeat RTT metrics work as they would on the
+real link.
+"""
+import argparse
+import socket
+import sys
+import threading
+import time
+
+from esp_link import (DATA, HELLO, FrameDecoder, encode_frame, tune_socket,
+                      ACK, PING, PONG)
+
+# --- Constants -------------------------------------------------------
+RECONNECT_DELAY = 0.2       # s between connection attempts
+
+
+class EspSimulator:
+    def __init__(self, host, port, framed=True, on_line=None):
+        self.host = host
+        self.port = port
+        self.framed = framed
+        self.on_line = on_line or (lambda line: print(f"← {line}", flush=True))
+        self.sock = None
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port))
+        tune_socket(sock)
+        if self.framed:
+            sock.sendall(encode_frame(HELLO, 0))
+        self.sock = sock
+        self.connected.set()
+        return sock
+
+    def _serve(self, sock):
+        decoder = FrameDecoder()
+        buf = b''
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                return
+            if not self.framed:
+                buf += data
+                *lines, buf = buf.split(b"\n")
+                for line in lines:
+                    self.on_line(line.decode(errors='replace'))
+                continue
+            for kind, seq, payload in decoder.feed(data):
+                if kind == DATA:
+                    with self.lock:
+                        sock.sendall(encode_frame(ACK, seq))
+                    self.on_line(payload.decode(errors='replace'))
+                elif kind == PING:
+                    with self.lock:
+                        sock.sendall(encode_frame(PONG, seq, payload))
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                sock = self._connect()
+            except OSError:
+                self.stopped.wait(RECONNECT_DELAY)
+                continue
+            try:
+                self._serve(sock)
+            except (OSError, ValueError):
+                pass
+            self.connected.clear()
+            sock.close()
+            if not self.stopped.is_set():
+                print("⚠ link lost, reconnecting…", file=sys.stderr, flush=True)
+                self.stopped.wait(RECONNECT_DELAY)
+
+    def send_line(self, line):
+        """Send a line to the Pi. Returns False while disconnected."""
+        if not self.connected.is_set():
+            return False
+        try:
+            with self.lock:
+                if self.framed:
+                    self.seq = (self.seq + 1) & 0xFFFF
+                    self.sock.sendall(encode_frame(DATA, self.seq, line.encode()))
+                else:
+                    self.sock.sendall((line + "\n").encode())
+        except OSError:
+            return False
+        return True
+
+    def drop(self):
+        """Cut the current connection, as a Wi-Fi dropout would."""
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        self.stopped.set()
+        self.drop()
+        self.thread.join(timeout=1.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ESP32 stand-in for the Pi link')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--text', action='store_true', help='speak newline text instead of frames')
+    parser.add_argument('--script', action='append', default=[], metavar='SECONDS:LINE',
+                        help='send LINE this many seconds after starting (repeatable)')
+    args = parser.parse_args()
+
+    sim = EspSimulator(args.host, args.port, framed=not args.text).start()
+    t0 = time.monotonic()
+
+    def play():
+        for entry in sorted(args.script, key=lambda e: float(e.split(':', 1)[0])):
+            delay, line = entry.split(':', 1)
+            time.sleep(max(0.0, t0 + float(delay) - time.monotonic()))
+            sim.connected.wait()
+            sim.send_line(line)
+            print(f"→ {line}", flush=True)
+    threading.Thread(target=play, daemon=True).start()
+
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if line and not sim.send_line(line):
+                print("⚠ not connected", file=sys.stderr)
+        # stdin closed (e.g. run in the background): keep serving until Ctrl+C
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Read and write MATLAB-style .fis files (the format of fuzzydistnew.fis).
+
+A FIS is held as a plain dict:
+
+    {
+        'name': 'fuzzydistnew',
+        'type': 'mamdani',
+        'and_method': 'min', 'or_method': 'max', 'imp_method': 'min',
+        'agg_method': 'max', 'defuzz_method': 'centroid',
+        'inputs':  [{'name': 'input1', 'range': (0, 80),
+                     'mfs': [('near', 'trapmf', [0, 0, 15, 30]), ...]}, ...],
+        'outputs': [{'name': 'speed', 'range': (0, 1.4), 'mfs': [...]}],
+        'rules':   [([1], [3], 1.0, 1), ...],   # antecedents, consequents, weight, connective
+    }
+
+MF and rule indices are 1-based, as in the file.
+"""
+import re
+
+_SYSTEM_KEYS = {
+    'Name': 'name',
+    'Type': 'type',
+    'AndMethod': 'and_method',
+    'OrMethod': 'or_method',
+    'ImpMethod': 'imp_method',
+    'AggMethod': 'agg_method',
+    'DefuzzMethod': 'defuzz_method',
+}
+
+_MF_LINE = re.compile(r"'(?P<name>[^']*)'\s*:\s*'(?P<type>[^']*)'\s*,\s*\[(?P<params>[^\]]*)\]")
+_RULE_LINE = re.compile(r"^(?P<ante>[^,]*),(?P<cons>[^(]*)\((?P<weight>[^)]*)\)\s*:\s*(?P<conn>\d+)")
+
+
+def _unquote(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1]
+    return value
+
+
+def _numbers(text):
+    return [float(v) for v in text.replace(',', ' ').split()]
+
+
+def _fmt(value):
+    return f"{float(value):.6g}"
+
+
+def read_fis(path):
+    """Parse a .fis file into the dict layout described in the module docstring."""
+    fis = {'inputs': [], 'outputs': [], 'rules': []}
+    section = None
+    current = None
+    with open(path) as f:
+        for raw in f:
+            line = raw.strip()
+            if not line:
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                section = line[1:-1]
+                if section.startswith('Input') or section.startswith('Output'):
+                    current = {'name': None, 'range': None, 'mfs': []}
+                    (fis['inputs'] if section.startswith('Input') else fis['outputs']).append(current)
+                continue
+
+            if section == 'Rules':
+                m = _RULE_LINE.match(line)
+                if not m:
+                    raise ValueError(f"Malformed rule line in {path}: {line!r}")
+                fis['rules'].append((
+                    [int(v) for v in _numbers(m.group('ante'))],
+                    [int(v) for v in _numbers(m.group('cons'))],
+                    float(m.group('weight')),
+                    int(m.group('conn')),
+                ))
+                continue
+
+            key, _, value = line.partition('=')
+            key = key.strip()
+            if section == 'System':
+                if key in _SYSTEM_KEYS:
+                    fis[_SYSTEM_KEYS[key]] = _unquote(value)
+            elif current is not None:
+                if key == 'Name':
+                    current['name'] = _unquote(value)
+                elif key == 'Range':
+                    lo, hi = _numbers(value.strip()[1:-1])
+                    current['range'] = (lo, hi)
+                elif key.startswith('MF'):
+                    m = _MF_LINE.search(value)
+                    if not m:
+                        raise ValueError(f"Malformed MF line in {path}: {line!r}")
+                    current['mfs'].append((m.group('name'), m.group('type'), _numbers(m.group('params'))))
+    return fis
+
+
+def write_fis(path, fis):
+    """Write a FIS dict (see module docstring) back out as a .fis file."""
+    lines = [
+        '[System]',
+        f"Name='{fis['name']}'",
+        f"Type='{fis.get('type', 'mamdani')}'",
+        'Version=2.0',
+        f"NumInputs={len(fis['inputs'])}",
+        f"NumOutputs={len(fis['outputs'])}",
+        f"NumRules={len(fis['rules'])}",
+        f"AndMethod='{fis.get('and_method', 'min')}'",
+        f"OrMethod='{fis.get('or_method', 'max')}'",
+        f"ImpMethod='{fis.get('imp_method', 'min')}'",
+        f"AggMethod='{fis.get('agg_method', 'max')}'",
+        f"DefuzzMethod='{fis.get('defuzz_method', 'centroid')}'",
+        '',
+    ]
+    for kind, variables in (('Input', fis['inputs']), ('Output', fis['outputs'])):
+        for i, var in enumerate(variables, start=1):
+            lo, hi = var['range']
+            lines.append(f'[{kind}{i}]')
+            lines.append(f"Name='{var['name']}'")
+            lines.append(f"Range=[{_fmt(lo)} {_fmt(hi)}]")
+            lines.append(f"NumMFs={len(var['mfs'])}")
+            for j, (name, mf_type, params) in enumerate(var['mfs'], start=1):
+                lines.append(f"MF{j}='{name}':'{mf_type}',[{' '.join(_fmt(p) for p in params)}]")
+            lines.append('')
+    lines.append('[Rules]')
+    for ante, cons, weight, conn in fis['rules']:
+        lines.append(f"{' '.join(str(int(a)) for a in ante)}, "
+                     f"{' '.join(str(int(c)) for c in cons)} ({_fmt(weight)}) : {int(conn)}")
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Shared-memory frame bus: one capture process owns the camera, any number of
+consumers (yolo_detect.py, a recorder, a debug streamer) read its frames.
+
+The bus is a single multiprocessing.shared_memory block holding a small
+header, one metadata record per slot and N preallocated BGR frame buffers.
+The writer fills slot (frame_no % N) in place and publishes it with the same
+sequence-counter scheme as fusion.py (odd while writing, even when done),
+then advances `latest`. Readers never lock and never copy: read_latest()
+returns a NumPy view straight into the slot, and still_valid() tells them
+afterwards whether the writer has since reused it. With N slots a consumer
+has N-1 frame periods to finish with a view (or copy what it keeps).
+
+Consumers only read shared pages, so each one added costs nothing in capture
+bandwidth.
+
+Run the capture side with:
+
+    python frame_bus.py --source picamera0 --resolution 1280x720
+
+and point consumers at it, e.g. `yolo_detect.py --source bus:saymour_frames`.
+"""
+import argparse
+import signal
+import time
+
+import numpy as np
+
+from shm_util import attach_shm, create_shm
+
+# --- Constants -------------------------------------------------------
+BUS_NAME     = 'saymour_frames'
+N_SLOTS      = 4
+BUS_MAGIC    = 0x53465242          # 'SFRB'
+ALIGN        = 64                  # cache-line align the frame buffers
+
+_HEADER = np.dtype([
+    ('magic', '<u4'),
+    ('n_slots', '<u4'),
+    ('height', '<u4'),
+    ('width', '<u4'),
+    ('channels', '<u4'),
+    ('pad', '<u4'),
+    ('latest', '<i8'),             # frame_no of the newest complete frame, -1 before the first
+])
+_SLOT = np.dtype([
+    ('seq', '<u8'),                # odd while the writer fills the slot
+    ('frame_no', '<i8'),
+    ('t_ns', '<u8'),               # time.monotonic_ns() of the capture
+])
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _layout(n_slots, shape):
+    slots_at = _align(_HEADER.itemsize)
+    frames_at = _align(slots_at + n_slots * _SLOT.itemsize)
+    frame_bytes = _align(int(np.prod(shape)))
+    return slots_at, frames_at, frame_bytes, frames_at + n_slots * frame_bytes
+
+
+def _map(buf, n_slots, shape):
+    slots_at, frames_at, frame_bytes, _ = _layout(n_slots, shape)
+    header = np.ndarray((), dtype=_HEADER, buffer=buf)
+    slots = np.ndarray((n_slots,), dtype=_SLOT, buffer=buf, offset=slots_at)
+    frames = [np.ndarray(shape, dtype=np.uint8, buffer=buf, offset=frames_at + i * frame_bytes)
+              for i in range(n_slots)]
+    return header, slots, frames
+
+
+class FrameBusWriter:
+    """Producer side. Either write(frame), or capture straight into begin() and then commit()."""
+
+    def __init__(self, width, height, channels=3, n_slots=N_SLOTS, name=BUS_NAME):
+        shape = (height, width, channels)
+        self.shm = create_shm(name, _layout(n_slots, shape)[3])
+        self.header, self.slots, self.frames = _map(self.shm.buf, n_slots, shape)
+        self.header['n_slots'] = n_slots
+        self.header['height'] = height
+        self.header['width'] = width
+        self.header['channels'] = channels
+        self.header['latest'] = -1
+        self.slots['seq'] = 0
+        self.slots['frame_no'] = -1
+        self.header['magic'] = BUS_MAGIC   # last: readers wait for it
+        self.n_slots = n_slots
+        self.frame_no = -1
+
+    def begin(self):
+        """Claim the next slot and return its buffer to fill in place."""
+        self._slot = (self.frame_no + 1) % self.n_slots
+        self.slots[self._slot]['seq'] += 1           # odd: being written
+        return self.frames[self._slot]
+
+    def commit(self, t_ns=None):
+        """Publish the slot claimed by begin()."""
+        slot = self.slots[self._slot]
+        self.frame_no += 1
+        slot['frame_no'] = self.frame_no
+        slot['t_ns'] = time.monotonic_ns() if t_ns is None else t_ns
+        slot['seq'] += 1                             # even: consistent
+        self.header['latest'] = self.frame_no
+        return self.frame_no
+
+    def write(self, frame, t_ns=None):
+        self.begin()[...] = frame
+        return self.commit(t_ns)
+
+    def close(self):
+        del self.header, self.slots, self.frames
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FrameBusReader:
+    """Consumer side; attaches lazily, so it may start before the capture process."""
+
+    def __init__(self, name=BUS_NAME):
+        self.name = name
+        self.shm = None
+        self.shape = None
+
+    def _attach(self):
+        try:
+            shm = attach_shm(self.name)
+        except FileNotFoundError:
+            return False
+        header = np.ndarray((), dtype=_HEADER, buffer=shm.buf)
+        if int(header['magic']) != BUS_MAGIC:
+            # writer still initialising
+            del header
+            shm.close()
+            return False
+        self.shm = shm
+        self.shape = (int(header['height']), int(header['width']), int(header['channels']))
+        self.header, self.slots, self.frames = _map(shm.buf, int(header['n_slots']), self.shape)
+        self.n_slots = len(self.frames)
+        return True
+
+    def read_latest(self, retries=10):
+        """
+        Newest complete frame, without copying.
+        :return: (frame_no, t_ns, image view) or None if nothing is published yet
+        """
+        if self.shm is None and not self._attach():
+            return None
+        for _ in range(retries):
+            latest = int(self.header['latest'])
+            if latest < 0:
+                return None
+            i = latest % self.n_slots
+            s1 = int(self.slots[i]['seq'])
+            if s1 & 1:
+                continue
+            frame_no = int(self.slots[i]['frame_no'])
+            t_ns = int(self.slots[i]['t_ns'])
+            if frame_no == latest and int(self.slots[i]['seq']) == s1:
+                return frame_no, t_ns, self.frames[i]
+        return None
+
+    def wait_latest(self, after=-1, timeout=1.0, poll=0.001):
+        """Like read_latest(), but waits for a frame newer than `after`. None on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            got = self.read_latest()
+            if got is not None and got[0] > after:
+                return got
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def still_valid(self, frame_no):
+        """True if the view returned for `frame_no` has not been overwritten since."""
+        i = frame_no % self.n_slots
+        return int(self.slots[i]['seq']) & 1 == 0 and int(self.slots[i]['frame_no']) == frame_no
+
+    def close(self):
+        if self.shm is not None:
+            del self.header, self.slots, self.frames
+            self.shm.close()
+            self.shm = None
+
+
+# --- Capture process --------------------------------------------------
+
+def capture(source, width, height, n_slots=N_SLOTS, name=BUS_NAME):
+    """Own the camera and feed the bus until SIGINT/SIGTERM."""
+    import cv2
+
+    writer = FrameBusWriter(width, height, 3, n_slots, name)
+    running = [True]
+
+    def stop(signum, frame):
+        running[0] = False
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    if source.startswith('picamera'):
+        from picamera2 import Picamera2
+        cam = Picamera2(int(source[8:] or 0))
+        cam.configure(cam.create_video_configuration(main={"format": 'XRGB8888', "size": (width, height)}))
+        cam.start()
+
+        def grab(buf):
+            raw = cam.capture_array()
+            cv2.cvtColor(raw, cv2.COLOR_BGRA2BGR, dst=buf)
+            return True
+    else:
+        cap = cv2.VideoCapture(int(source[3:]) if source.startswith('usb') else source)
+        cap.set(3, width)
+        cap.set(4, height)
+
+        def grab(buf):
+            ret, img = cap.read(buf)
+            if not ret or img is None:
+                return False
+            if img is not buf:
+                # the camera ignored the requested size
+                cv2.resize(img, (width, height), dst=buf)
+            return True
+
+    print(f"📷 Frame bus '{name}': {width}x{height} BGR, {n_slots} slots", flush=True)
+    frames = 0
+    t0 = time.monotonic()
+    try:
+        while running[0]:
+            t_ns = time.monotonic_ns()
+            if not grab(writer.begin()):
+                print("⚠ Camera stream ended", flush=True)
+                break
+            writer.commit(t_ns)
+            frames += 1
+    finally:
+        elapsed = time.monotonic() - t0
+        print(f"📷 Frame bus stopped after {frames} frames ({frames / max(elapsed, 1e-9):.1f} fps)", flush=True)
+        if source.startswith('picamera'):
+            cam.stop()
+        else:
+            cap.release()
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture process for the shared-memory frame bus')
+    parser.add_argument('--source', default='picamera0', help='picamera0, usb0 or a video file')
+    parser.add_argument('--resolution', default='1280x720', help='WxH of the frames on the bus')
+    parser.add_argument('--slots', type=int, default=N_SLOTS, help='ring size')
+    parser.add_argument('--name', default=BUS_NAME, help='shared memory block name')
+    args = parser.parse_args()
+    width, height = map(int, args.resolution.split('x'))
+    capture(args.source, width, height, args.slots, args.name)
+
+
+if __name__ == "__main__":
+    main()
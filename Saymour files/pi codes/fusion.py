@@ -0,0 +1,272 @@
+"""
+Camera–ultrasonic fusion for following a person.
+
+yolo_detect.py turns the tracked person's bounding box into a bearing and a
+range estimate (pinhole model with the camera intrinsics and an assumed
+person height) and publishes it through a small shared-memory block
+(TargetWriter). main_combined.py reads the latest estimate each tick
+(TargetReader) and TargetFusion combines it with the front HC-SR04 range:
+
+  * range: constant-velocity Kalman filter; the camera range is noisy but
+    always about the person, the ultrasonic range is precise but only about
+    the person when they are inside its cone
+  * bearing: low-pass filtered camera bearing, dropped when the target goes
+    stale
+
+The shared block is a single record guarded by a sequence counter
+(seqlock): the writer makes the counter odd while it writes and even when
+done, and the reader retries if the counter was odd or changed under it.
+A read is a handful of NumPy scalar loads, well under a millisecond.
+"""
+import time
+from math import atan, cos, degrees, radians, tan
+
+import numpy as np
+
+from shm_util import REATTACH_AFTER, attach_shm, create_shm, shm_inode
+
+# --- Constants -------------------------------------------------------
+SHM_NAME            = 'saymour_target'
+HFOV_DEG            = 66.0    # Camera Module 3 horizontal field of view
+VFOV_DEG            = 41.0    # Camera Module 3 vertical field of view
+PERSON_HEIGHT_M     = 1.70    # assumed height of the person being followed
+SONAR_HALF_CONE_DEG = 15.0    # HC-SR04 beam half-angle
+SONAR_MAX_CM        = 400.0   # readings beyond this are treated as no echo
+CAMERA_RANGE_REL    = 0.15    # camera range std dev, as a fraction of the range
+SONAR_RANGE_STD     = 2.0     # ultrasonic range std dev (cm)
+RANGE_ACCEL_STD     = 150.0   # process noise: relative acceleration (cm/s^2)
+BEARING_ALPHA       = 0.5     # low-pass weight of a new bearing measurement
+TARGET_TIMEOUT      = 0.5     # camera estimates older than this are ignored (s)
+EDGE_MARGIN_PX      = 4       # boxes this close to the top/bottom edge are cut off
+
+_RECORD = np.dtype([
+    ('seq', '<u8'),
+    ('t_ns', '<u8'),          # time.monotonic_ns() of the frame
+    ('bearing', '<f8'),       # degrees, positive to the right
+    ('range', '<f8'),         # cm, NaN when the box is cut off
+    ('conf', '<f8'),
+    ('valid', '<u8'),         # 0 when no person is in view
+])
+
+
+class CameraIntrinsics:
+    """Pinhole intrinsics derived from the frame size and the lens field of view."""
+
+    def __init__(self, width, height, hfov_deg=HFOV_DEG, vfov_deg=VFOV_DEG):
+        self.width = width
+        self.height = height
+        self.fx = (width / 2.0) / tan(radians(hfov_deg) / 2.0)
+        self.fy = (height / 2.0) / tan(radians(vfov_deg) / 2.0)
+        self.cx = width / 2.0
+        self.cy = height / 2.0
+
+
+def estimate_from_box(box, intr, person_height=PERSON_HEIGHT_M):
+    """
+    Bearing (deg) and slant range (cm) of a person from their bounding box.
+    The range is None when the box is cut off by the frame edge, since the
+    visible height then says nothing about the distance.
+    """
+    xmin, ymin, xmax, ymax = box
+    bearing = degrees(atan(((xmin + xmax) / 2.0 - intr.cx) / intr.fx))
+    h = ymax - ymin
+    if h <= 0 or ymin <= EDGE_MARGIN_PX or ymax >= intr.height - EDGE_MARGIN_PX:
+        return bearing, None
+    depth_m = intr.fy * person_height / h
+    return bearing, depth_m / cos(radians(bearing)) * 100.0
+
+
+def pick_target(detections, previous_bearing=None, intr=None):
+    """
+    Choose the person to follow from yolo_detect's filtered detections:
+    the one closest in bearing to the previous target, otherwise the largest box.
+    """
+    people = [d for d in detections if d[0] == 'Person']
+    if not people:
+        return None
+    if previous_bearing is not None and intr is not None:
+        return min(people, key=lambda d: abs(estimate_from_box(d[3], intr)[0] - previous_bearing))
+    return max(people, key=lambda d: (d[3][2] - d[3][0]) * (d[3][3] - d[3][1]))
+
+
+class TargetWriter:
+    """Publishes the latest person estimate from the detection process."""
+
+    def __init__(self, name=SHM_NAME):
+        self.shm = create_shm(name, _RECORD.itemsize)
+        self.rec = np.ndarray((), dtype=_RECORD, buffer=self.shm.buf)
+        self.rec['seq'] = 0
+        self.rec['valid'] = 0
+
+    def publish(self, bearing, range_cm, conf, t_ns=None):
+        rec = self.rec
+        rec['seq'] += 1                      # odd: write in progress
+        rec['t_ns'] = time.monotonic_ns() if t_ns is None else t_ns
+        rec['bearing'] = bearing
+        rec['range'] = np.nan if range_cm is None else range_cm
+        rec['conf'] = conf
+        rec['valid'] = 1
+        rec['seq'] += 1                      # even: record is consistent
+
+    def clear(self):
+        rec = self.rec
+        rec['seq'] += 1
+        rec['t_ns'] = time.monotonic_ns()
+        rec['valid'] = 0
+        rec['seq'] += 1
+
+    def close(self):
+        del self.rec
+        self.shm.close()
+        self.shm.unlink()
+
+
+class TargetReader:
+    """
+    Reads the latest person estimate; returns None until the writer exists or
+    when no person is seen. While the record stays unchanged the reader checks
+    every REATTACH_AFTER s whether the writer has been restarted with a new
+    block, and attaches to that one.
+    """
+
+    def __init__(self, name=SHM_NAME):
+        self.name = name
+        self.shm = None
+        self.rec = None
+        self.inode = None
+        self.last_seq = -1
+        self.t_check = 0.0
+
+    def _attach(self):
+        try:
+            self.shm = attach_shm(self.name)
+        except FileNotFoundError:
+            return False
+        self.inode = shm_inode(self.name)
+        self.rec = np.ndarray((), dtype=_RECORD, buffer=self.shm.buf)
+        self.last_seq = -1
+        self.t_check = time.monotonic()
+        return True
+
+    def _stale(self):
+        """True when the record has not moved for REATTACH_AFTER s and the name now points at another block."""
+        seq = int(self.rec['seq'])
+        now = time.monotonic()
+        if seq != self.last_seq:
+            self.last_seq = seq
+            self.t_check = now
+            return False
+        if now - self.t_check < REATTACH_AFTER:
+            return False
+        self.t_check = now
+        return shm_inode(self.name) != self.inode
+
+    def read(self, retries=10):
+        """
+        :return: (t_ns, bearing_deg, range_cm or None, conf) or None
+        """
+        if self.rec is None and not self._attach():
+            return None
+        if self._stale():
+            self.close()
+            if not self._attach():
+                return None
+        rec = self.rec
+        for _ in range(retries):
+            s1 = int(rec['seq'])
+            if s1 & 1:
+                continue
+            valid = int(rec['valid'])
+            t_ns = int(rec['t_ns'])
+            bearing = float(rec['bearing'])
+            range_cm = float(rec['range'])
+            conf = float(rec['conf'])
+            if int(rec['seq']) == s1:
+                if not valid:
+                    return None
+                return t_ns, bearing, (None if range_cm != range_cm else range_cm), conf
+        return None
+
+    def close(self):
+        if self.shm is not None:
+            self.rec = None
+            self.shm.close()
+            self.shm = None
+
+
+class TargetFusion:
+    """
+    Fuses the camera estimate with the front ultrasonic range into a
+    target-relative (range, bearing) for the controllers. The two-state
+    filter is written out in scalars (P is symmetric: p00, p01, p11), so a
+    tick builds no arrays; this runs in every control tick, steady-state
+    mode included.
+    """
+
+    def __init__(self):
+        self.range = None             # cm
+        self.rate = 0.0               # cm/s
+        self.p00, self.p01, self.p11 = 1e4, 0.0, 1e4
+        self.bearing = None
+        self.last_t = None
+
+    def _predict(self, dt):
+        # x = F x, P = F P F' + Q with F = [[1, dt], [0, 1]] and white acceleration noise
+        q = RANGE_ACCEL_STD * RANGE_ACCEL_STD
+        dt2 = dt * dt
+        p01, p11 = self.p01, self.p11
+        self.range += dt * self.rate
+        self.p00 += dt * (2.0 * p01 + dt * p11) + q * dt2 * dt2 / 4
+        self.p01 = p01 + dt * p11 + q * dt2 * dt / 2
+        self.p11 = p11 + q * dt2
+
+    def _correct(self, z, std):
+        # H = [1, 0]: K = P H' / (p00 + r), P -= K H P
+        p00, p01 = self.p00, self.p01
+        s = p00 + std * std
+        k0, k1 = p00 / s, p01 / s
+        innovation = z - self.range
+        self.range += k0 * innovation
+        self.rate += k1 * innovation
+        self.p00 = p00 - k0 * p00
+        self.p01 = p01 - k0 * p01
+        self.p11 -= k1 * p01
+
+    def update(self, sonar_cm, target, now_ns=None):
+        """
+        One fusion step per control tick.
+        :param sonar_cm: front ultrasonic range (cm)
+        :param target: TargetReader.read() result or None
+        :return: (range_cm, bearing_deg or None)
+        """
+        now_ns = time.monotonic_ns() if now_ns is None else now_ns
+        fresh = target is not None and (now_ns - target[0]) < TARGET_TIMEOUT * 1e9
+        sonar_ok = 0.0 < sonar_cm < SONAR_MAX_CM
+
+        if fresh:
+            _, bearing, cam_range, _ = target
+            self.bearing = bearing if self.bearing is None else \
+                self.bearing + BEARING_ALPHA * (bearing - self.bearing)
+        else:
+            cam_range = None
+            self.bearing = None
+
+        if self.range is None:
+            start = sonar_cm if sonar_ok else cam_range
+            if start is None:
+                return sonar_cm, self.bearing
+            self.range = float(start)
+            self.rate = 0.0
+            self.last_t = now_ns
+        else:
+            dt = max((now_ns - self.last_t) / 1e9, 1e-3)
+            self.last_t = now_ns
+            self._predict(dt)
+
+        if cam_range is not None:
+            self._correct(cam_range, CAMERA_RANGE_REL * cam_range)
+        # the ultrasonic only measures the person when they are inside its cone;
+        # with no camera target it is all there is, as before fusion
+        if sonar_ok and (not fresh or abs(self.bearing) <= SONAR_HALF_CONE_DEG):
+            self._correct(sonar_cm, SONAR_RANGE_STD)
+        return self.range, self.bearing
@@ -36,3 +36,23 @@ class FuzzyForDistance:
         self.sim.compute()
         # Return the defuzzified speed
         return self.sim.output['speed']
+
+    def to_fis(self, name='fuzzy_controller_dist'):
+        """Describe the controller as a FIS dict (see fis_io); same MFs and rules as above."""
+        return {
+            'name': name,
+            'type': 'mamdani',
+            'and_method': 'min', 'or_method': 'max', 'imp_method': 'min',
+            'agg_method': 'max', 'defuzz_method': 'centroid',
+            'inputs': [{'name': 'input1', 'range': (0, 80), 'mfs': [
+                ('near', 'trapmf', [0, 0, 15, 30]),
+                ('medium', 'trimf', [20, 40, 60]),
+                ('far', 'trapmf', [50, 65, 80, 80]),
+            ]}],
+            'outputs': [{'name': 'speed', 'range': (0, 1.4), 'mfs': [
+                ('slow', 'trapmf', [0, 0, 0.4, 0.7]),
+                ('maintain', 'trimf', [0.4, 0.7, 1]),
+                ('fast', 'trapmf', [0.7, 1, 1.4, 1.4]),
+            ]}],
+            'rules': [([1], [3], 1.0, 1), ([2], [2], 1.0, 1), ([3], [1], 1.0, 1)],
+        }
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Offline tuner for the follow-distance fuzzy controller.
+
+The free MF breakpoints of a FIS (by default the one in
+fuzzydisttest.FuzzyForDistance) are treated as one parameter vector. Each
+candidate is scored by simulating the 10 Hz follow-distance loop against a
+set of person-following scenarios, simulated or replayed from logs, and the
+search is a differential evolution whose population is scored in parallel
+across a multiprocessing pool. Every evaluation is vectorized over
+candidates x scenarios, so a generation costs one pass through the
+simulation rather than one pass per candidate.
+
+    python fuzzy_tuner.py --population 128 --generations 40 --export-fis tuned.fis
+    python fuzzy_tuner.py --seed-fis fuzzydistnew.fis --trace run1.csv --trace run2.csv
+
+Trace CSVs need a header with 'time' (s), 'distance' (cm) and 'speed'
+(commanded m/s) columns, as logged from the control loop.
+"""
+import argparse
+import csv
+import datetime
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from fis_io import read_fis, write_fis
+from fuzzy_vec import mamdani_batch
+
+# --- Simulation constants ---------------------------------------------
+SAMPLE_DT      = 0.1    # control loop interval (s), as in main_combined.py
+TARGET_DIST    = 40.0   # distance to hold from the person (cm)
+COLLIDE_DIST   = 10.0   # closer than this counts as a collision (cm)
+LOST_DIST      = 80.0   # sensor range; further than this the person is lost (cm)
+SENSOR_NOISE   = 1.0    # HC-SR04 noise, std dev (cm)
+RESPONSE_TAU   = 0.3    # first-order motor response time constant (s)
+SCENARIO_STEPS = 300    # 30 s per simulated scenario
+
+# --- Cost weights -----------------------------------------------------
+W_TRACKING = 1.0        # mean |distance - target| (cm)
+W_BAND     = 200.0      # fraction of time collided or lost
+W_SMOOTH   = 20.0       # mean |change in commanded speed| (m/s per tick)
+
+# Output universe samples used while searching (the exported FIS is
+# evaluated by the engines at their own resolution)
+SEARCH_POINTS = 101
+
+
+class ParamSpace:
+    """
+    Maps a FIS dict to a flat vector of its free MF breakpoints and back.
+    A breakpoint sitting on its variable's range limit is an open shoulder
+    and stays fixed; every other breakpoint is free within the range.
+    """
+
+    def __init__(self, fis, tune_output=True):
+        self.fis = fis
+        self.variables = list(fis['inputs'])
+        if tune_output:
+            self.variables += fis['outputs']
+        self.n_inputs = len(fis['inputs'])
+
+        self.free = []          # per variable, per MF: bool mask of free params
+        lower, upper, x0 = [], [], []
+        for var in self.variables:
+            lo, hi = var['range']
+            masks = []
+            for _, _, params in var['mfs']:
+                mask = [not (p == lo or p == hi) for p in params]
+                masks.append(mask)
+                for p, free in zip(params, mask):
+                    if free:
+                        lower.append(lo)
+                        upper.append(hi)
+                        x0.append(p)
+            self.free.append(masks)
+        self.lower = np.array(lower, dtype=float)
+        self.upper = np.array(upper, dtype=float)
+        self.x0 = np.array(x0, dtype=float)
+
+    @property
+    def size(self):
+        return self.x0.size
+
+    def mf_arrays(self, X):
+        """
+        Full, ordered parameter arrays for a population.
+        :param X: array (N, size)
+        :return: per variable, list of (mf_type, params (N, p))
+        """
+        X = np.atleast_2d(X)
+        col = 0
+        out = []
+        for var, masks in zip(self.variables, self.free):
+            mfs = []
+            for (_, mf_type, params), mask in zip(var['mfs'], masks):
+                full = np.tile(np.asarray(params, dtype=float), (X.shape[0], 1))
+                for j, free in enumerate(mask):
+                    if free:
+                        full[:, j] = X[:, col]
+                        col += 1
+                mfs.append((mf_type, np.sort(full, axis=1)))
+            out.append(mfs)
+        return out
+
+    def repair(self, X):
+        """Clip into range and sort breakpoints so each MF stays well formed."""
+        X = np.clip(X, self.lower, self.upper)
+        col = 0
+        for masks, mfs in zip(self.free, self.mf_arrays(X)):
+            for mask, (_, params) in zip(masks, mfs):
+                for j, free in enumerate(mask):
+                    if free:
+                        X[:, col] = params[:, j]
+                        col += 1
+        return X
+
+    def to_fis(self, x, name):
+        fis = dict(self.fis)
+        fis['name'] = name
+        variables = []
+        for var, mfs in zip(self.variables, self.mf_arrays(x)):
+            variables.append({
+                'name': var['name'],
+                'range': var['range'],
+                'mfs': [(n, t, [float(v) for v in p[0]]) for (n, _, _), (t, p) in zip(var['mfs'], mfs)],
+            })
+        fis['inputs'] = variables[:self.n_inputs]
+        if len(variables) > self.n_inputs:
+            fis['outputs'] = variables[self.n_inputs:]
+        return fis
+
+
+# --- Scenarios --------------------------------------------------------
+
+def simulated_scenarios(steps=SCENARIO_STEPS, seed=0):
+    """
+    Person walking-speed profiles (m/s per tick) with a starting distance.
+    :return: list of (name, person_speed (steps,), initial_distance_cm)
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(steps) * SAMPLE_DT
+    wander = np.convolve(rng.normal(0.0, 0.35, steps + 20), np.ones(20) / 20, mode='valid')[:steps]
+    return [
+        ('steady', np.full(steps, 1.0), TARGET_DIST),
+        ('slow', np.full(steps, 0.6), 60.0),
+        ('stop_and_go', np.where((t // 5) % 2 == 0, 1.2, 0.0), TARGET_DIST),
+        ('speed_up', np.linspace(0.4, 1.6, steps), 25.0),
+        ('wander', np.clip(0.9 + wander, 0.0, 1.6), 50.0),
+    ]
+
+
+def load_trace(path):
+    """
+    Rebuild the person's speed from a logged run: the gap changes by the
+    rover's speed minus the person's, so v_person = v_rover - d(gap)/dt.
+    """
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    t = np.array([float(r['time']) for r in rows])
+    dist = np.array([float(r['distance']) for r in rows])
+    speed = np.array([float(r['speed']) for r in rows])
+    v_person = speed[:-1] - np.diff(dist) / 100.0 / np.diff(t)
+    grid = np.arange(t[0], t[-2], SAMPLE_DT)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name, np.clip(np.interp(grid, t[:-1], v_person), 0.0, None), float(dist[0])
+
+
+# --- Simulation -------------------------------------------------------
+
+def simulate(space, X, scenarios, noise_seed=0, n_points=SEARCH_POINTS, detail=False):
+    """
+    Run the follow-distance loop for every candidate against every scenario.
+    :param X: array (P, size) of candidate vectors
+    :return: cost array (P,), or (cost, per-row metrics) with detail=True
+    """
+    X = np.atleast_2d(X)
+    P, S = X.shape[0], len(scenarios)
+    steps = min(len(v) for _, v, _ in scenarios)
+    person = np.stack([v[:steps] for _, v, _ in scenarios])           # (S, T)
+    noise = np.random.default_rng(noise_seed).normal(0.0, SENSOR_NOISE, (S, steps))
+
+    # rows are candidate-major: row = p * S + s
+    mfs = [[(t, np.repeat(p, S, axis=0)) for t, p in var] for var in space.mf_arrays(X)]
+    in_mfs = mfs[:space.n_inputs]
+    out_var = space.fis['outputs'][0]
+    if len(mfs) > space.n_inputs:
+        out_mfs = mfs[space.n_inputs]
+    else:
+        out_mfs = [(t, p) for _, t, p in out_var['mfs']]
+    rules = np.array([[a - 1 for a in ante] for ante, _, _, _ in space.fis['rules']], dtype=int)
+    consequents = np.array([cons[0] - 1 for _, cons, _, _ in space.fis['rules']], dtype=int)
+    in_ranges = [var['range'] for var in space.fis['inputs']]
+
+    d = np.tile(np.array([d0 for _, _, d0 in scenarios], dtype=float), P)
+    v = np.zeros(P * S)
+    u_prev = np.zeros(P * S)
+    prev_meas = np.clip(d + np.tile(noise[:, 0], P), *in_ranges[0])
+    alpha = SAMPLE_DT / (RESPONSE_TAU + SAMPLE_DT)
+
+    err = np.zeros(P * S)
+    out_of_band = np.zeros(P * S)
+    jerk = np.zeros(P * S)
+    for t in range(steps):
+        meas = np.clip(d + np.tile(noise[:, t], P), *in_ranges[0])
+        inputs = [meas]
+        if space.n_inputs > 1:
+            inputs.append(np.clip(meas - prev_meas, *in_ranges[1]))
+        u = mamdani_batch(inputs, in_mfs, out_mfs, rules, consequents, out_var['range'],
+                          n_points=n_points)
+        v += (u - v) * alpha
+        d = np.maximum(d + (v - np.tile(person[:, t], P)) * 100.0 * SAMPLE_DT, 0.0)
+
+        # once the person is lost, further drift only counts as out of band
+        err += np.minimum(np.abs(d - TARGET_DIST), LOST_DIST)
+        out_of_band += (d < COLLIDE_DIST) | (d > LOST_DIST)
+        if t:
+            jerk += np.abs(u - u_prev)
+        u_prev = u
+        prev_meas = meas
+
+    err /= steps
+    out_of_band /= steps
+    jerk /= max(steps - 1, 1)
+    row_cost = W_TRACKING * err + W_BAND * out_of_band + W_SMOOTH * jerk
+    cost = row_cost.reshape(P, S).mean(axis=1)
+    if detail:
+        return cost, {'error_cm': err.reshape(P, S), 'out_of_band': out_of_band.reshape(P, S),
+                      'speed_change': jerk.reshape(P, S)}
+    return cost
+
+
+# --- Parallel evaluation ----------------------------------------------
+
+_worker_space = None
+_worker_scenarios = None
+
+
+def _init_worker(space, scenarios):
+    global _worker_space, _worker_scenarios
+    _worker_space = space
+    _worker_scenarios = scenarios
+
+
+def _evaluate_chunk(X):
+    return simulate(_worker_space, X, _worker_scenarios)
+
+
+def evaluate_population(pool, X, n_chunks):
+    chunks = [c for c in np.array_split(X, n_chunks) if len(c)]
+    if pool is None:
+        return np.concatenate([_evaluate_chunk(c) for c in chunks])
+    return np.concatenate(pool.map(_evaluate_chunk, chunks))
+
+
+def differential_evolution(space, pool, n_chunks, population=128, generations=40,
+                           F=0.6, CR=0.9, spread=0.15, seed=0, log=print):
+    """
+    DE/rand/1/bin around the seed vector. Returns (best vector, best cost,
+    number of candidates evaluated).
+    """
+    rng = np.random.default_rng(seed)
+    width = space.upper - space.lower
+    pop = space.x0 + rng.uniform(-spread, spread, (population, space.size)) * width
+    pop[0] = space.x0
+    pop = space.repair(pop)
+    cost = evaluate_population(pool, pop, n_chunks)
+    evaluated = population
+
+    for gen in range(generations):
+        idx = np.array([rng.choice(population, 3, replace=False) for _ in range(population)])
+        mutant = pop[idx[:, 0]] + F * (pop[idx[:, 1]] - pop[idx[:, 2]])
+        cross = rng.random((population, space.size)) < CR
+        cross[np.arange(population), rng.integers(0, space.size, population)] = True
+        trial = space.repair(np.where(cross, mutant, pop))
+        trial_cost = evaluate_population(pool, trial, n_chunks)
+        evaluated += population
+
+        better = trial_cost < cost
+        pop[better] = trial[better]
+        cost[better] = trial_cost[better]
+        log(f"gen {gen + 1:3d}: best={cost.min():.3f} median={np.median(cost):.3f} "
+            f"improved={int(better.sum())}")
+
+    best = int(np.argmin(cost))
+    return pop[best], float(cost[best]), evaluated
+
+
+# --- Export -----------------------------------------------------------
+
+def write_python_config(path, fis, note):
+    """Write the tuned MFs in the dict layout used by fuzzydisttest.FuzzyForDistance."""
+    def mf_dict(var):
+        body = ''.join(f"    '{n}': ('{t}', [{', '.join(f'{v:.4g}' for v in p)}]),\n"
+                       for n, t, p in var['mfs'])
+        return '{\n' + body + '}'
+
+    names = ['in1_MFs', 'in2_MFs'][:len(fis['inputs'])]
+    with open(path, 'w') as f:
+        f.write(f"# {note}\n")
+        for name, var in zip(names, fis['inputs']):
+            f.write(f"{name} = {mf_dict(var)}\n")
+        f.write(f"out_MFs = {mf_dict(fis['outputs'][0])}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune fuzzy MF breakpoints against follow-distance scenarios')
+    parser.add_argument('--seed-fis', default=None,
+                        help='FIS to start from (default: fuzzydisttest.FuzzyForDistance)')
+    parser.add_argument('--trace', action='append', default=[],
+                        help='logged run CSV to replay (time,distance,speed); can repeat')
+    parser.add_argument('--no-simulated', action='store_true', help='use only the replayed traces')
+    parser.add_argument('--inputs-only', action='store_true', help='keep the output MFs fixed')
+    parser.add_argument('--population', type=int, default=128)
+    parser.add_argument('--generations', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--export-fis', default='tuned.fis')
+    parser.add_argument('--export-py', default=None, help='also write a Python MF config')
+    args = parser.parse_args()
+
+    if args.seed_fis:
+        fis = read_fis(args.seed_fis)
+    else:
+        from fuzzydisttest import FuzzyForDistance
+        fis = FuzzyForDistance().to_fis()
+
+    scenarios = [] if args.no_simulated else simulated_scenarios(seed=args.seed)
+    scenarios += [load_trace(p) for p in args.trace]
+    if not scenarios:
+        parser.error('no scenarios: give --trace files or drop --no-simulated')
+
+    space = ParamSpace(fis, tune_output=not args.inputs_only)
+    print(f"Tuning {space.size} parameters of '{fis['name']}' on {len(scenarios)} scenarios "
+          f"with {args.workers} workers")
+
+    t0 = time.perf_counter()
+    n_chunks = max(1, args.workers)
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(space, scenarios))
+    else:
+        _init_worker(space, scenarios)
+        pool = None
+    try:
+        baseline = float(simulate(space, space.x0, scenarios)[0])
+        print(f"Seed cost: {baseline:.3f}")
+        best, best_cost, evaluated = differential_evolution(
+            space, pool, n_chunks, population=args.population,
+            generations=args.generations, seed=args.seed)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - t0
+    print(f"Evaluated {evaluated} candidates in {elapsed:.1f} s "
+          f"({evaluated / elapsed:.1f} candidates/s)")
+
+    _, detail = simulate(space, np.vstack([space.x0, best]), scenarios, detail=True)
+    for s, (name, _, _) in enumerate(scenarios):
+        print(f"  {name:12s} error {detail['error_cm'][0, s]:6.1f} → {detail['error_cm'][1, s]:6.1f} cm, "
+              f"out of band {detail['out_of_band'][0, s]:5.1%} → {detail['out_of_band'][1, s]:5.1%}")
+
+    note = (f"Tuned by fuzzy_tuner.py on {datetime.date.today().isoformat()}: "
+            f"cost {baseline:.3f} -> {best_cost:.3f}")
+    tuned = space.to_fis(best, name=os.path.splitext(os.path.basename(args.export_fis))[0])
+    write_fis(args.export_fis, tuned)
+    print(f"Wrote {args.export_fis} ({note})")
+    if args.export_py:
+        write_python_config(args.export_py, tuned, note)
+        print(f"Wrote {args.export_py}")
+
+
+if __name__ == "__main__":
+    main()
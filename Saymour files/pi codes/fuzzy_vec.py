@@ -0,0 +1,119 @@
+"""
+Vectorized Mamdani inference over many input points and many parameter sets
+at once. Used by the offline tools (tuner, rule learning, batch evaluation);
+the on-robot controllers keep their own scalar code paths.
+
+Semantics follow fuzzydisttest: trapmf/trimf with open shoulders, min AND,
+min implication, max aggregation and centroid defuzzification over a sampled
+output universe, returning the middle of the output range when no rule fires.
+"""
+import numpy as np
+
+
+def as_trap(mf_type, params):
+    """Express a trimf/trapmf parameter array (..., 3 or 4) as trapmf (..., 4)."""
+    params = np.asarray(params, dtype=float)
+    if mf_type == 'trapmf':
+        return params
+    elif mf_type == 'trimf':
+        return np.stack([params[..., 0], params[..., 1], params[..., 1], params[..., 2]], axis=-1)
+    else:
+        raise ValueError(f"Unsupported MF type: {mf_type}")
+
+
+def trap_batch(x, params):
+    """
+    Trapezoidal membership of x with broadcastable per-row parameters.
+    :param x: array of crisp values, any shape
+    :param params: array (..., 4) of [a, b, c, d], broadcast against x
+    """
+    a, b, c, d = (params[..., i] for i in range(4))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        asc = np.where(b > a, (x - a) / np.where(b > a, b - a, 1.0), np.where(x >= b, 1.0, 0.0))
+        desc = np.where(d > c, (d - x) / np.where(d > c, d - c, 1.0), np.where(x <= c, 1.0, 0.0))
+    return np.clip(np.minimum(asc, desc), 0.0, 1.0)
+
+
+def mf_batch(x, mf_type, params):
+    return trap_batch(x, as_trap(mf_type, params))
+
+
+def firing_strengths(inputs, in_mfs, rules, and_method='min'):
+    """
+    Rule firing strengths for every row.
+    :param inputs: list of arrays (N,), one per input variable
+    :param in_mfs: per input, list of (mf_type, params); params (p,) or (N, p)
+    :param rules: int array (R, n_inputs) of 0-based MF indices, -1 for "don't care"
+    :return: array (N, R)
+    """
+    memberships = []
+    for x, mfs in zip(inputs, in_mfs):
+        x = np.asarray(x, dtype=float)
+        memberships.append(np.stack([mf_batch(x, t, p) for t, p in mfs], axis=-1))
+
+    rules = np.asarray(rules, dtype=int)
+    n = memberships[0].shape[0]
+    strength = np.ones((n, rules.shape[0]))
+    for k, mu in enumerate(memberships):
+        idx = rules[:, k]
+        care = idx >= 0
+        vals = np.ones((n, rules.shape[0]))
+        vals[:, care] = mu[:, idx[care]]
+        if and_method == 'min':
+            np.minimum(strength, vals, out=strength)
+        elif and_method == 'prod':
+            strength *= vals
+        else:
+            raise ValueError(f"Unknown AND method: {and_method}")
+    return strength
+
+
+def mamdani_batch(inputs, in_mfs, out_mfs, rules, consequents, out_range,
+                  weights=None, and_method='min', n_points=1000):
+    """
+    Crisp outputs of a single-output Mamdani system for N rows.
+    :param consequents: int array (R,) of 0-based output MF indices
+    :param out_mfs: list of (mf_type, params); params (p,) or (N, p)
+    :return: array (N,)
+    """
+    strength = firing_strengths(inputs, in_mfs, rules, and_method)
+    if weights is not None:
+        strength = strength * np.asarray(weights, dtype=float)
+
+    consequents = np.asarray(consequents, dtype=int)
+    n = strength.shape[0]
+    lo, hi = out_range
+    x_out = np.linspace(lo, hi, n_points)
+    y_agg = np.zeros((n, n_points))
+    for m, (mf_type, params) in enumerate(out_mfs):
+        fired = consequents == m
+        if not fired.any():
+            continue
+        level = strength[:, fired].max(axis=1)
+        params = as_trap(mf_type, params)
+        if params.ndim == 2:
+            params = params[:, None, :]
+        curve = trap_batch(x_out, params)
+        np.maximum(y_agg, np.minimum(curve, level[:, None]), out=y_agg)
+
+    num = y_agg @ x_out
+    den = y_agg.sum(axis=1)
+    out = np.full(n, (lo + hi) / 2.0)
+    ok = den > 0
+    out[ok] = num[ok] / den[ok]
+    return out
+
+
+def mamdani_from_fis(fis, inputs, n_points=1000):
+    """Evaluate a FIS dict (see fis_io) on arrays of crisp inputs."""
+    ranges = [var['range'] for var in fis['inputs']]
+    clipped = [np.clip(np.asarray(x, dtype=float), lo, hi) for x, (lo, hi) in zip(inputs, ranges)]
+    in_mfs = [[(t, p) for _, t, p in var['mfs']] for var in fis['inputs']]
+    out = fis['outputs'][0]
+    out_mfs = [(t, p) for _, t, p in out['mfs']]
+    rules = np.array([[a - 1 for a in ante] for ante, _, _, _ in fis['rules']], dtype=int)
+    consequents = np.array([cons[0] - 1 for _, cons, _, _ in fis['rules']], dtype=int)
+    weights = np.array([w for _, _, w, _ in fis['rules']], dtype=float)
+    and_method = fis.get('and_method', 'min')
+    return mamdani_batch(clipped, in_mfs, out_mfs, rules, consequents, out['range'],
+                         weights=weights, and_method=and_method, n_points=n_points)
@@ -74,6 +74,64 @@ class FuzzyForDistance:
             [1, 2, 2],  # 2 3, 3 (1) : 1
             [2, 2, 0],  # 3 3, 1 (1) : 1
         ]
+        # Rule weights, one per rule (the "(1)" above)
+        self.rule_weights = [1.0] * len(self.rules)
+
+    @classmethod
+    def from_fis(cls, path):
+        """
+        Build the controller from a two-input, one-output .fis file, such as
+        one written by fuzzy_tuner.py or rule_learning.py. An antecedent of 0
+        (don't care) leaves that input out of the rule; rule weights are kept.
+        NOT antecedents, OR rules and rules without a consequent raise
+        ValueError, since infer() has no way to evaluate them.
+        """
+        from fis_io import read_fis
+        fis = read_fis(path)
+        if len(fis['inputs']) != 2 or len(fis['outputs']) != 1:
+            raise ValueError(f"{path}: expected 2 inputs and 1 output")
+
+        self = cls()
+        in1, in2 = fis['inputs']
+        out = fis['outputs'][0]
+        self.in1_name, self.in1_range = in1['name'], tuple(in1['range'])
+        self.in2_name, self.in2_range = in2['name'], tuple(in2['range'])
+        self.out_name, self.out_range = out['name'], tuple(out['range'])
+        self.in1_MFs = {name: (t, list(p)) for name, t, p in in1['mfs']}
+        self.in2_MFs = {name: (t, list(p)) for name, t, p in in2['mfs']}
+        self.out_MFs = {name: (t, list(p)) for name, t, p in out['mfs']}
+        self.in1_MF_names = [name for name, _, _ in in1['mfs']]
+        self.in2_MF_names = [name for name, _, _ in in2['mfs']]
+        self.out_MF_names = [name for name, _, _ in out['mfs']]
+        self.rules = []
+        self.rule_weights = []
+        for n, (ante, cons, weight, conn) in enumerate(fis['rules'], start=1):
+            if any(a < 0 for a in ante) or cons[0] < 1 or conn != 1:
+                raise ValueError(f"{path}: rule {n} uses NOT, OR or has no consequent; "
+                                 "only AND rules with don't-care (0) antecedents are supported")
+            # None marks a don't-care input
+            self.rules.append([ante[0] - 1 if ante[0] else None,
+                               ante[1] - 1 if ante[1] else None,
+                               cons[0] - 1])
+            self.rule_weights.append(float(weight))
+        return self
+
+    def to_fis(self, name='fuzzydisttest'):
+        """Describe the controller as a FIS dict (see fis_io) for export."""
+        def variable(var_name, var_range, names, mfs):
+            return {'name': var_name, 'range': var_range,
+                    'mfs': [(n, mfs[n][0], list(mfs[n][1])) for n in names]}
+        return {
+            'name': name,
+            'type': 'mamdani',
+            'and_method': 'min', 'or_method': 'max', 'imp_method': 'min',
+            'agg_method': 'max', 'defuzz_method': 'centroid',
+            'inputs': [variable(self.in1_name, self.in1_range, self.in1_MF_names, self.in1_MFs),
+                       variable(self.in2_name, self.in2_range, self.in2_MF_names, self.in2_MFs)],
+            'outputs': [variable(self.out_name, self.out_range, self.out_MF_names, self.out_MFs)],
+            'rules': [([0 if i1 is None else i1 + 1, 0 if i2 is None else i2 + 1], [o + 1], w, 1)
+                      for (i1, i2, o), w in zip(self.rules, self.rule_weights)],
+        }
 
     def _mf_value(self, x, mf_type, params):
         x_arr = np.array([x], dtype=float)
@@ -110,14 +168,14 @@ class FuzzyForDistance:
         in1_vals, in2_vals = self.fuzzify_inputs(dist, delta_dist)
 
         # For each rule, get the firing strength: AND method 'min'
-        # AndMethod='min'
+        # AndMethod='min'; a don't-care input (None) is left out of the min
         firing_strengths = []
         rule_out_indices = []
-        for rule in self.rules:
+        for rule, weight in zip(self.rules, self.rule_weights):
             in1_idx, in2_idx, out_idx = rule
-            val1 = in1_vals[in1_idx]
-            val2 = in2_vals[in2_idx]
-            strength = min(val1, val2)
+            val1 = 1.0 if in1_idx is None else in1_vals[in1_idx]
+            val2 = 1.0 if in2_idx is None else in2_vals[in2_idx]
+            strength = min(val1, val2) * weight
             firing_strengths.append(strength)
             rule_out_indices.append(out_idx)
 
@@ -1,6 +1,100 @@
+from collections import OrderedDict, namedtuple
+
 import numpy as np
 
-class MembershipFunction:
+# Memo cache for MamdaniFIS.evaluate (see EvaluationCache)
+STEER_CACHE_SIZE = 2048       # entries kept by FuzzyForSteering
+STEER_RESOLUTION = 1.0        # cm; about what an HC-SR04 can resolve
+
+# Bumped whenever a membership function, variable, rule or FIS setting
+# changes, so memoized outputs from before the change are never served
+_model_version = 0
+
+
+def _bump_version():
+    global _model_version
+    _model_version += 1
+
+
+class _TrackedList(list):
+    """List that bumps the model version on any in-place change."""
+
+
+def _tracked_mutator(name):
+    method = getattr(list, name)
+
+    def mutate(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        _bump_version()
+        return result
+    return mutate
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend',
+              'insert', 'pop', 'remove', 'clear', 'sort', 'reverse'):
+    setattr(_TrackedList, _name, _tracked_mutator(_name))
+del _name
+
+
+class _Tracked:
+    """Bumps the model version on every attribute assignment; list values become tracked lists."""
+
+    def __setattr__(self, name, value):
+        if type(value) is list:
+            value = _TrackedList(value)
+        object.__setattr__(self, name, value)
+        _bump_version()
+
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+
+class EvaluationCache:
+    """
+    LRU memo of FIS outputs keyed by inputs quantized to `resolution`.
+    The FIS is evaluated at the quantized point, so a cached value does not
+    depend on which reading in the bucket arrived first.
+    """
+
+    def __init__(self, maxsize, resolution):
+        self.maxsize = maxsize
+        self.resolution = resolution
+        self.entries = OrderedDict()
+        self.version = _model_version
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, input_values):
+        r = self.resolution
+        return tuple(round(v / r) for v in input_values)
+
+    def get(self, key):
+        if self.version != _model_version:
+            self.entries.clear()
+            self.version = _model_version
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.entries))
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class MembershipFunction(_Tracked):
     def __init__(self, name, mf_type, params):
         self.name = name
         self.mf_type = mf_type
@@ -17,12 +111,12 @@ class MembershipFunction:
     @staticmethod
     def trapmf(x, params):
         a, b, c, d = params
-        if x <= a or x >= d:
+        if b <= x <= c:
+            return 1.0
+        elif x <= a or x >= d:
             return 0.0
         elif a < x < b:
             return (x - a) / (b - a) if b != a else 1.0
-        elif b <= x <= c:
-            return 1.0
         elif c < x < d:
             return (d - x) / (d - c) if d != c else 1.0
         else:
@@ -31,7 +125,9 @@ class MembershipFunction:
     @staticmethod
     def trimf(x, params):
         a, b, c = params
-        if x <= a or x >= c:
+        if b == x:
+            return 1.0
+        elif x <= a or x >= c:
             return 0.0
         elif a < x < b:
             return (x - a) / (b - a) if b != a else 1.0
@@ -42,7 +138,7 @@ class MembershipFunction:
         else:
             return 0.0
 
-class FuzzyVariable:
+class FuzzyVariable(_Tracked):
     def __init__(self, name, var_range, mfs):
         self.name = name
         self.range = var_range  # tuple (min, max)
@@ -55,7 +151,7 @@ class FuzzyVariable:
             fuzzified[mf.name] = mf.compute(x)
         return fuzzified
 
-class FuzzyRule:
+class FuzzyRule(_Tracked):
     def __init__(self, antecedent_indices, consequent_index, weight=1.0):
         # antecedent_indices: list of input MF indices (1-based)
         # consequent_index: output MF index (1-based)
@@ -63,11 +159,11 @@ class FuzzyRule:
         self.consequent_index = consequent_index
         self.weight = weight
 
-class MamdaniFIS:
+class MamdaniFIS(_Tracked):
     def __init__(self, name, inputs, output, rules,
                  and_method='min', or_method='max',
                  imp_method='min', agg_method='max',
-                 defuzz_method='centroid'):
+                 defuzz_method='centroid', cache_size=0, cache_resolution=1.0):
         self.name = name
         self.inputs = inputs  # list of FuzzyVariable
         self.output = output  # FuzzyVariable
@@ -77,6 +173,34 @@ class MamdaniFIS:
         self.imp_method = imp_method
         self.agg_method = agg_method
         self.defuzz_method = defuzz_method
+        # set directly: the cache is not part of the model and must not bump its version
+        object.__setattr__(self, '_cache',
+                           EvaluationCache(cache_size, cache_resolution) if cache_size else None)
+
+    def cache_info(self):
+        """(hits, misses, maxsize, currsize) of the evaluate() memo, or None when it is off."""
+        return self._cache.info() if self._cache is not None else None
+
+    def cache_clear(self):
+        if self._cache is not None:
+            self._cache.clear()
+
+    def to_fis(self):
+        """Describe the system as a FIS dict (see fis_io)."""
+        def variable(var):
+            return {'name': var.name, 'range': tuple(var.range),
+                    'mfs': [(mf.name, mf.mf_type, list(mf.params)) for mf in var.mfs]}
+        return {
+            'name': self.name,
+            'type': 'mamdani',
+            'and_method': self.and_method, 'or_method': self.or_method,
+            'imp_method': self.imp_method, 'agg_method': self.agg_method,
+            'defuzz_method': self.defuzz_method,
+            'inputs': [variable(var) for var in self.inputs],
+            'outputs': [variable(self.output)],
+            'rules': [(list(rule.antecedent_indices), [rule.consequent_index], rule.weight, 1)
+                      for rule in self.rules],
+        }
 
     def _and(self, a, b):
         if self.and_method == 'min':
@@ -129,6 +253,17 @@ class MamdaniFIS:
         if len(input_values) != len(self.inputs):
             raise ValueError("Number of inputs does not match")
 
+        cache = self._cache
+        if cache is None:
+            return self._evaluate(input_values)
+        key = cache.key(input_values)
+        value = cache.get(key)
+        if value is None:
+            value = self._evaluate([k * cache.resolution for k in key])
+            cache.put(key, value)
+        return value
+
+    def _evaluate(self, input_values):
         # Step 1: Fuzzify inputs
         fuzzified_inputs = []
         for i, val in enumerate(input_values):
@@ -143,4 +278,90 @@ class MamdaniFIS:
             antecedent_values = []
             for input_idx, mf_idx in enumerate(rule.antecedent_indices):
                 # mf_idx is 1-based index of MF in input variable
-                mf_name = self.inputs[input_idx
+                mf_name = self.inputs[input_idx].mfs[mf_idx - 1].name
+                antecedent_values.append(fuzzified_inputs[input_idx][mf_name])
+
+            # Combine antecedents with the AND method
+            strength = antecedent_values[0]
+            for val in antecedent_values[1:]:
+                strength = self._and(strength, val)
+            rule_strengths.append(strength * rule.weight)
+
+        # Step 3: Implication and aggregation over a sampled output universe
+        x_out = np.linspace(self.output.range[0], self.output.range[1], 1000)
+        aggregated = np.zeros_like(x_out)
+        for rule, strength in zip(self.rules, rule_strengths):
+            if strength == 0:
+                continue
+            out_mf = self.output.mfs[rule.consequent_index - 1]
+            for j, xv in enumerate(x_out):
+                implied = self._implication(strength, out_mf.compute(xv))
+                aggregated[j] = self._aggregation(aggregated[j], implied)
+
+        # Step 4: Defuzzify
+        return self._defuzzify(x_out, aggregated)
+
+
+class FuzzyForSteering:
+    def __init__(self, cache_size=STEER_CACHE_SIZE):
+        # Input1: 'left distance' [0 80] cm
+        left = FuzzyVariable('left distance', (0, 80), [
+            MembershipFunction('near', 'trapmf', [0, 0, 15, 30]),
+            MembershipFunction('medium', 'trimf', [20, 40, 60]),
+            MembershipFunction('far', 'trapmf', [50, 65, 80, 80]),
+        ])
+        # Input2: 'right distance' [0 80] cm
+        right = FuzzyVariable('right distance', (0, 80), [
+            MembershipFunction('near', 'trapmf', [0, 0, 15, 30]),
+            MembershipFunction('medium', 'trimf', [20, 40, 60]),
+            MembershipFunction('far', 'trapmf', [50, 65, 80, 80]),
+        ])
+        # Output1: 'angle' [-30 30] degrees, negative steers left
+        angle = FuzzyVariable('angle', (-30, 30), [
+            MembershipFunction('hard left', 'trapmf', [-30, -30, -20, -10]),
+            MembershipFunction('left', 'trimf', [-20, -10, 0]),
+            MembershipFunction('straight', 'trimf', [-10, 0, 10]),
+            MembershipFunction('right', 'trimf', [0, 10, 20]),
+            MembershipFunction('hard right', 'trapmf', [10, 20, 30, 30]),
+        ])
+
+        # Rules: [left MF, right MF] -> angle MF (1-based, as in a FIS file)
+        rules = [
+            FuzzyRule([1, 1], 3),  # both near: straight
+            FuzzyRule([1, 2], 4),  # left near, right medium: right
+            FuzzyRule([1, 3], 5),  # left near, right far: hard right
+            FuzzyRule([2, 1], 2),  # left medium, right near: left
+            FuzzyRule([2, 2], 3),  # both medium: straight
+            FuzzyRule([2, 3], 4),  # left medium, right far: right
+            FuzzyRule([3, 1], 1),  # left far, right near: hard left
+            FuzzyRule([3, 2], 2),  # left far, right medium: left
+            FuzzyRule([3, 3], 3),  # both far: straight
+        ]
+
+        self.fis = MamdaniFIS('fuzzysteer', [left, right], angle, rules,
+                              cache_size=cache_size, cache_resolution=STEER_RESOLUTION)
+
+    def compute(self, left_dist, right_dist):
+        """
+        Compute the steering angle from the left/right side distances.
+        :param left_dist: distance on the left side (cm)
+        :param right_dist: distance on the right side (cm)
+        :return: angle (float, -30 to 30 degrees, negative is left)
+        """
+        left_c = min(max(left_dist, self.fis.inputs[0].range[0]), self.fis.inputs[0].range[1])
+        right_c = min(max(right_dist, self.fis.inputs[1].range[0]), self.fis.inputs[1].range[1])
+        return self.fis.evaluate([left_c, right_c])
+
+
+# Example usage
+if __name__ == "__main__":
+    steering = FuzzyForSteering()
+
+    # Test inputs
+    test_left = 20.0     # distance on the left side
+    test_right = 60.0    # distance on the right side
+
+    output_angle = steering.compute(test_left, test_right)
+    print(f"Input left distance: {test_left}")
+    print(f"Input right distance: {test_right}")
+    print(f"Output angle: {output_angle:.4f}")
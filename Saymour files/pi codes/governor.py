@@ -0,0 +1,201 @@
+"""
+Thermal- and load-aware quality governor for yolo_detect.py.
+
+The detector is given a ladder of operating points, from best quality to
+cheapest (input size, frame skip, thread count, model variant). Every
+EVAL_INTERVAL seconds the governor looks at the measured pipeline latency,
+the SoC temperature and the CPU clock:
+
+  * step down when the pipeline cannot hold the target FPS, the SoC is at
+    the temperature limit, or the firmware is throttling the clock, for
+    DOWN_AFTER evaluations in a row
+  * step up when the next better point is predicted to still hold the
+    target with margin and the SoC has cooled below the resume temperature,
+    for UP_AFTER evaluations in a row
+
+The slow climb and the gap between TEMP_LIMIT_C and TEMP_RESUME_C are the
+hysteresis: a steady, slightly degraded detection rate instead of bursts
+followed by thermal stalls. Every step is logged with its reason.
+"""
+import time
+
+# --- Constants -------------------------------------------------------
+THERMAL_ZONE   = '/sys/class/thermal/thermal_zone0/temp'
+CPU_FREQ_CUR   = '/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq'
+CPU_FREQ_MAX   = '/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq'
+
+TARGET_FPS     = 5.0     # inferences per second the pipeline must sustain
+FPS_HYSTERESIS = 0.15    # ±15% band around the target
+TEMP_LIMIT_C   = 75.0    # step down at or above this (the Pi soft-throttles at 80)
+TEMP_RESUME_C  = 68.0    # only step back up below this
+THROTTLED_FRAC = 0.9     # clock below this fraction of max counts as throttled
+EVAL_INTERVAL  = 2.0     # seconds between decisions
+DOWN_AFTER     = 2       # consecutive bad evaluations before stepping down
+UP_AFTER       = 5       # consecutive good evaluations before stepping up
+
+
+class OperatingPoint:
+    def __init__(self, name, imgsz, frame_skip=0, threads=None, model=None):
+        """
+        :param imgsz: model input size (multiple of 32)
+        :param frame_skip: frames skipped between inferences
+        :param threads: thread budget for OpenCV/NCNN, None to leave unchanged
+        :param model: alternative model path, None for the main model
+        """
+        self.name = name
+        self.imgsz = imgsz
+        self.frame_skip = frame_skip
+        self.threads = threads
+        self.model = model
+
+    def __repr__(self):
+        return (f"{self.name}(imgsz={self.imgsz}, skip={self.frame_skip}, "
+                f"threads={self.threads}, model={self.model or 'main'})")
+
+
+def default_points(threads=None, lite_model=None):
+    """Best quality first. The lite model, if given, takes over at the bottom of the ladder."""
+    few = max(1, threads - 1) if threads else None
+    return [
+        OperatingPoint('full', 640, 0, threads),
+        OperatingPoint('reduced', 480, 0, threads),
+        OperatingPoint('low', 320, 0, threads),
+        OperatingPoint('low-skip', 320, 1, few, lite_model),
+        OperatingPoint('minimal', 256, 2, few, lite_model),
+    ]
+
+
+def _read_number(path):
+    try:
+        with open(path) as f:
+            return float(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def read_temperature():
+    """SoC temperature in °C, or None off-Pi."""
+    milli = _read_number(THERMAL_ZONE)
+    return None if milli is None else milli / 1000.0
+
+
+def read_cpu_freq():
+    """(current, max) CPU clock in MHz, or (None, None)."""
+    cur = _read_number(CPU_FREQ_CUR)
+    top = _read_number(CPU_FREQ_MAX)
+    if cur is None or top is None:
+        return None, None
+    return cur / 1000.0, top / 1000.0
+
+
+class QualityGovernor:
+    def __init__(self, points, target_fps=TARGET_FPS, temp_limit=TEMP_LIMIT_C,
+                 temp_resume=TEMP_RESUME_C, hysteresis=FPS_HYSTERESIS,
+                 eval_interval=EVAL_INTERVAL, log=print, log_file=None):
+        self.points = points
+        self.level = 0
+        self.target_fps = target_fps
+        self.temp_limit = temp_limit
+        self.temp_resume = temp_resume
+        self.hysteresis = hysteresis
+        self.eval_interval = eval_interval
+        self.log = log
+        self.log_file = open(log_file, 'a') if log_file else None
+
+        self.frame_index = 0
+        self._latency_sum = 0.0
+        self._latency_n = 0
+        self._last_eval = time.monotonic()
+        self._down_votes = 0
+        self._up_votes = 0
+        self.changed = True          # lets the caller apply the initial point
+
+    @property
+    def point(self):
+        return self.points[self.level]
+
+    def should_infer(self):
+        """Call once per captured frame; False for frames the current point skips."""
+        run = self.frame_index % (self.point.frame_skip + 1) == 0
+        self.frame_index += 1
+        return run
+
+    def record_latency(self, seconds):
+        """Pipeline latency of one inferred frame (read to results)."""
+        self._latency_sum += seconds
+        self._latency_n += 1
+
+    def _cost_ratio(self, better):
+        """How much slower per inference the better point is expected to be."""
+        ratio = (better.imgsz / self.point.imgsz) ** 2
+        if better.threads and self.point.threads:
+            ratio *= self.point.threads / better.threads
+        return ratio
+
+    def update(self, now=None):
+        """
+        Evaluate at most once per eval_interval. Returns True when the
+        operating point changed (check .point and apply it).
+        """
+        now = time.monotonic() if now is None else now
+        if now - self._last_eval < self.eval_interval or self._latency_n == 0:
+            return False
+        self._last_eval = now
+
+        fps = self._latency_n / self._latency_sum if self._latency_sum > 0 else float('inf')
+        self._latency_sum = 0.0
+        self._latency_n = 0
+        temp = read_temperature()
+        freq, freq_max = read_cpu_freq()
+        throttled = freq is not None and freq < THROTTLED_FRAC * freq_max
+
+        reasons = []
+        if fps < self.target_fps * (1 - self.hysteresis):
+            reasons.append(f"fps {fps:.1f} < {self.target_fps:.1f}")
+        if temp is not None and temp >= self.temp_limit:
+            reasons.append(f"temp {temp:.1f}°C ≥ {self.temp_limit:.0f}°C")
+        if throttled:
+            reasons.append(f"clock {freq:.0f}/{freq_max:.0f} MHz")
+
+        old = self.point
+        if reasons and self.level < len(self.points) - 1:
+            self._up_votes = 0
+            self._down_votes += 1
+            if self._down_votes >= DOWN_AFTER:
+                self._step(+1, ', '.join(reasons), fps, temp, freq)
+        elif not reasons and self.level > 0:
+            self._down_votes = 0
+            better = self.points[self.level - 1]
+            predicted = fps / self._cost_ratio(better)
+            cool = temp is None or temp < self.temp_resume
+            if predicted >= self.target_fps * (1 + self.hysteresis) and cool:
+                self._up_votes += 1
+                if self._up_votes >= UP_AFTER:
+                    self._step(-1, f"headroom: ~{predicted:.1f} fps predicted at {better.name}",
+                               fps, temp, freq)
+            else:
+                self._up_votes = 0
+        else:
+            self._down_votes = 0
+            self._up_votes = 0
+        return self.point is not old
+
+    def _step(self, direction, reason, fps, temp, freq):
+        old = self.point
+        self.level += direction
+        self._down_votes = 0
+        self._up_votes = 0
+        self.changed = True
+        temp_s = '-' if temp is None else f"{temp:.1f}"
+        freq_s = '-' if freq is None else f"{freq:.0f}"
+        self.log(f"GOV: {old.name} → {self.point.name} ({reason}) "
+                 f"fps={fps:.1f} temp={temp_s}°C freq={freq_s}MHz")
+        if self.log_file:
+            self.log_file.write(f"{time.time():.3f},{old.name},{self.point.name},{fps:.2f},"
+                                f"{temp_s},{freq_s},\"{reason}\"\n")
+            self.log_file.flush()
+
+    def close(self):
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
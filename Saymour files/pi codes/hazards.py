@@ -0,0 +1,113 @@
+"""
+Hazard fast path: stairs seen by the camera and drop-offs seen by an
+optional downward ultrasonic.
+
+Hazards do not go through the generic DETECT stream. The producer prints a
+HAZARD line first, ahead of the frame's other detections:
+
+    HAZARD:<kind>:<t_ns>
+
+where t_ns is time.monotonic_ns() of the frame or sensor reading (the same
+clock in every process). run_all_final.py sends these on its priority lane,
+straight to the ESP32 ahead of anything queued, and records how long the
+hazard took from capture to the wire (saymour_hazard_latency_seconds). The
+ESP32 leg is roughly half of saymour_esp_rtt_last_seconds.
+
+Each detector class has its own confidence threshold, so stairs can be
+reported at a lower confidence than the classes that only inform. Repeats
+of the same hazard are limited to one per HAZARD_REPEAT seconds, so a
+staircase in view does not flood the link.
+"""
+import time
+
+# --- Constants -------------------------------------------------------
+# Per-class confidence thresholds; classes not listed use --thresh
+CLASS_THRESHOLDS = {
+    'Stairs': 0.35,
+}
+HAZARD_CLASSES = ('Stairs',)
+HAZARD_REPEAT  = 1.0      # s between repeated alerts for the same hazard
+
+# What the ESP32 is sent for each hazard; the firmware knows the model's class
+# names, and a drop-off needs the same warning as stairs
+ESP_MESSAGES = {
+    'Stairs': 'DETECT:Stairs',
+    'DropOff': 'DETECT:Stairs',
+}
+
+# Downward ultrasonic
+DROP_MARGIN_CM   = 10.0   # reading this much beyond the floor baseline is a drop
+DROP_CONFIRM     = 2      # consecutive drop readings before alerting
+FLOOR_ALPHA      = 0.05   # baseline low-pass weight for ordinary floor readings
+
+
+def class_threshold(classname, default):
+    return CLASS_THRESHOLDS.get(classname, default)
+
+
+def format_hazard(kind, t_ns):
+    return f"HAZARD:{kind}:{t_ns}"
+
+
+def parse_hazard(line):
+    """'HAZARD:<kind>:<t_ns>' -> (kind, t_ns), or None for any other line."""
+    if not line.startswith("HAZARD:"):
+        return None
+    parts = line.strip().split(":")
+    if len(parts) != 3:
+        return None
+    try:
+        return parts[1], int(parts[2])
+    except ValueError:
+        return None
+
+
+class HazardGate:
+    """Lets the first sighting of a hazard through at once, then one per `repeat` seconds."""
+
+    def __init__(self, repeat=HAZARD_REPEAT):
+        self.repeat = repeat
+        self.last = {}
+
+    def allow(self, kind, now=None):
+        now = time.monotonic() if now is None else now
+        last = self.last.get(kind)
+        if last is not None and now - last < self.repeat:
+            return False
+        self.last[kind] = now
+        return True
+
+
+class DropOffDetector:
+    """
+    Watches a downward-facing ultrasonic. The floor distance is learned
+    while driving; readings well beyond it, or no echo at all, mean the
+    floor has gone (kerb, stair top, hole).
+    """
+
+    def __init__(self, margin=DROP_MARGIN_CM, confirm=DROP_CONFIRM):
+        self.margin = margin
+        self.confirm = confirm
+        self.floor = None
+        self.count = 0
+        self.active = False
+
+    def update(self, reading_cm):
+        """
+        :param reading_cm: down range in cm, or None when the echo timed out
+        :return: True on the reading that starts a drop-off
+        """
+        if reading_cm is not None and (self.floor is None or reading_cm <= self.floor + self.margin):
+            self.floor = reading_cm if self.floor is None else \
+                self.floor + FLOOR_ALPHA * (reading_cm - self.floor)
+            self.count = 0
+            self.active = False
+            return False
+        if self.floor is None:
+            # no baseline yet, nothing to compare against
+            return False
+        self.count += 1
+        if self.count >= self.confirm and not self.active:
+            self.active = True
+            return True
+        return False
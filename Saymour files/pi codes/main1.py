@@ -2,35 +2,44 @@
 import time
 import RPi.GPIO as GPIO
 from fuzzy_controller_dist import FuzzyForDistance  # your fuzzy logic class
-
-# --- Constants -------------------------------------------------------
-VIN_V     = 15.0    # Motor driver supply voltage (V)
-MAX_SPEED = 1.40    # Max speed (m/s) at VIN_V
-START_V   = 1.5     # Calibrated “just moves” voltage (V); bench-test your motors
-SAMPLE_DT = 0.1     # Control loop interval (s)
+from pwm_backend import open_pwm, uses_hardware
+from speed_control import WheelEncoder, SpeedLoop, MotorCalibration, load_calibration
+from config import get_config
+
+# --- Constants (from saymour.json, profile 'distance'; see config.py) --
+CFG = get_config('distance')
+VIN_V     = CFG.motor.vin        # Motor driver supply voltage (V)
+MAX_SPEED = CFG.motor.max_speed  # Max speed (m/s) at VIN_V
+START_V   = CFG.motor.start_v    # Calibrated “just moves” voltage (V); bench-test your motors
+SAMPLE_DT = CFG.control.loop_interval  # Control loop interval (s)
+USE_SPEED_LOOP = CFG.motor.use_speed_loop  # True once wheel encoders are fitted (see speed_control.py)
+PWM_BACKEND = CFG.motor.pwm_backend  # 'rpigpio', 'pigpio' or 'sysfs' (see pwm_backend.py)
+MOTOR_PWM_HZ = CFG.motor.motor_pwm_hz
 
 # --- GPIO setup ------------------------------------------------------
 GPIO.setmode(GPIO.BCM)
 
 # Ultrasonic sensor pins
-TRIG_PIN = 23
-ECHO_PIN = 24
+TRIG_PIN = CFG.pins.trig_front
+ECHO_PIN = CFG.pins.echo_front
 GPIO.setup(TRIG_PIN, GPIO.OUT)
 GPIO.setup(ECHO_PIN, GPIO.IN)
 
 # Motor A (Left) pins
-ENA_PIN = 18   # hardware PWM
-IN1_PIN = 27  # direction
-IN2_PIN = 22  # direction
-GPIO.setup(ENA_PIN, GPIO.OUT)
+ENA_PIN = CFG.pins.ena  # hardware PWM
+IN1_PIN = CFG.pins.in1  # direction
+IN2_PIN = CFG.pins.in2  # direction
+if not uses_hardware(PWM_BACKEND):
+    GPIO.setup(ENA_PIN, GPIO.OUT)
 GPIO.setup(IN1_PIN, GPIO.OUT)
 GPIO.setup(IN2_PIN, GPIO.OUT)
 
 # Motor B (Right) pins
-ENB_PIN = 13   # hardware PWM
-IN3_PIN = 26  # direction
-IN4_PIN = 19  # direction
-GPIO.setup(ENB_PIN, GPIO.OUT)
+ENB_PIN = CFG.pins.enb  # hardware PWM
+IN3_PIN = CFG.pins.in3  # direction
+IN4_PIN = CFG.pins.in4  # direction
+if not uses_hardware(PWM_BACKEND):
+    GPIO.setup(ENB_PIN, GPIO.OUT)
 GPIO.setup(IN3_PIN, GPIO.OUT)
 GPIO.setup(IN4_PIN, GPIO.OUT)
 
@@ -62,13 +71,28 @@ def read_distance(trig_pin, echo_pin):
 
 def main():
     # Initialize PWM on ENA and ENB at 1 kHz
-    pwm_a = GPIO.PWM(ENA_PIN, 1000)
-    pwm_b = GPIO.PWM(ENB_PIN, 1000)
+    pwm_a = open_pwm(GPIO, ENA_PIN, MOTOR_PWM_HZ, PWM_BACKEND)
+    pwm_b = open_pwm(GPIO, ENB_PIN, MOTOR_PWM_HZ, PWM_BACKEND)
     pwm_a.start(0)
     pwm_b.start(0)
 
-    # Instantiate fuzzy controller
-    controller = FuzzyForDistance()
+    # Optional inner speed loop: the fuzzy speed becomes a wheel-speed setpoint
+    speed_loop = None
+    if USE_SPEED_LOOP:
+        cal = load_calibration(fallback=MotorCalibration.linear(MAX_SPEED, VIN_V, START_V))
+        speed_loop = SpeedLoop({
+            'left':  (pwm_a, WheelEncoder(GPIO, CFG.pins.enc_left),  cal['left']),
+            'right': (pwm_b, WheelEncoder(GPIO, CFG.pins.enc_right), cal['right']),
+        })
+        speed_loop.start()
+
+    # Instantiate fuzzy controller (control.controller picks Mamdani or its Sugeno fit)
+    if CFG.control.controller == 'sugeno':
+        from sugeno import distance_controller, format_error
+        controller = distance_controller(CFG.control.sugeno_order)
+        print(format_error(controller.fis))
+    else:
+        controller = FuzzyForDistance()
 
     # Prime first measurement
     prev_dist = read_distance(TRIG_PIN, ECHO_PIN)
@@ -85,19 +109,25 @@ def main():
             speed = controller.compute(curr_dist, delta)
             print(f"[Fuzzy] speed={speed:.3f} m/s")
 
-            # 3) Map speed → duty fraction
-            if speed <= 0:
-                duty_frac = 0.0
+            if speed_loop is not None:
+                # 3) Hand the speed to the wheel-speed loop
+                speed_loop.set_setpoints(speed, speed)
+                meas = speed_loop.measured()
+                print(f"[Loop] setpoint={speed:.3f} m/s, L={meas['left']:.3f} R={meas['right']:.3f} m/s")
             else:
-                # interpolate Vavg from START_V → VIN_V
-                Vavg      = START_V + (VIN_V - START_V) * (speed / MAX_SPEED)
-                duty_frac = max(0.0, min(Vavg / VIN_V, 1.0))
-            duty_pct = duty_frac * 100.0
-            print(f"[Map] Vavg={duty_frac*VIN_V:.2f} V → duty={duty_pct:.1f}%")
-
-            # 4) Drive motors
-            pwm_a.ChangeDutyCycle(duty_pct)
-            pwm_b.ChangeDutyCycle(duty_pct)
+                # 3) Map speed → duty fraction
+                if speed <= 0:
+                    duty_frac = 0.0
+                else:
+                    # interpolate Vavg from START_V → VIN_V
+                    Vavg      = START_V + (VIN_V - START_V) * (speed / MAX_SPEED)
+                    duty_frac = max(0.0, min(Vavg / VIN_V, 1.0))
+                duty_pct = duty_frac * 100.0
+                print(f"[Map] Vavg={duty_frac*VIN_V:.2f} V → duty={duty_pct:.1f}%")
+
+                # 4) Drive motors
+                pwm_a.ChangeDutyCycle(duty_pct)
+                pwm_b.ChangeDutyCycle(duty_pct)
 
             # shift for next loop
             prev_dist = curr_dist
@@ -107,6 +137,8 @@ def main():
         print("\nInterrupted by user")
 
     finally:
+        if speed_loop is not None:
+            speed_loop.stop()
         pwm_a.stop()
         pwm_b.stop()
         GPIO.cleanup()
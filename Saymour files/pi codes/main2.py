@@ -3,13 +3,19 @@
 import time
 import RPi.GPIO as GPIO
 from fuzzysteertest import FuzzyForSteering
-
-# GPIO pins
-TRIG_LEFT  = 5
-ECHO_LEFT  = 6
-TRIG_RIGHT = 16
-ECHO_RIGHT = 20
-SERVO_PIN  = 12  # must be PWM-capable
+from pwm_backend import open_pwm, uses_hardware
+from config import get_config
+
+# GPIO pins and settings (from saymour.json, profile 'steering'; see config.py)
+CFG = get_config('steering')
+TRIG_LEFT  = CFG.pins.trig_left
+ECHO_LEFT  = CFG.pins.echo_left
+TRIG_RIGHT = CFG.pins.trig_right
+ECHO_RIGHT = CFG.pins.echo_right
+SERVO_PIN  = CFG.pins.servo  # must be PWM-capable
+PWM_BACKEND = CFG.motor.pwm_backend  # 'rpigpio', 'pigpio' or 'sysfs' (see pwm_backend.py)
+SERVO_PWM_HZ = CFG.motor.servo_pwm_hz
+LOOP_INTERVAL = CFG.control.loop_interval
 
 # Setup Pi pins
 def setup_gpio():
@@ -17,7 +23,8 @@ def setup_gpio():
     for trig, echo in [(TRIG_LEFT, ECHO_LEFT), (TRIG_RIGHT, ECHO_RIGHT)]:
         GPIO.setup(trig, GPIO.OUT)
         GPIO.setup(echo, GPIO.IN)
-    GPIO.setup(SERVO_PIN, GPIO.OUT)
+    if not uses_hardware(PWM_BACKEND):
+        GPIO.setup(SERVO_PIN, GPIO.OUT)
 
 def measure_distance(trig, echo):
     GPIO.output(trig, False)
@@ -42,10 +49,15 @@ def angle_to_duty(angle):
 
 def main():
     setup_gpio()
-    servo = GPIO.PWM(SERVO_PIN, 50)  # 50 Hz for typical servo
+    servo = open_pwm(GPIO, SERVO_PIN, SERVO_PWM_HZ, PWM_BACKEND)  # 50 Hz for typical servo
     servo.start(6.5)                  # center at 7%
 
-    fuzzy = FuzzyForSteering()
+    if CFG.control.controller == 'sugeno':
+        from sugeno import steering_controller, format_error
+        fuzzy = steering_controller(CFG.control.sugeno_order)
+        print(format_error(fuzzy.fis))
+    else:
+        fuzzy = FuzzyForSteering()
 
     try:
         while True:
@@ -57,7 +69,7 @@ def main():
             servo.ChangeDutyCycle(duty)
 
             print(f"L={left:.1f} cm R={right:.1f} cm → angle={angle:.1f}°, duty={duty:.1f}%")
-            time.sleep(0.3)
+            time.sleep(LOOP_INTERVAL)
 
     except KeyboardInterrupt:
         pass
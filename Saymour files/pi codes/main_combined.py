@@ -1,50 +1,159 @@
+import argparse
+import gc
 import time
 import RPi.GPIO as GPIO
 
 # -- imports for your two controllers --
 from fuzzy_controller_dist import FuzzyForDistance   # adjust to your file name
 from fuzzysteertest import FuzzyForSteering  # adjust to your file name
+from speed_control import WheelEncoder, SpeedLoop, MotorCalibration, load_calibration
+from drive_mixer import DriveMixer, WheelDirection
+from pwm_backend import open_pwm, uses_hardware
+from fusion import TargetReader, TargetFusion
+from telemetry import DEBUG, Stopwatch, counter, gauge, histogram, start_file_exporter
+from watchdog import Watchdog, HEARTBEAT_DEADLINE
+from hazards import DropOffDetector, format_hazard
+from config import get_config
+from tracing import TRACE, Trace
+from activity import ActivityBoard, ActivityDetector, EnergyMeter, RangeMotion, wake_bound
+from occupancy import OccupancyGrid, odometry
+from steady_state import TickLog, steady_controllers
+import profiler
+
+# All of these come from saymour.json (see config.py); edit that file, not
+# this one, so the pins match what the other scripts and the supervisor use.
+CFG = get_config('combined')
 
 # --- GPIO pin assignments ---
 
 # Front ultrasonic (distance controller)
-TRIG_FRONT = 23
-ECHO_FRONT = 24
+TRIG_FRONT = CFG.pins.trig_front
+ECHO_FRONT = CFG.pins.echo_front
 
 # Left/right ultrasonics (steering controller)
-TRIG_LEFT  = 5
-ECHO_LEFT  = 6
-TRIG_RIGHT = 16
-ECHO_RIGHT = 20
+TRIG_LEFT  = CFG.pins.trig_left
+ECHO_LEFT  = CFG.pins.echo_left
+TRIG_RIGHT = CFG.pins.trig_right
+ECHO_RIGHT = CFG.pins.echo_right
+
+# Optional downward ultrasonic for drop-offs the camera misses (see hazards.py)
+USE_DOWN_SONAR = CFG.control.use_down_sonar
+TRIG_DOWN  = CFG.pins.trig_down
+ECHO_DOWN  = CFG.pins.echo_down
 
 # DC motor driver (L298N) pins
-ENA_PIN = 18  # PWM A
-IN1_PIN = 27
-IN2_PIN = 22
-ENB_PIN = 13  # PWM B
-IN3_PIN = 26
-IN4_PIN = 19
+ENA_PIN = CFG.pins.ena  # PWM A
+IN1_PIN = CFG.pins.in1
+IN2_PIN = CFG.pins.in2
+ENB_PIN = CFG.pins.enb  # PWM B
+IN3_PIN = CFG.pins.in3
+IN4_PIN = CFG.pins.in4
 
 # Servo pin
-SERVO_PIN = 12
+SERVO_PIN = CFG.pins.servo
+
+# Wheel encoders (only with USE_SPEED_LOOP)
+ENC_LEFT_PIN  = CFG.pins.enc_left
+ENC_RIGHT_PIN = CFG.pins.enc_right
+
+# Motor model used for the open-loop duty mapping
+VIN_V     = CFG.motor.vin
+MAX_SPEED = CFG.motor.max_speed
+START_V   = CFG.motor.start_v
+MOTOR_PWM_HZ = CFG.motor.motor_pwm_hz
+SERVO_PWM_HZ = CFG.motor.servo_pwm_hz
+
+# Control loop period; the watchdog deadline stretches with it
+LOOP_INTERVAL = CFG.control.loop_interval
+
+# Give up on an echo after this long (4 m is ~23 ms; some modules hold echo high 38 ms with no target)
+ECHO_TIMEOUT = CFG.control.echo_timeout
+
+# Closed-loop wheel speed control (see speed_control.py). Needs wheel
+# encoders on ENC_LEFT_PIN/ENC_RIGHT_PIN; with False the fuzzy speed is
+# mapped to duty open-loop through map_speed_to_duty().
+USE_SPEED_LOOP = CFG.motor.use_speed_loop
+
+# How steering reaches the wheels (see drive_mixer.py):
+#   'servo'        - same speed on both motors, servo steers
+#   'differential' - per-wheel speed split and pivot turns, servo centred
+DRIVE_MODE = CFG.motor.drive_mode
+
+# PWM backend: 'rpigpio', 'pigpio' or 'sysfs' (see pwm_backend.py);
+# SAYMOUR_PWM_BACKEND still overrides the file
+PWM_BACKEND = CFG.motor.pwm_backend
+
+# Camera–ultrasonic fusion (see fusion.py): when yolo_detect.py runs with
+# --share-target, the person's range replaces the raw front reading and
+# their bearing is added to the steering angle. Without a detector running
+# this falls back to the front ultrasonic alone.
+# Fuzzy inference: 'mamdani' runs the controllers as designed, 'sugeno'
+# runs least-squares Sugeno fits of them (see sugeno.py), which skip the
+# output-universe sampling; the fit error is printed at start-up.
+CONTROLLER   = CFG.control.controller
+SUGENO_ORDER = CFG.control.sugeno_order
+
+USE_FUSION   = CFG.control.use_fusion
+BEARING_GAIN = CFG.control.bearing_gain    # degrees of steering per degree of person bearing
+
+# Rolling occupancy grid (see occupancy.py): the steering controller gets
+# the nearest obstacle on each side from the grid, which remembers
+# obstacles that have already left the side sensors' cones
+USE_GRID = CFG.control.use_grid
+
+# Steady-state mode (see steady_state.py): controllers evaluated into
+# buffers allocated once and the per-tick lines written by a background
+# thread, so a tick allocates nothing the GC has to come back for
+STEADY_STATE = CFG.control.steady_state
+
+# Idle mode (see activity.py): after IDLE_AFTER s without motion on the
+# ranges or in the camera, tick every IDLE_LOOP_INTERVAL with the
+# controllers skipped and the motor and servo PWM off
+IDLE_MODE          = CFG.activity.idle_mode
+IDLE_AFTER         = CFG.activity.idle_after
+IDLE_LOOP_INTERVAL = CFG.activity.idle_loop_interval
+
+# --- Metrics (see telemetry.py; full console output with SAYMOUR_DEBUG=1) ---
+M_READ = {name: histogram('saymour_ctrl_sensor_read_seconds',
+                          'Ultrasonic read time including the trigger settle delay',
+                          {'sensor': name})
+          for name in ('front', 'left', 'right', 'down')}
+M_COMPUTE = {name: histogram('saymour_ctrl_compute_seconds', 'Controller compute time',
+                             {'stage': name})
+             for name in ('grid', 'distance', 'steering', 'mix')}
+M_TICK      = histogram('saymour_ctrl_tick_seconds', 'Control tick time excluding the sleep')
+M_TICKS     = counter('saymour_ctrl_ticks_total', 'Control ticks run')
+M_DISTANCE  = {name: gauge('saymour_ctrl_distance_cm', 'Latest ultrasonic range', {'sensor': name})
+               for name in ('front', 'left', 'right')}
+M_SPEED     = gauge('saymour_ctrl_speed_mps', 'Distance controller output')
+M_ANGLE     = gauge('saymour_ctrl_angle_deg', 'Steering angle after the bearing term')
+M_FREE_BEARING = gauge('saymour_ctrl_free_bearing_deg', 'Occupancy grid heading with the most clearance')
+M_STEER_CACHE = {name: gauge('saymour_ctrl_steer_cache_' + name, 'Steering memo cache ' + name)
+                 for name in ('hits', 'misses', 'entries')}
 
 # --- Helper functions ---
 
-def setup_gpio():
+def setup_gpio(pwm_backend=PWM_BACKEND):
     GPIO.setmode(GPIO.BCM)
     # Ultrasonic pins
-    for trig, echo in [(TRIG_FRONT, ECHO_FRONT),
-                       (TRIG_LEFT,  ECHO_LEFT),
-                       (TRIG_RIGHT, ECHO_RIGHT)]:
+    sonars = [(TRIG_FRONT, ECHO_FRONT),
+              (TRIG_LEFT,  ECHO_LEFT),
+              (TRIG_RIGHT, ECHO_RIGHT)]
+    if USE_DOWN_SONAR:
+        sonars.append((TRIG_DOWN, ECHO_DOWN))
+    for trig, echo in sonars:
         GPIO.setup(trig, GPIO.OUT)
         GPIO.setup(echo, GPIO.IN)
-    # Motor driver pins
-    for p in [ENA_PIN, IN1_PIN, IN2_PIN, ENB_PIN, IN3_PIN, IN4_PIN]:
+    # Motor direction pins
+    for p in [IN1_PIN, IN2_PIN, IN3_PIN, IN4_PIN]:
         GPIO.setup(p, GPIO.OUT)
-    # Servo pin
-    GPIO.setup(SERVO_PIN, GPIO.OUT)
+    # PWM pins: hardware backends mux these themselves, so keep RPi.GPIO off them
+    if not uses_hardware(pwm_backend):
+        for p in [ENA_PIN, ENB_PIN, SERVO_PIN]:
+            GPIO.setup(p, GPIO.OUT)
 
-def read_distance(trig, echo):
+def read_distance(trig, echo, timeout=ECHO_TIMEOUT):
+    """Range in cm, or None if the echo never starts or never ends."""
     # Trigger pulse
     GPIO.output(trig, False)
     time.sleep(0.05)
@@ -54,15 +163,22 @@ def read_distance(trig, echo):
 
     # Wait for echo
     start = time.time()
+    deadline = start + timeout
     while GPIO.input(echo) == 0:
         start = time.time()
+        if start > deadline:
+            return None
+    stop = start
+    deadline = start + timeout
     while GPIO.input(echo) == 1:
         stop = time.time()
+        if stop > deadline:
+            return None
 
     # Calculate distance in cm
     return ((stop - start) * 34300) / 2
 
-def map_speed_to_duty(speed, MAX_SPEED=1.4, VIN=15.0, START_V=8.0):
+def map_speed_to_duty(speed, MAX_SPEED=MAX_SPEED, VIN=VIN_V, START_V=START_V):
     duty_frac = speed / MAX_SPEED
     MIN_FRAC = START_V / VIN
     if speed > 0 and duty_frac < MIN_FRAC:
@@ -77,64 +193,298 @@ def map_angle_to_duty(angle):
 
 # --- Main loop ---
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Distance + steering control loop')
+    profiler.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     setup_gpio()
 
     # instantiate both fuzzy controllers
-    dist_ctrl  = FuzzyForDistance()
-    steer_ctrl = FuzzyForSteering()
+    if STEADY_STATE:
+        dist_ctrl, steer_ctrl = steady_controllers(CONTROLLER, SUGENO_ORDER)
+        if CONTROLLER == 'sugeno':
+            from sugeno import format_error
+            print(format_error(dist_ctrl.fis))
+            print(format_error(steer_ctrl.fis), flush=True)
+    elif CONTROLLER == 'sugeno':
+        from sugeno import distance_controller, steering_controller, format_error
+        dist_ctrl  = distance_controller(SUGENO_ORDER)
+        steer_ctrl = steering_controller(SUGENO_ORDER)
+        print(format_error(dist_ctrl.fis))
+        print(format_error(steer_ctrl.fis), flush=True)
+    else:
+        dist_ctrl  = FuzzyForDistance()
+        steer_ctrl = FuzzyForSteering()
 
-    # PWM outputs
-    pwm_a = GPIO.PWM(ENA_PIN, 1000)  # 1 kHz for motor A
-    pwm_b = GPIO.PWM(ENB_PIN, 1000)  # 1 kHz for motor B
+    # PWM outputs; the servo is opened first so it gets the hardware
+    # channel it shares with ENA (GPIO 12/18) when one is available
+    servo = open_pwm(GPIO, SERVO_PIN, SERVO_PWM_HZ, PWM_BACKEND)    # 50 Hz for servo
+    servo.start(6.5)                                                # center
+    pwm_a = open_pwm(GPIO, ENA_PIN, MOTOR_PWM_HZ, PWM_BACKEND)  # 1 kHz for motor A
+    pwm_b = open_pwm(GPIO, ENB_PIN, MOTOR_PWM_HZ, PWM_BACKEND)  # 1 kHz for motor B
     pwm_a.start(0)
     pwm_b.start(0)
 
-    servo = GPIO.PWM(SERVO_PIN, 50)   # 50 Hz for servo
-    servo.start(6.5)                   # center
+    speed_loop = None
+    if USE_SPEED_LOOP:
+        cal = load_calibration(fallback=MotorCalibration.linear(MAX_SPEED, VIN_V, START_V))
+        speed_loop = SpeedLoop({
+            'left':  (pwm_a, WheelEncoder(GPIO, ENC_LEFT_PIN),  cal['left']),
+            'right': (pwm_b, WheelEncoder(GPIO, ENC_RIGHT_PIN), cal['right']),
+        })
+        speed_loop.start()
+
+    # motor directions start forward; the mixer reverses a wheel for pivot turns
+    dir_a = WheelDirection(GPIO, IN1_PIN, IN2_PIN)
+    dir_b = WheelDirection(GPIO, IN3_PIN, IN4_PIN)
+    dir_a.set(True)
+    dir_b.set(True)
+    mixer = DriveMixer(DRIVE_MODE, max_speed=MAX_SPEED)
+
+    target_reader = TargetReader() if USE_FUSION else None
+    fusion = TargetFusion() if USE_FUSION else None
+
+    grid = OccupancyGrid() if USE_GRID else None
+    last_cmd = (0.0, 0.0, 0.0)      # wheel A, wheel B (m/s) and servo angle applied last tick
+    t_cmd = time.monotonic()
+
+    exporter = start_file_exporter('ctrl')
+
+    def stop_motors():
+        # called by the watchdog thread, so no loop state beyond the outputs
+        if speed_loop is not None:
+            speed_loop.set_setpoints(0.0, 0.0)
+        pwm_a.ChangeDutyCycle(0)
+        pwm_b.ChangeDutyCycle(0)
+        dir_a.release()
+        dir_b.release()
+
+    # a slower loop from the config must not trip the watchdog on every tick; idle
+    # mode relaxes the deadlines only while it holds the outputs off (below)
+    watchdog = Watchdog(stop_motors, heartbeat_deadline=max(HEARTBEAT_DEADLINE, 3 * LOOP_INTERVAL))
+    dropoff = DropOffDetector() if USE_DOWN_SONAR else None
+    n_sonars = 4 if USE_DOWN_SONAR else 3
 
-    # fix motor directions forward
-    GPIO.output(IN1_PIN, GPIO.HIGH)
-    GPIO.output(IN2_PIN, GPIO.LOW)
-    GPIO.output(IN3_PIN, GPIO.HIGH)
-    GPIO.output(IN4_PIN, GPIO.LOW)
+    # with TickLog's thread printing the tick lines, everything else printed
+    # from the loop goes through it too so lines cannot split into each other
+    tick_log = None
+    emit = print
+    if STEADY_STATE:
+        tick_log = TickLog(DEBUG)
+        emit = tick_log.write
 
-    prev_front = read_distance(TRIG_FRONT, ECHO_FRONT)
-    interval = 0.1  # 10 Hz loop
+    activity = energy = None
+    if IDLE_MODE:
+        # the board also carries the detector's camera motion (yolo_detect.py --idle)
+        activity = ActivityDetector('ctrl', IDLE_AFTER, board=ActivityBoard(create=True), log=emit)
+        range_motion = RangeMotion()
+        energy = EnergyMeter('ctrl')
+        energy.hold('servo', True)
+        outputs_off = False
+        print(f"Idle mode: after {IDLE_AFTER:.0f} s without motion; wakes within "
+              f"{wake_bound(IDLE_LOOP_INTERVAL, n_sonars * 0.055):.2f} s", flush=True)
 
+    # last valid readings; a missed echo keeps the previous value
+    raw_front = prev_front = read_distance(TRIG_FRONT, ECHO_FRONT) or 0.0
+    left = right = 0.0
+    ranges = {}                     # this tick's echoes, None for a miss (for the grid)
+    interval = LOOP_INTERVAL
+    tick = 0
+    trace = None
+    watchdog.start()
+    prof = profiler.from_args(args, 'ctrl', {
+        'loop_interval_s': LOOP_INTERVAL, 'loop_rate_hz': 1.0 / LOOP_INTERVAL,
+        'controller': CONTROLLER, 'drive_mode': DRIVE_MODE, 'pwm_backend': PWM_BACKEND,
+        'use_fusion': USE_FUSION, 'use_speed_loop': USE_SPEED_LOOP,
+    })
+
+    if tick_log is not None:
+        tick_log.start()
+        # everything set up so far lives as long as the loop; keep it out of later collections
+        gc.collect()
+        gc.freeze()
+
+    watch = Stopwatch()
     try:
         while True:
             # 1) Read sensors
-            front = read_distance(TRIG_FRONT, ECHO_FRONT)
-            left  = read_distance(TRIG_LEFT,  ECHO_LEFT)
-            right = read_distance(TRIG_RIGHT, ECHO_RIGHT)
+            watch.lap()
+            t_tick = watch.last
+            tick += 1
+            reading = ranges['front'] = read_distance(TRIG_FRONT, ECHO_FRONT)
+            if reading is not None:
+                raw_front = reading
+                watchdog.sensor_update()
+            if TRACE:
+                # ultrasonic -> fuzzy -> PWM, continued by the supervisor (tracing.py)
+                trace = Trace('steer', tick).mark('front')
+            M_READ['front'].observe(watch.lap())
+            if dropoff is not None:
+                # read right after the front so a drop-off is not held up by the side sensors
+                t_down = time.monotonic_ns()
+                if dropoff.update(read_distance(TRIG_DOWN, ECHO_DOWN)):
+                    stop_motors()
+                    emit(format_hazard('DropOff', t_down), flush=True)
+                M_READ['down'].observe(watch.lap())
+            reading = ranges['left'] = read_distance(TRIG_LEFT,  ECHO_LEFT)
+            if reading is not None:
+                left = reading
+            M_READ['left'].observe(watch.lap())
+            reading = ranges['right'] = read_distance(TRIG_RIGHT, ECHO_RIGHT)
+            if reading is not None:
+                right = reading
+            M_READ['right'].observe(watch.lap())
+            if trace is not None:
+                trace.mark('sides')
+
+            # too close on the raw range cuts the motors before any controller runs
+            watchdog.check_front(raw_front)
+
+            # Idle mode: slow ranging, no controllers, PWM off until something moves
+            if activity is not None:
+                energy.add('ping', n_sonars)
+                if range_motion.update((raw_front, left, right)):
+                    activity.motion('ultrasonic')
+                idle = activity.update()
+                energy.set_idle(idle)
+                if idle:
+                    if not outputs_off:
+                        stop_motors()
+                        # no sensor deadline while the outputs are off; restore() renews it
+                        watchdog.relax(max(HEARTBEAT_DEADLINE, 3 * IDLE_LOOP_INTERVAL))
+                        servo.ChangeDutyCycle(0)    # no pulses: the servo stops holding
+                        energy.hold('servo', False)
+                        outputs_off = True
+                    prev_front = raw_front
+                    last_cmd = (0.0, 0.0, 0.0)
+                    watchdog.kick()
+                    time.sleep(IDLE_LOOP_INTERVAL)
+                    continue
+                if outputs_off:
+                    watchdog.restore()
+                    # the outputs below are written again on this tick
+                    energy.hold('servo', True)
+                    outputs_off = False
+                energy.add('tick')
 
-            # 2) Distance controller
+            # Occupancy grid: dead-reckon last tick's command, then add this tick's echoes
+            steer_left, steer_right = left, right
+            if grid is not None:
+                now = time.monotonic()
+                grid.move(*odometry(*last_cmd, now - t_cmd))
+                t_cmd = now
+                grid.update(ranges, now)
+                near = grid.sector_ranges()
+                steer_left = min(left, near['left'])
+                steer_right = min(right, near['right'])
+                M_FREE_BEARING.set(grid.free_direction()[0])
+                M_COMPUTE['grid'].observe(watch.lap())
+
+            # 2) Fuse with the camera's person estimate, then distance controller
+            front = raw_front
+            if fusion is not None:
+                front, bearing = fusion.update(front, target_reader.read())
+            else:
+                bearing = None
             delta = front - prev_front
             speed = dist_ctrl.compute(front, delta)
             duty_mot = map_speed_to_duty(speed)
+            M_COMPUTE['distance'].observe(watch.lap())
 
             # 3) Steering controller
-            angle = steer_ctrl.compute(left, right)
-            duty_srv = map_angle_to_duty(angle)
+            angle = steer_ctrl.compute(steer_left, steer_right)
+            if bearing is not None:
+                # steer towards the person on top of the obstacle avoidance
+                angle = max(-30.0, min(30.0, angle + BEARING_GAIN * bearing))
+            M_COMPUTE['steering'].observe(watch.lap())
+            if trace is not None:
+                trace.mark('fuzzy')
+
+            # 4) Mix speed and steering into per-wheel commands
+            wheel_a, wheel_b, servo_angle = mixer.mix(speed, angle, interval)
+            duty_srv = map_angle_to_duty(servo_angle)
+            M_COMPUTE['mix'].observe(watch.lap())
 
-            # 4) Apply outputs
-            pwm_a.ChangeDutyCycle(duty_mot)
-            pwm_b.ChangeDutyCycle(duty_mot)
+            # 5) Apply outputs; while the watchdog holds, the motors stay off
+            if watchdog.tripped or (dropoff is not None and dropoff.active):
+                # write the stop on every held tick: a trip landing between the
+                # check and the duty write below would otherwise be undone for good
+                stop_motors()
+                mixer.reset()       # ramp up again from standstill on release
+                wheel_a = wheel_b = 0.0
+            else:
+                dir_a.set(wheel_a >= 0)
+                dir_b.set(wheel_b >= 0)
+                if speed_loop is not None:
+                    speed_loop.set_setpoints(abs(wheel_a), abs(wheel_b))
+                else:
+                    pwm_a.ChangeDutyCycle(map_speed_to_duty(abs(wheel_a)))
+                    pwm_b.ChangeDutyCycle(map_speed_to_duty(abs(wheel_b)))
+                if watchdog.tripped:
+                    # tripped while we were writing: put the stop back
+                    stop_motors()
+                    mixer.reset()
+                    wheel_a = wheel_b = 0.0
             servo.ChangeDutyCycle(duty_srv)
+            last_cmd = (wheel_a, wheel_b, servo_angle)
+            if trace is not None:
+                trace.mark('pwm')
+
+            # 6) Metrics, and the steering line run_all_final.py turns into STEER commands
+            M_DISTANCE['front'].set(front)
+            M_DISTANCE['left'].set(left)
+            M_DISTANCE['right'].set(right)
+            M_SPEED.set(speed)
+            M_ANGLE.set(angle)
+            cache = steer_ctrl.fis.cache_info() if CONTROLLER == 'mamdani' and not STEADY_STATE else None
+            if cache is not None:
+                M_STEER_CACHE['hits'].set(cache.hits)
+                M_STEER_CACHE['misses'].set(cache.misses)
+                M_STEER_CACHE['entries'].set(cache.currsize)
+            M_TICKS.inc()
+            M_TICK.observe(time.perf_counter() - t_tick)
+            if tick_log is not None and trace is None:
+                # formatted and printed by TickLog's thread; a traced tick stamps 'emit' here instead
+                tick_log.steer(front, delta, speed, duty_mot, wheel_a, wheel_b, left, right, angle, duty_srv)
+            else:
+                if DEBUG:
+                    line = f" Left: {left:.1f}cm | Right: {right:.1f}cm → angle={angle:.1f}°, duty={duty_srv:.1f}%"
+                else:
+                    line = f"angle={angle:.1f}°"
+                if trace is not None:
+                    line = trace.mark('emit').attach(line)
+                if DEBUG:
+                    # one write, so a hazard line cannot land inside the block
+                    line = (f"Front: {front:.1f}cm Δ{delta:.2f}cm → speed={speed:.2f} m/s, duty={duty_mot:.1f}%, "
+                            f"wheels A={wheel_a:.2f} B={wheel_b:.2f} m/s\n{line}\n"
+                            "––––––––––––––––––––––––––––––––––––––––")
+                emit(line, flush=True)
 
-            # 5) Debug
-            print(f"Front: {front:.1f}cm Δ{delta:.2f}cm → speed={speed:.2f} m/s, duty={duty_mot:.1f}%")
-            print(f" Left: {left:.1f}cm | Right: {right:.1f}cm → angle={angle:.1f}°, duty={duty_srv:.1f}%")
-            print("––––––––––––––––––––––––––––––––––––––––")
-           
+            watchdog.kick()
             prev_front = front
             time.sleep(interval)
 
     except KeyboardInterrupt:
-        print("Stopped by user")
+        emit("Stopped by user")
 
     finally:
+        if prof is not None:
+            prof.stop()
+        if tick_log is not None:
+            tick_log.stop()
+        if activity is not None:
+            print(energy.format())
+            activity.board.close()
+        watchdog.stop()
+        exporter.stop()
+        if target_reader is not None:
+            target_reader.close()
+        if speed_loop is not None:
+            speed_loop.stop()
         pwm_a.stop()
         pwm_b.stop()
         servo.stop()
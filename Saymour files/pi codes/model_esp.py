@@ -1,20 +1,22 @@
 #!/usr/bin/env python3
-import os, sys, socket, subprocess, threading, signal
+import os, sys, subprocess, threading, signal, time
+from config import get_config, yolo_args
+from esp_link import EspServer
+from multi_detect import split_source
+from hazards import ESP_MESSAGES, parse_hazard
+import tracing
 
-# ————— CONFIGURATION —————
-HOST = ''            
-PORT = 4002          # update PI_PORT in AudioPlayer.ino to 4001
+# ————— CONFIGURATION (saymour.json, see config.py) —————
+CFG = get_config('model-only')
+HOST = CFG.network.host
+PORT = CFG.network.detect_port   # must match PI_PORT in AudioPlayer.ino
 
 BASE = os.path.dirname(os.path.abspath(__file__))
 YOLO_SCRIPT = os.path.join(BASE, "yolo_detect.py")
-YOLO_CMD = [
-    sys.executable, YOLO_SCRIPT,
-    "--model", "best_ncnn_model",
-    "--source", "picamera0",
-    "--resolution", "1280x720"
-]
+# no control loop runs in this mode, so the person estimate is not shared
+YOLO_CMD = [sys.executable, YOLO_SCRIPT] + yolo_args(CFG, share_target=False)
 
-esp_conn  = None
+esp       = None
 yolo_proc = None
 
 def start_yolo():
@@ -40,35 +42,39 @@ def stop_yolo():
 
 def monitor_yolo():
     for line in yolo_proc.stdout:
+        # the trace context (SAYMOUR_TRACE=1) never goes to the ESP32
+        line, trace = tracing.split_trace(line)
+        if trace is not None:
+            trace.mark('read')
         print("YOLO |", line, end='')
-        if line.startswith("DETECT:"):
-            esp_conn.sendall((line.strip() + "\n").encode())
-            print(f"→ Sent to ESP32: {line.strip()}")
+        line, _ = split_source(line)
+        hazard = parse_hazard(line)
+        if hazard is not None:
+            # stairs come out of yolo_detect.py as HAZARD lines, ahead of the rest
+            line = ESP_MESSAGES.get(hazard[0], f"DETECT:{hazard[0]}")
+        if line.startswith(("DETECT:", "CUE:")):
+            if esp.send_line(line.strip(), trace):
+                print(f"→ Sent to ESP32: {line.strip()}")
 
 def main():
-    global esp_conn
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((HOST, PORT))
-    server.listen(1)
+    global esp
+    # Detection runs while an ESP32 is connected; the server keeps listening,
+    # so a dropped ESP32 is picked up again as soon as it reconnects
+    esp = EspServer(HOST, PORT, on_line=lambda line: None,
+                    on_connect=lambda link: start_yolo(),
+                    on_disconnect=lambda link: stop_yolo())
     print(f"🔌 Detect server listening on port {PORT}…")
-
-    while True:
-        esp_conn, addr = server.accept()
-        print("✅ ESP32 connected from", addr)
-        start_yolo()
-        try:
-            while True:
-                # No incoming data expected; just detect disconnects
-                data = esp_conn.recv(1024)
-                if not data:
-                    print("⚠ ESP32 disconnected")
-                    break
-            stop_yolo()
-            esp_conn.close()
-        except KeyboardInterrupt:
-            break
-
-    server.close()
+    esp.start()
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        esp.close()
+        stop_yolo()
+        for line in tracing.STATS.report():
+            print(line)
 
 if __name__ == "__main__":
     main()
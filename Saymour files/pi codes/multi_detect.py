@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+One detector for several cameras.
+
+A cane needs a forward and a downward view, a rover a front and side views.
+Starting yolo_detect.py once per camera loads the model once per camera and
+has every copy size its thread pools for the whole Pi. Here a single
+process holds one model:
+
+  * a reader thread per source owns the camera (or file, or frame bus),
+    converts each frame to BGR and keeps only the newest one; live sources
+    drop what the model had no time for, file sources wait for the model
+  * the detection loop takes the newest unseen frame of every source and
+    runs them through the model together. PyTorch (.pt) models get them as
+    one batch; the NCNN export is a fixed batch-1 net, so its frames go
+    through the one loaded net back to back
+  * results are tagged with the source name before they go to the
+    supervisor:
+
+        DETECT:Car @front
+        HAZARD:Stairs:812371000 @down
+        CUE:Person_L3 @front
+
+Sources are given as a comma-separated list of name=source (the name is
+optional and defaults to the source itself):
+
+    python multi_detect.py --model best_ncnn_model --sources front=picamera0,down=picamera1
+    python yolo_detect.py --model best_ncnn_model --source picamera0 --sources front=picamera0,down=usb0
+
+split_source() strips the tag again; run_all_final.py counts lines per
+source and sends the untagged line to the ESP32.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from hazards import CLASS_THRESHOLDS, HAZARD_CLASSES, HazardGate, format_hazard
+from telemetry import DEBUG, counter, gauge, histogram, start_file_exporter
+from tracing import TRACE, Trace, sensor_to_monotonic
+import profiler
+
+# --- Constants -------------------------------------------------------
+SOURCE_SEP   = ' @'     # between a line and its source name
+WAIT_TIMEOUT = 1.0      # s the loop waits for any source before checking for the end
+
+# Metrics (see telemetry.py); the per-source ones are labelled by source name
+M_INFER  = histogram('saymour_yolo_inference_seconds', 'Model call time')
+M_BATCH  = gauge('saymour_yolo_batch_frames', 'Frames in the last model call')
+
+
+def parse_sources(spec):
+    """
+    'front=picamera0,down=usb0' -> [('front', 'picamera0'), ('down', 'usb0')].
+    :raises ValueError: on an empty entry, a name with whitespace (split_source
+        would not recognise its tag) or a repeated name
+    """
+    sources = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        name, sep, source = entry.partition('=')
+        if not sep:
+            name = source = entry
+        name, source = name.strip(), source.strip()
+        if not name or not source:
+            raise ValueError(f"bad source entry {entry!r} (expected name=source)")
+        if any(c.isspace() for c in name):
+            raise ValueError(f"bad source entry {entry!r}: the name may not contain whitespace")
+        if any(name == other for other, _ in sources):
+            raise ValueError(f"bad source entry {entry!r}: the name {name!r} is used twice")
+        sources.append((name, source))
+    return sources
+
+
+def tag_source(line, source):
+    return line + SOURCE_SEP + source
+
+
+def split_source(line):
+    """(line without the source tag, source name or None). A trailing newline is kept."""
+    payload, sep, source = line.rstrip('\n').rpartition(SOURCE_SEP)
+    if not sep or not source or ' ' in source:
+        return line, None
+    if line.endswith('\n'):
+        payload += '\n'
+    return payload, source
+
+
+def can_batch(model_path):
+    """Only PyTorch weights take a dynamic batch; exported nets here are built for batch 1."""
+    return model_path.endswith('.pt')
+
+
+class SourceReader(threading.Thread):
+    """Reads one source on its own thread and holds its newest converted frame."""
+
+    def __init__(self, name, source, resize_to=None):
+        super().__init__(name=f'source-{name}', daemon=True)
+        from yolo_detect import detect_source_type
+        self.label = name
+        self.source = source
+        self.source_type, self.index = detect_source_type(source)
+        self.live = self.source_type in ('usb', 'picamera', 'bus')
+        self.resize_to = resize_to
+        self.cond = threading.Condition()
+        self.latest = None          # (seq, t_capture_ns, trace, frame)
+        self.seq = 0
+        self.taken = 0
+        self.dropped = 0
+        self.ended = False
+        self.fresh = None           # Event set on every new frame (shared by the service)
+        self.stopping = threading.Event()
+        self.m_frames = counter('saymour_yolo_source_frames_total', 'Frames read per source',
+                                {'source': name})
+        self.m_dropped = counter('saymour_yolo_source_dropped_total',
+                                 'Frames replaced before the model took them', {'source': name})
+
+    # ---- source ----
+
+    def _open(self):
+        import cv2
+        from yolo_detect import list_images
+        t = self.source_type
+        if t == 'image':
+            self.paths = [self.source]
+        elif t == 'folder':
+            self.paths = sorted(list_images(self.source))
+        elif t in ('video', 'usb'):
+            self.cap = cv2.VideoCapture(self.index if t == 'usb' else self.source)
+            if self.resize_to is not None:
+                self.cap.set(3, self.resize_to[0])
+                self.cap.set(4, self.resize_to[1])
+        elif t == 'picamera':
+            from picamera2 import Picamera2
+            self.cap = Picamera2(self.index)
+            config = {"format": 'XRGB8888'}
+            if self.resize_to is not None:
+                config["size"] = self.resize_to
+            self.cap.configure(self.cap.create_video_configuration(main=config))
+            self.cap.start()
+        else:
+            from frame_bus import FrameBusReader
+            self.cap = FrameBusReader(self.index)
+            self.bus_frame_no = -1
+        self.count = 0
+
+    def _grab(self):
+        """(t_capture_ns, frame, trace) for the next frame, or None at the end of the source."""
+        import cv2
+        t = self.source_type
+        t_ns = time.monotonic_ns()
+        trace = Trace('detect', f"{self.label}:{self.count + 1}") if TRACE else None
+        if t in ('image', 'folder'):
+            if self.count >= len(self.paths):
+                return None
+            frame = cv2.imread(self.paths[self.count])
+        elif t in ('video', 'usb'):
+            ret, frame = self.cap.read()
+            if not ret or frame is None:
+                return None
+        elif t == 'picamera':
+            if trace is not None:
+                request = self.cap.capture_request()
+                frame = request.make_array('main')
+                sensor = sensor_to_monotonic(request.get_metadata().get('SensorTimestamp'))
+                request.release()
+                if sensor is not None:
+                    trace.mark('sensor', sensor)
+            else:
+                frame = self.cap.capture_array()
+        else:
+            got = None
+            while got is None:
+                if self.stopping.is_set():
+                    return None
+                got = self.cap.wait_latest(self.bus_frame_no)
+            self.bus_frame_no, t_ns, view = got
+            frame = view.copy()     # the slot is reused by the capture process
+            if not self.cap.still_valid(self.bus_frame_no):
+                return self._grab()
+            if trace is not None:
+                trace.id = f"{self.label}:{self.bus_frame_no}"
+                trace.mark('capture', t_ns).mark('bus')
+        self.count += 1
+        if trace is not None and t != 'bus':
+            trace.mark('capture', t_ns)
+        return t_ns, frame, trace
+
+    def _close(self):
+        if self.source_type in ('video', 'usb'):
+            self.cap.release()
+        elif self.source_type == 'picamera':
+            self.cap.stop()
+        elif self.source_type == 'bus':
+            self.cap.close()
+
+    # ---- thread ----
+
+    def run(self):
+        from yolo_detect import preprocess_frame
+        self._open()
+        try:
+            while not self.stopping.is_set():
+                got = self._grab()
+                if got is None:
+                    break
+                t_ns, frame, trace = got
+                if frame is None:
+                    continue
+                frame = preprocess_frame(frame, self.source_type, self.resize_to)
+                if trace is not None:
+                    trace.mark('convert')
+                self.m_frames.inc()
+                with self.cond:
+                    if not self.live:
+                        # files: never skip a frame, wait for the model instead
+                        while self.taken < self.seq and not self.stopping.is_set():
+                            self.cond.wait(0.1)
+                    elif self.taken < self.seq:
+                        self.dropped += 1
+                        self.m_dropped.inc()
+                    self.seq += 1
+                    self.latest = (self.seq, t_ns, trace, frame)
+                if self.fresh is not None:
+                    self.fresh.set()
+        finally:
+            with self.cond:
+                self.ended = True
+            if self.fresh is not None:
+                self.fresh.set()
+            self._close()
+
+    def take(self):
+        """The newest frame not handed out yet, as (seq, t_capture_ns, trace, frame), or None."""
+        with self.cond:
+            latest = self.latest
+            if latest is None or latest[0] <= self.taken:
+                return None
+            self.taken = latest[0]
+            self.cond.notify_all()
+            return latest
+
+    def finished(self):
+        """True once the source has ended and its last frame was taken."""
+        with self.cond:
+            return self.ended and self.taken >= self.seq
+
+    def stop(self):
+        self.stopping.set()
+        with self.cond:
+            self.cond.notify_all()
+
+
+def infer(model, frames, batched, imgsz=None):
+    """Run the model on a list of frames; one result per frame."""
+    kwargs = {'verbose': False}
+    if imgsz:
+        kwargs['imgsz'] = imgsz
+    if batched and len(frames) > 1:
+        return list(model(frames, **kwargs))
+    return [model(frame, **kwargs)[0] for frame in frames]
+
+
+def run_multi(model_path, sources, resolution=None, thresh=0.5, threads=None, imgsz=None,
+              share_target=False, target_source=None, cues=False, batch=True, show=False,
+              prof_args=None):
+    """
+    Detect on every source in `sources` ([(name, source), ...]) with one
+    model until all sources end or SIGINT. Prints tagged lines for the supervisor.
+    """
+    from ultralytics import YOLO
+    from cue_planner import CuePlanner
+    from fusion import TargetWriter, CameraIntrinsics, pick_target, estimate_from_box
+    from resource_plan import set_library_threads, set_ncnn_threads
+    from yolo_detect import detection_counters, emit, extract_detections, filter_detections, draw_detections
+
+    if not os.path.exists(model_path):
+        print('ERROR: Model path is invalid or model was not found. Make sure the model filename was entered correctly.')
+        sys.exit(0)
+    if threads:
+        set_library_threads(threads)
+    resize_to = tuple(map(int, resolution.split('x'))) if resolution else None
+
+    model = YOLO(model_path, task='detect')
+    labels = model.names
+    m_detections = detection_counters(labels)
+    batched = batch and can_batch(model_path)
+    ncnn_threads_set = not threads
+
+    fresh = threading.Event()
+    readers = []
+    for name, source in sources:
+        reader = SourceReader(name, source, resize_to)
+        reader.fresh = fresh
+        readers.append(reader)
+    for reader in readers:
+        reader.start()
+    print(f"Detecting on {len(readers)} sources ({', '.join(r.label for r in readers)}) with one model, "
+          f"{'batched' if batched else 'one frame per call'}", flush=True)
+
+    exporter = start_file_exporter('yolo')
+    hazard_gate = HazardGate()      # one gate: stairs seen by two cameras alert once
+    planners = {r.label: CuePlanner() for r in readers} if cues else {}
+    target_source = target_source or readers[0].label
+    target_writer = TargetWriter() if share_target else None
+    intr = None
+    target_bearing = None
+    m_fps = {r.label: gauge('saymour_yolo_source_fps', 'Frames inferred per second per source',
+                            {'source': r.label}) for r in readers}
+    inferred = {r.label: 0 for r in readers}
+    prof = profiler.from_args(prof_args, 'yolo', {
+        'model': model_path, 'sources': ','.join(f"{n}={s}" for n, s in sources),
+        'resolution': resolution, 'thresh': thresh, 'threads': threads, 'batched': batched,
+    }) if prof_args is not None else None
+
+    t0 = time.perf_counter()
+    try:
+        while True:
+            fresh.wait(WAIT_TIMEOUT)
+            fresh.clear()
+            taken = [(reader, reader.take()) for reader in readers]
+            taken = [(reader, got) for reader, got in taken if got is not None]
+            if not taken:
+                if all(reader.finished() for reader in readers):
+                    break
+                continue
+
+            frames = [got[3] for _, got in taken]
+            t_infer = time.perf_counter()
+            results = infer(model, frames, batched, imgsz)
+            M_INFER.observe(time.perf_counter() - t_infer)
+            M_BATCH.set(len(frames))
+            if not ncnn_threads_set:
+                # the NCNN net only exists after the first call
+                set_ncnn_threads(model, threads)
+                ncnn_threads_set = True
+
+            for (reader, (seq, t_frame_ns, trace, frame)), result in zip(taken, results):
+                name = reader.label
+                if trace is not None:
+                    trace.mark('infer')
+                xyxy, conf, cls = extract_detections(result)
+                detections = filter_detections(xyxy, conf, cls, labels, thresh, CLASS_THRESHOLDS)
+                inferred[name] += 1
+                for classname, _, _, _ in detections:
+                    if classname in HAZARD_CLASSES and hazard_gate.allow(classname):
+                        emit(tag_source(format_hazard(classname, t_frame_ns), name), trace)
+                for classname, _, _, _ in detections:
+                    if not cues and classname not in HAZARD_CLASSES:
+                        emit(tag_source(f"DETECT:{classname}", name), trace)
+                    m_detections[classname].inc()
+                if cues:
+                    cue = planners[name].update(detections, frame.shape[1], frame.shape[0])
+                    if cue is not None:
+                        emit(tag_source(cue, name), trace)
+
+                if target_writer is not None and name == target_source:
+                    if intr is None or intr.width != frame.shape[1] or intr.height != frame.shape[0]:
+                        intr = CameraIntrinsics(frame.shape[1], frame.shape[0])
+                    target = pick_target(detections, target_bearing, intr)
+                    if target is not None:
+                        target_bearing, target_range = estimate_from_box(target[3], intr)
+                        target_writer.publish(target_bearing, target_range, target[2], t_frame_ns)
+                    elif target_bearing is not None:
+                        target_bearing = None
+                        target_writer.clear()
+
+                if show:
+                    import cv2
+                    draw_detections(frame, detections)
+                    cv2.imshow(f'YOLO {name}', frame)
+
+            elapsed = time.perf_counter() - t0
+            for name, n in inferred.items():
+                m_fps[name].set(n / elapsed)
+            if DEBUG:
+                print(f"batch of {len(frames)}: {', '.join(r.label for r, _ in taken)}", flush=True)
+            if show:
+                import cv2
+                if cv2.waitKey(1) in (ord('q'), ord('Q')):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for reader in readers:
+            reader.stop()
+        for reader in readers:
+            reader.join(timeout=2.0)
+        elapsed = time.perf_counter() - t0
+        for reader in readers:
+            print(f"{reader.label}: {inferred[reader.label] / elapsed:.2f} FPS inferred, "
+                  f"{reader.dropped} frames dropped", flush=True)
+        if target_writer is not None:
+            target_writer.close()
+        exporter.stop()
+        if prof is not None:
+            prof.stop()
+        if show:
+            import cv2
+            cv2.destroyAllWindows()
+    return inferred
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='One detector for several cameras')
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--sources', required=True,
+                        help='comma-separated name=source list, e.g. "front=picamera0,down=picamera1"')
+    parser.add_argument('--resolution', default=None, help='WxH for every source')
+    parser.add_argument('--thresh', type=float, default=0.5)
+    parser.add_argument('--threads', type=int, default=None, help='thread budget for OpenCV/NCNN/torch')
+    parser.add_argument('--imgsz', type=int, default=None, help='model input size')
+    parser.add_argument('--share-target', action='store_true',
+                        help="publish the followed person's bearing/range from --target-source")
+    parser.add_argument('--target-source', default=None, help='source used for --share-target (default: the first)')
+    parser.add_argument('--cues', action='store_true', help='CUE lines per source instead of DETECT lines')
+    parser.add_argument('--no-batch', action='store_true', help='one frame per model call even for .pt models')
+    parser.add_argument('--show', action='store_true', help='show a window per source')
+    profiler.add_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        sources = parse_sources(args.sources)
+    except ValueError as e:
+        print(f"ERROR: --sources: {e}")
+        sys.exit(1)
+    run_multi(args.model, sources, args.resolution, args.thresh, args.threads, args.imgsz,
+              args.share_target, args.target_source, args.cues, not args.no_batch, args.show, args)
+
+
+if __name__ == "__main__":
+    main()
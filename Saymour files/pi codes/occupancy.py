@@ -0,0 +1,223 @@
+"""
+Rolling occupancy grid around the rover, built from the three ultrasonics.
+
+The steering controller only sees the instantaneous left and right ranges,
+so an obstacle that has just slid out of a side sensor's cone is forgotten
+and the rover swings back towards it. The grid keeps that memory:
+
+  * robot-centred and robot-aligned, GRID_CELLS x GRID_CELLS cells of
+    CELL_CM (x forward, y to the left, the rover in the centre cell)
+  * log-odds per cell; each echo is a beam of BEAM_HALF_DEG either side of
+    the sensor axis: cells short of the range become more likely free, the
+    arc at the range more likely occupied. Evidence decays towards unknown
+    with MEMORY_S, so moved obstacles fade out
+  * shifted by dead reckoning from the commanded wheel speeds and servo
+    angle (odometry()). Motion is accumulated and the grid resampled once it
+    amounts to a whole cell or ROT_STEP_DEG; translations are whole-cell
+    shifts, rotations a nearest-cell gather, and the remainder is carried
+    over, so the grid never lags the pose by more than that
+
+Each sensor's beam covers the same cells on every tick (the grid moves with
+the rover), so the cells, their ranges and their bearings are computed once.
+An update is a few hundred cell updates per sensor and the queries are
+reductions over precomputed index sets; together they stay well inside a
+50 Hz tick (benchmarks: occupancy.grid_tick).
+
+Queries:
+  nearest(sector)    - range of the closest likely-occupied cell in a sector
+  sector_ranges()    - nearest() for every sector in SECTORS
+  free_direction()   - bearing with the most clearance in a forward wedge
+
+Bearings are in degrees, positive to the left, like the grid's y axis. The
+steering angle has the opposite sign (negative steers left).
+"""
+from math import cos, radians, sin, tan
+
+import numpy as np
+
+from drive_mixer import TRACK_WIDTH_M, WHEELBASE_M
+
+# --- Constants -------------------------------------------------------
+CELL_CM       = 5.0      # cell size
+GRID_CELLS    = 81       # odd, so the rover sits in the centre cell (±2 m)
+BEAM_HALF_DEG = 15.0     # HC-SR04 cone half-angle
+HIT_TOL_CM    = 5.0      # half thickness of the occupied arc at the measured range
+L_OCC         = 0.9      # log-odds added to the arc at the range
+L_FREE        = -0.4     # log-odds added inside the beam
+L_LIMIT       = 4.0      # clamp, so a cell can change its mind within a few echoes
+OCC_THRESH    = 0.8      # log-odds above which a cell counts as occupied (one hit is enough)
+MEMORY_S      = 8.0      # time constant of the decay towards unknown
+ROT_STEP_DEG  = 2.0      # accumulated rotation that triggers a resample
+
+# Sensor axes relative to the rover's heading (deg, positive left)
+SENSOR_BEARINGS = {'front': 0.0, 'left': 90.0, 'right': -90.0}
+
+# Sectors for nearest() (deg, positive left); left/right include the
+# rear quarters so obstacles that have been passed are still seen
+SECTORS = {
+    'front': (-30.0, 30.0),
+    'left':  (30.0, 150.0),
+    'right': (-150.0, -30.0),
+}
+
+# free_direction(): candidate headings every FREE_STEP_DEG up to ±FREE_SPAN_DEG;
+# a heading also needs its neighbours clear
+FREE_SPAN_DEG  = 90.0
+FREE_STEP_DEG  = 10.0
+
+
+def odometry(left_mps, right_mps, servo_deg, dt, track=TRACK_WIDTH_M, wheelbase=WHEELBASE_M):
+    """
+    Rover motion over dt from the commanded wheel speeds and servo angle.
+    :return: (dx_cm forward, dy_cm left, dtheta_rad counter-clockwise)
+    """
+    v = 0.5 * (left_mps + right_mps)
+    # differential split turns towards the slower wheel; a negative servo angle steers left
+    yaw = (right_mps - left_mps) / track - v * tan(radians(servo_deg)) / wheelbase
+    dtheta = yaw * dt
+    step = v * dt * 100.0
+    return step * cos(dtheta / 2), step * sin(dtheta / 2), dtheta
+
+
+class OccupancyGrid:
+    def __init__(self, cell=CELL_CM, cells=GRID_CELLS, sensors=SENSOR_BEARINGS, sectors=SECTORS,
+                 memory=MEMORY_S):
+        self.cell = cell
+        self.n = cells
+        self.half = cells // 2
+        self.max_range = self.half * cell
+        self.memory = memory
+        self.logodds = np.zeros((cells, cells), dtype=np.float32)
+        self._spare = np.zeros_like(self.logodds)
+        self.t_last = None
+
+        # cell centres in the rover frame and their polar coordinates
+        axis = (np.arange(cells) - self.half) * cell
+        self.x, self.y = np.meshgrid(axis, axis, indexing='ij')
+        self.range = np.hypot(self.x, self.y).ravel()
+        self.bearing = np.degrees(np.arctan2(self.y, self.x)).ravel()
+        inside = (self.range > 0) & (self.range <= self.max_range)
+
+        # beam cells per sensor: flat index and range, nearest first
+        self.beams = {}
+        for name, axis_deg in sensors.items():
+            off = (self.bearing - axis_deg + 180.0) % 360.0 - 180.0
+            idx = np.flatnonzero(inside & (np.abs(off) <= BEAM_HALF_DEG))
+            idx = idx[np.argsort(self.range[idx], kind='stable')]
+            self.beams[name] = (idx, self.range[idx])
+
+        self.sectors = {}
+        for name, (lo, hi) in sectors.items():
+            idx = np.flatnonzero(inside & (self.bearing >= lo) & (self.bearing <= hi))
+            self.sectors[name] = (idx, self.range[idx])
+
+        # free_direction(): cells binned by heading, sorted by bin for reduceat
+        edges = np.arange(-FREE_SPAN_DEG - FREE_STEP_DEG / 2, FREE_SPAN_DEG + FREE_STEP_DEG, FREE_STEP_DEG)
+        self.headings = (edges[:-1] + FREE_STEP_DEG / 2)
+        forward = inside & (self.bearing >= edges[0]) & (self.bearing < edges[-1])
+        idx = np.flatnonzero(forward)
+        bins = np.digitize(self.bearing[idx], edges) - 1
+        order = np.argsort(bins, kind='stable')
+        self._free_idx = idx[order]
+        self._free_range = self.range[self._free_idx]
+        self._free_starts = np.searchsorted(bins[order], np.arange(len(self.headings)))
+
+        # motion not yet applied to the grid (rover pose in the grid's frame)
+        self.px = self.py = self.ptheta = 0.0
+
+    # ---- motion ----
+
+    def move(self, dx, dy, dtheta):
+        """Add the rover's motion since the last call (cm, cm, rad in the current rover frame)."""
+        c, s = cos(self.ptheta), sin(self.ptheta)
+        self.px += c * dx - s * dy
+        self.py += s * dx + c * dy
+        self.ptheta += dtheta
+        rotate = abs(self.ptheta) >= radians(ROT_STEP_DEG)
+        if not rotate and abs(self.px) < self.cell and abs(self.py) < self.cell:
+            return
+        theta = self.ptheta if rotate else 0.0
+        tx = round(self.px / self.cell) * self.cell
+        ty = round(self.py / self.cell) * self.cell
+        self._resample(tx, ty, theta)
+        # what is left over, in the frame the grid now has
+        rx, ry = self.px - tx, self.py - ty
+        c, s = cos(-theta), sin(-theta)
+        self.px, self.py = c * rx - s * ry, s * rx + c * ry
+        self.ptheta -= theta
+
+    def _resample(self, tx, ty, theta):
+        """Move the grid into the frame at (tx, ty, theta) of the current one; new cells are unknown."""
+        old, new, n = self.logodds, self._spare, self.n
+        new.fill(0.0)
+        if theta == 0.0:
+            si, sj = int(round(tx / self.cell)), int(round(ty / self.cell))
+            if abs(si) < n and abs(sj) < n:
+                new[max(0, -si):n - max(0, si), max(0, -sj):n - max(0, sj)] = \
+                    old[max(0, si):n - max(0, -si), max(0, sj):n - max(0, -sj)]
+        else:
+            c, s = cos(theta), sin(theta)
+            i = np.rint((c * self.x - s * self.y + tx) / self.cell).astype(np.intp) + self.half
+            j = np.rint((s * self.x + c * self.y + ty) / self.cell).astype(np.intp) + self.half
+            valid = (i >= 0) & (i < n) & (j >= 0) & (j < n)
+            new[valid] = old[i[valid], j[valid]]
+        self.logodds, self._spare = new, old
+
+    # ---- sensing ----
+
+    def update(self, ranges, now):
+        """
+        Fold one set of echoes into the grid.
+        :param ranges: {sensor name: range in cm, or None for a missed echo}
+        :param now: time.monotonic() of the readings
+        """
+        grid = self.logodds
+        if self.t_last is not None and now > self.t_last:
+            grid *= np.float32(np.exp(-(now - self.t_last) / self.memory))
+        self.t_last = now
+        flat = grid.reshape(-1)
+        for name, reading in ranges.items():
+            if reading is None or name not in self.beams:
+                continue
+            idx, r = self.beams[name]
+            # beam cells are sorted by range: free up to the arc, occupied on it
+            free_end = np.searchsorted(r, reading - HIT_TOL_CM)
+            flat[idx[:free_end]] += L_FREE
+            if reading < self.max_range:
+                hit_end = np.searchsorted(r, reading + HIT_TOL_CM, side='right')
+                flat[idx[free_end:hit_end]] += L_OCC
+                touched = idx[:hit_end]
+            else:
+                touched = idx[:free_end]
+            flat[touched] = np.clip(flat[touched], -L_LIMIT, L_LIMIT)
+
+    # ---- queries ----
+
+    def nearest(self, sector):
+        """Range (cm) of the closest occupied cell in a sector, or max_range if there is none."""
+        idx, r = self.sectors[sector]
+        hits = r[self.logodds.reshape(-1)[idx] > OCC_THRESH]
+        return float(hits.min()) if hits.size else self.max_range
+
+    def sector_ranges(self):
+        return {name: self.nearest(name) for name in self.sectors}
+
+    def free_direction(self):
+        """
+        Heading (deg, positive left) with the most clearance, and that
+        clearance in cm. Ties go to the heading closest to straight ahead.
+        """
+        occupied = self.logodds.reshape(-1)[self._free_idx] > OCC_THRESH
+        ranges = np.where(occupied, self._free_range, self.max_range)
+        per_bin = np.minimum.reduceat(ranges, self._free_starts)
+        # a heading needs room on either side of it too
+        clearance = per_bin.copy()
+        clearance[1:] = np.minimum(clearance[1:], per_bin[:-1])
+        clearance[:-1] = np.minimum(clearance[:-1], per_bin[1:])
+        best = np.flatnonzero(clearance == clearance.max())
+        pick = best[np.argmin(np.abs(self.headings[best]))]
+        return float(self.headings[pick]), float(clearance[pick])
+
+    def probability(self):
+        """Occupancy probability per cell (for display and debugging)."""
+        return 1.0 / (1.0 + np.exp(-self.logodds))
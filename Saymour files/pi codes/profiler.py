@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Built-in profiler for the control loop, the detector and the supervisor.
+
+Nothing here runs unless a process is started with --profile (or the
+supervisor passes SAYMOUR_PROFILER down to its children); the loops carry
+no profiling hooks otherwise. Three modes:
+
+  * sample   - a SIGPROF timer every SAMPLE_INTERVAL of CPU time records
+               the main thread's stack. Time spent sleeping or blocked is not
+               sampled, so the result shows where the CPU goes.
+  * wall     - a SIGALRM timer every SAMPLE_INTERVAL of wall time records
+               every thread's stack, rooted at the thread name. For the
+               supervisor, whose work happens on reader/sender threads.
+  * cprofile - deterministic cProfile of the main thread. Heavier; use it
+               with --profile-seconds to bound the window.
+
+Python runs a signal handler only between bytecodes, so timer ticks that
+fire during one long C call (an NCNN inference, an OpenCV resize, a BLAS
+product) arrive as a single handler call. Each sample is therefore weighted
+by the CPU time (sample) or wall time (wall) since the previous one, in
+units of SAMPLE_INTERVAL, so time in C extensions is not undercounted.
+
+Sampled stacks are written in the collapsed format flamegraph.pl and
+speedscope read ("outer;inner;leaf count" per line) as
+
+    PROFILE_DIR/<process>-<timestamp>-<pid>.collapsed     (.pstats for cprofile)
+    PROFILE_DIR/<process>-<timestamp>-<pid>.json          run metadata
+
+when the window ends, the process exits, or stop() is called. The metadata
+holds what the caller passed (model, resolution, loop rate...) plus the
+sample count and the time spent in the sampler itself. To read a profile
+on the Pi without extra tools:
+
+    python profiler.py /tmp/saymour_profiles/ctrl-20250101-120000-1234.collapsed --top 20
+"""
+import argparse
+import atexit
+import collections
+import json
+import os
+import platform
+import signal
+import sys
+import threading
+import time
+
+# --- Constants -------------------------------------------------------
+PROFILE_DIR     = os.environ.get('SAYMOUR_PROFILE_DIR', '/tmp/saymour_profiles')
+PROFILER_ENV    = 'SAYMOUR_PROFILER'    # "<mode>" or "<mode>:<seconds>", inherited by children
+SAMPLE_INTERVAL = 0.01                  # s between samples (100 Hz)
+MODES           = ('sample', 'wall', 'cprofile')
+
+
+def add_arguments(parser):
+    """Add --profile/--profile-seconds to a script's argument parser."""
+    parser.add_argument('--profile', nargs='?', const='sample', choices=MODES, default=None,
+                        help='Profile this process (default mode: sample); output goes to ' + PROFILE_DIR)
+    parser.add_argument('--profile-seconds', type=float, default=None,
+                        help='Stop profiling after this many seconds (default: until exit)')
+
+
+def parse_env(value):
+    """'sample' / 'wall:30' -> (mode, seconds); (None, None) when unset."""
+    if not value:
+        return None, None
+    mode, _, seconds = value.partition(':')
+    if mode not in MODES:
+        raise ValueError(f"{PROFILER_ENV}: unknown mode {mode!r}")
+    return mode, float(seconds) if seconds else None
+
+
+def export_env(mode, seconds=None):
+    """Make child processes started from here profile themselves too."""
+    os.environ[PROFILER_ENV] = mode if seconds is None else f"{mode}:{seconds:g}"
+
+
+def from_args(args, process, meta=None):
+    """
+    Start a Profiler if --profile was given or SAYMOUR_PROFILER is set.
+    Returns it, or None (the usual case) without touching any signal.
+    """
+    mode, seconds = getattr(args, 'profile', None), getattr(args, 'profile_seconds', None)
+    if mode is None:
+        mode, env_seconds = parse_env(os.environ.get(PROFILER_ENV, ''))
+        seconds = seconds if seconds is not None else env_seconds
+    if mode is None:
+        return None
+    return Profiler(process, mode, seconds, meta=meta).start()
+
+
+class Profiler:
+    def __init__(self, process, mode='sample', seconds=None, interval=SAMPLE_INTERVAL,
+                 out_dir=PROFILE_DIR, meta=None):
+        if mode not in MODES:
+            raise ValueError(f"unknown profile mode {mode!r}")
+        self.process = process
+        self.mode = mode
+        self.seconds = seconds
+        self.interval = interval
+        self.out_dir = out_dir
+        self.meta = dict(meta or {})
+        self.counts = collections.Counter()     # tuple of code objects (root first) -> weighted samples
+        self.samples = 0
+        self.overhead = 0.0                     # s spent inside the sampler
+        self.started = None
+        self.deadline = None
+        self.running = False
+        self.path = None
+        self._cprofile = None
+        self._previous = None
+
+    # ---- control ----
+
+    def start(self):
+        """Install the timer (call from the main thread). Returns self."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        self.path = os.path.join(self.out_dir, f"{self.process}-{stamp}-{os.getpid()}")
+        self.started = time.time()
+        self.t0 = time.perf_counter()
+        self.deadline = self.t0 + self.seconds if self.seconds else None
+        self.running = True
+
+        if self.mode == 'cprofile':
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            if self.seconds:
+                self._arm(signal.SIGALRM, signal.ITIMER_REAL, self._on_window_end, self.seconds, 0)
+            self._cprofile.enable()
+        elif self.mode == 'sample':
+            self._clock = time.process_time
+            self._last_sample = self._clock()
+            self._arm(signal.SIGPROF, signal.ITIMER_PROF, self._on_sample, self.interval, self.interval)
+        else:
+            self._clock = time.perf_counter
+            self._last_sample = self._clock()
+            self._arm(signal.SIGALRM, signal.ITIMER_REAL, self._on_sample, self.interval, self.interval)
+        atexit.register(self.stop)
+        print(f"⏱ Profiling {self.process} ({self.mode}) to {self.path}.*", file=sys.stderr, flush=True)
+        return self
+
+    def _arm(self, signum, timer, handler, first, every):
+        self._signal = (signum, timer)
+        self._previous = signal.signal(signum, handler)
+        if signum == signal.SIGPROF:
+            # restart interrupted system calls, so C extensions do not see
+            # EINTR at 100 Hz. Wall-clock sampling needs the interruption:
+            # it is what wakes a main thread blocked on a lock or queue.
+            signal.siginterrupt(signum, False)
+        signal.setitimer(timer, first, every)
+
+    def _disarm(self):
+        if self._previous is None:
+            return
+        signum, timer = self._signal
+        signal.setitimer(timer, 0, 0)
+        signal.signal(signum, self._previous)
+        self._previous = None
+
+    def stop(self):
+        """Stop and write the output; later calls do nothing. Returns the output path prefix."""
+        if not self.running:
+            return self.path
+        self.running = False
+        self._disarm()
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self._write()
+        atexit.unregister(self.stop)
+        return self.path
+
+    # ---- sampling ----
+
+    def _on_window_end(self, signum, frame):
+        self.stop()
+
+    def _on_sample(self, signum, frame):
+        t = time.perf_counter()
+        # ticks that fired during a long C call were merged into this one
+        now = self._clock()
+        weight = (now - self._last_sample) / self.interval
+        self._last_sample = now
+        if self.mode == 'sample':
+            self.counts[_stack(frame)] += weight
+        else:
+            names = {th.ident: th.name for th in threading.enumerate()}
+            main = threading.main_thread().ident
+            for ident, top in sys._current_frames().items():
+                stack = _stack(frame if ident == main else top)
+                self.counts[(names.get(ident, f'thread-{ident}'),) + stack] += weight
+        self.samples += 1
+        self.overhead += time.perf_counter() - t
+        if self.deadline is not None and t >= self.deadline:
+            self.stop()
+
+    # ---- output ----
+
+    def _write(self):
+        elapsed = time.perf_counter() - self.t0
+        if self._cprofile is not None:
+            import io
+            import pstats
+            self._cprofile.dump_stats(self.path + '.pstats')
+            text = io.StringIO()
+            pstats.Stats(self._cprofile, stream=text).sort_stats('cumulative').print_stats(40)
+            with open(self.path + '.txt', 'w') as f:
+                f.write(text.getvalue())
+            output = self.path + '.pstats'
+        else:
+            output = self.path + '.collapsed'
+            with open(output, 'w') as f:
+                for stack, count in self.counts.most_common():
+                    # flamegraph.pl wants whole counts, in SAMPLE_INTERVAL units
+                    if round(count) > 0:
+                        f.write(';'.join(_label(s) for s in stack) + f" {round(count)}\n")
+
+        meta = {
+            'process': self.process,
+            'mode': self.mode,
+            'output': os.path.basename(output),
+            'pid': os.getpid(),
+            'argv': sys.argv,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'duration_s': elapsed,
+            'interval_s': None if self.mode == 'cprofile' else self.interval,
+            'samples': None if self.mode == 'cprofile' else self.samples,
+            'sampler_overhead_s': self.overhead,
+            'host': platform.node(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'cpus': len(os.sched_getaffinity(0)),
+            'loadavg': os.getloadavg(),
+        }
+        meta.update(self.meta)
+        with open(self.path + '.json', 'w') as f:
+            json.dump(meta, f, indent=2, default=str)
+            f.write('\n')
+        print(f"⏱ Profile written: {output} ({self.samples} samples, {elapsed:.1f} s)",
+              file=sys.stderr, flush=True)
+
+
+def _stack(frame):
+    """Code objects from the outermost frame to `frame`."""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return tuple(codes)
+
+
+def _label(item):
+    if isinstance(item, str):
+        return item     # thread name
+    return f"{item.co_name} ({os.path.basename(item.co_filename)}:{item.co_firstlineno})"
+
+
+def read_collapsed(path):
+    """[(list of frames, count), ...] from a collapsed-stack file."""
+    stacks = []
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            stack, _, count = line.rpartition(' ')
+            stacks.append((stack.split(';'), int(count)))
+    return stacks
+
+
+def summarize(stacks, top=25):
+    """Per-frame (self, total) sample counts, sorted by self time, as printable lines."""
+    self_counts = collections.Counter()
+    total_counts = collections.Counter()
+    n = sum(count for _, count in stacks) or 1
+    for frames, count in stacks:
+        self_counts[frames[-1]] += count
+        for name in set(frames):
+            total_counts[name] += count
+    lines = [f"{'self %':>7s} {'total %':>7s}  function ({n} samples)"]
+    for name, count in self_counts.most_common(top):
+        lines.append(f"{100.0 * count / n:7.1f} {100.0 * total_counts[name] / n:7.1f}  {name}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a collapsed-stack profile')
+    parser.add_argument('path', help='.collapsed file written by --profile')
+    parser.add_argument('--top', type=int, default=25, help='functions to list')
+    args = parser.parse_args()
+    for line in summarize(read_collapsed(args.path), args.top):
+        print(line)
+    meta = os.path.splitext(args.path)[0] + '.json'
+    if os.path.exists(meta):
+        with open(meta) as f:
+            print(json.dumps(json.load(f), indent=2))
+
+
+if __name__ == "__main__":
+    main()
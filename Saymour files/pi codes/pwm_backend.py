@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+PWM outputs with a selectable backend. Every backend exposes the same
+methods as an RPi.GPIO PWM object (start / ChangeDutyCycle / ChangeFrequency
+/ stop), so call sites only change where the object is created.
+
+Backends:
+  'rpigpio' - RPi.GPIO software PWM; a thread per pin, jitters under CPU load
+  'pigpio'  - pigpio daemon; hardware PWM on 12/13/18/19 when the channel is
+              free, DMA-timed PWM on any other pin (needs `sudo pigpiod`)
+  'sysfs'   - kernel PWM through /sys/class/pwm (needs e.g.
+              dtoverlay=pwm-2chan,pin=12,func=4,pin2=13,func2=4 in config.txt)
+
+GPIO 12 and 18 share PWM channel 0, and 13 and 19 share channel 1, so at
+most two pins get true hardware PWM. Open the most timing-sensitive output
+(the servo) first. A pin the chosen backend cannot serve falls back to
+pigpio DMA or RPi.GPIO, with a message.
+
+The backend comes from SAYMOUR_PWM_BACKEND (default 'rpigpio').
+
+Jitter measurement (wire the PWM pin to a spare input pin):
+
+    python pwm_backend.py --jitter --backend pigpio --pin 12 --freq 50 --duty 7.5 --loopback 21 --load 4
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+PWM_BACKENDS = ('rpigpio', 'pigpio', 'sysfs')
+DEFAULT_BACKEND = os.environ.get('SAYMOUR_PWM_BACKEND', 'rpigpio')
+
+# BCM pin -> hardware PWM channel
+HW_PWM_CHANNEL = {12: 0, 18: 0, 13: 1, 19: 1}
+
+SYSFS_CHIP = '/sys/class/pwm/pwmchip0'
+
+# hardware channels already handed out in this process, channel -> pin
+_claimed_channels = {}
+
+
+class RPiGPIOPWM:
+    """RPi.GPIO software PWM, the original behaviour."""
+    backend = 'rpigpio'
+
+    def __init__(self, gpio, pin, freq):
+        gpio.setup(pin, gpio.OUT)
+        self.pin = pin
+        self._pwm = gpio.PWM(pin, freq)
+
+    def start(self, duty):
+        self._pwm.start(duty)
+
+    def ChangeDutyCycle(self, duty):
+        self._pwm.ChangeDutyCycle(duty)
+
+    def ChangeFrequency(self, freq):
+        self._pwm.ChangeFrequency(freq)
+
+    def stop(self):
+        self._pwm.stop()
+
+
+class PigpioPWM:
+    """pigpio: hardware PWM where a channel is free, DMA-timed PWM otherwise."""
+    backend = 'pigpio'
+    _pi = None
+    DMA_RANGE = 10000
+
+    def __init__(self, gpio, pin, freq):
+        import pigpio
+        if PigpioPWM._pi is None:
+            PigpioPWM._pi = pigpio.pi()
+        if not PigpioPWM._pi.connected:
+            PigpioPWM._pi = None
+            raise RuntimeError("pigpiod is not running (start it with `sudo pigpiod`)")
+        self.pi = PigpioPWM._pi
+        self.pin = pin
+        self.freq = freq
+        self.duty = 0.0
+
+        channel = HW_PWM_CHANNEL.get(pin)
+        self.hardware = channel is not None and channel not in _claimed_channels
+        if self.hardware:
+            _claimed_channels[channel] = pin
+        else:
+            self.pi.set_PWM_frequency(pin, freq)
+            self.pi.set_PWM_range(pin, self.DMA_RANGE)
+
+    def start(self, duty):
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty):
+        self.duty = duty
+        if self.hardware:
+            self.pi.hardware_PWM(self.pin, self.freq, int(duty * 10000))
+        else:
+            self.pi.set_PWM_dutycycle(self.pin, int(duty / 100.0 * self.DMA_RANGE))
+
+    def ChangeFrequency(self, freq):
+        self.freq = freq
+        if not self.hardware:
+            self.pi.set_PWM_frequency(self.pin, freq)
+        self.ChangeDutyCycle(self.duty)
+
+    def stop(self):
+        if self.hardware:
+            self.pi.hardware_PWM(self.pin, 0, 0)
+            _claimed_channels.pop(HW_PWM_CHANNEL[self.pin], None)
+        else:
+            self.pi.set_PWM_dutycycle(self.pin, 0)
+
+
+class SysfsPWM:
+    """Kernel PWM through /sys/class/pwm. The pin must already be muxed to PWM by a dtoverlay."""
+    backend = 'sysfs'
+
+    def __init__(self, gpio, pin, freq, chip=SYSFS_CHIP):
+        channel = HW_PWM_CHANNEL.get(pin)
+        if channel is None:
+            raise ValueError(f"GPIO {pin} has no hardware PWM channel")
+        if channel in _claimed_channels:
+            raise ValueError(f"PWM channel {channel} is already used by GPIO {_claimed_channels[channel]}")
+        self.pin = pin
+        self.channel = channel
+        self.path = os.path.join(chip, f'pwm{channel}')
+        if not os.path.isdir(self.path):
+            with open(os.path.join(chip, 'export'), 'w') as f:
+                f.write(str(channel))
+            # udev needs a moment to fix up permissions on the new node
+            for _ in range(50):
+                if os.access(os.path.join(self.path, 'period'), os.W_OK):
+                    break
+                time.sleep(0.01)
+        _claimed_channels[channel] = pin
+        self.period_ns = 0
+        self._duty_file = None
+        self.ChangeFrequency(freq)
+
+    def _write(self, name, value):
+        with open(os.path.join(self.path, name), 'w') as f:
+            f.write(str(value))
+
+    def start(self, duty):
+        self.ChangeDutyCycle(duty)
+        self._write('enable', 1)
+
+    def ChangeDutyCycle(self, duty):
+        if self._duty_file is None:
+            self._duty_file = open(os.path.join(self.path, 'duty_cycle'), 'w')
+        self._duty_file.seek(0)
+        self._duty_file.write(str(int(self.period_ns * duty / 100.0)))
+        self._duty_file.flush()
+
+    def ChangeFrequency(self, freq):
+        period_ns = int(1e9 / freq)
+        # duty must never exceed the period, so shrink it first when the period gets shorter
+        if self.period_ns and period_ns < self.period_ns:
+            self._write('duty_cycle', 0)
+        self._write('period', period_ns)
+        self.period_ns = period_ns
+
+    def stop(self):
+        self._write('duty_cycle', 0)
+        self._write('enable', 0)
+        if self._duty_file is not None:
+            self._duty_file.close()
+            self._duty_file = None
+        _claimed_channels.pop(self.channel, None)
+
+
+_BACKEND_CLASSES = {'rpigpio': RPiGPIOPWM, 'pigpio': PigpioPWM, 'sysfs': SysfsPWM}
+_FALLBACK = {'sysfs': 'pigpio', 'pigpio': 'rpigpio'}
+
+
+def uses_hardware(backend):
+    """Whether pins for this backend must be left out of RPi.GPIO's setup()."""
+    return backend in ('pigpio', 'sysfs')
+
+
+def open_pwm(gpio, pin, freq, backend=None):
+    """
+    Create a PWM output on a BCM pin, falling back to a more general backend
+    when the requested one cannot drive this pin.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown PWM backend: {backend} (choose from {', '.join(PWM_BACKENDS)})")
+    while True:
+        try:
+            return _BACKEND_CLASSES[backend](gpio, pin, freq)
+        except (ValueError, RuntimeError, OSError, ImportError) as e:
+            fallback = _FALLBACK.get(backend)
+            if fallback is None:
+                raise
+            print(f"⚠ PWM on GPIO {pin}: {backend} unavailable ({e}), using {fallback}")
+            backend = fallback
+
+
+# --- Jitter measurement -------------------------------------------------
+
+def _busy(stop_at):
+    while time.time() < stop_at:
+        pass
+
+
+def measure_jitter(gpio, backend, pin, freq, duty, loopback_pin, seconds=5.0, load=0):
+    """
+    Drive `pin` and timestamp its rising edges on `loopback_pin`. Uses pigpio's
+    microsecond edge ticks when pigpiod is running, RPi.GPIO callbacks otherwise
+    (those add their own latency, so treat them as an upper bound).
+    :return: dict with period and high-time statistics in microseconds
+    """
+    pwm = open_pwm(gpio, pin, freq, backend)
+    rises, falls = [], []
+    pi = None
+    try:
+        import pigpio
+        pi = pigpio.pi()
+        if not pi.connected:
+            pi = None
+    except ImportError:
+        pass
+
+    if pi is not None:
+        pi.set_mode(loopback_pin, pigpio.INPUT)
+        cb = pi.callback(loopback_pin, pigpio.EITHER_EDGE,
+                         lambda g, level, tick: (rises if level else falls).append(tick))
+        clock = 'pigpio ticks'
+    else:
+        gpio.setup(loopback_pin, gpio.IN)
+
+        def on_edge(channel):
+            t = int(time.perf_counter() * 1e6)
+            (rises if gpio.input(channel) else falls).append(t)
+        gpio.add_event_detect(loopback_pin, gpio.BOTH, callback=on_edge)
+        clock = 'RPi.GPIO callbacks'
+
+    loaders = []
+    stop_at = time.time() + seconds
+    for _ in range(load):
+        p = multiprocessing.Process(target=_busy, args=(stop_at,))
+        p.start()
+        loaders.append(p)
+    try:
+        pwm.start(duty)
+        time.sleep(seconds)
+    finally:
+        pwm.stop()
+        for p in loaders:
+            p.join()
+        if pi is not None:
+            cb.cancel()
+            pi.stop()
+        else:
+            gpio.remove_event_detect(loopback_pin)
+
+    rises = np.array(rises, dtype=float)
+    falls = np.array(falls, dtype=float)
+    periods = np.diff(rises)
+    highs = []
+    j = 0
+    for r in rises:
+        while j < len(falls) and falls[j] <= r:
+            j += 1
+        if j < len(falls):
+            highs.append(falls[j] - r)
+    highs = np.array(highs)
+    expected_period = 1e6 / freq
+
+    def stats(values, expected):
+        if values.size == 0:
+            return None
+        err = values - expected
+        return {'mean_us': float(values.mean()), 'std_us': float(values.std()),
+                'p99_abs_err_us': float(np.percentile(np.abs(err), 99)),
+                'max_abs_err_us': float(np.abs(err).max())}
+
+    return {
+        'backend': getattr(pwm, 'backend', backend),
+        'hardware': bool(getattr(pwm, 'hardware', backend == 'sysfs')),
+        'clock': clock,
+        'edges': int(rises.size),
+        'period': stats(periods, expected_period),
+        'high_time': stats(highs, expected_period * duty / 100.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PWM backend utilities')
+    parser.add_argument('--jitter', action='store_true', help='measure PWM jitter through a loopback wire')
+    parser.add_argument('--backend', choices=PWM_BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument('--pin', type=int, default=12)
+    parser.add_argument('--freq', type=float, default=50)
+    parser.add_argument('--duty', type=float, default=7.5)
+    parser.add_argument('--loopback', type=int, default=21, help='input pin wired to --pin')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--load', type=int, default=0, help='busy processes to run alongside')
+    args = parser.parse_args()
+    if not args.jitter:
+        parser.print_help()
+        return
+
+    import RPi.GPIO as GPIO
+    GPIO.setmode(GPIO.BCM)
+    try:
+        res = measure_jitter(GPIO, args.backend, args.pin, args.freq, args.duty,
+                             args.loopback, args.seconds, args.load)
+    finally:
+        GPIO.cleanup()
+
+    print(f"Backend {res['backend']} ({'hardware' if res['hardware'] else 'software/DMA'}), "
+          f"{res['edges']} edges via {res['clock']}")
+    for name in ('period', 'high_time'):
+        st = res[name]
+        if st is None:
+            print(f"  {name}: no edges seen - check the loopback wire")
+            continue
+        print(f"  {name:9s} mean={st['mean_us']:9.1f} us  std={st['std_us']:7.1f} us  "
+              f"p99|err|={st['p99_abs_err_us']:7.1f} us  max|err|={st['max_abs_err_us']:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Declared CPU plan for the processes run_all_final.py launches.
+
+On the 4-core Pi the detector's thread pools (NCNN, OpenCV, BLAS) default
+to every core and starve the 10 Hz control loop. The plan below gives each
+child a core set, a scheduling class and a thread budget; the supervisor
+applies it when spawning (spawn()) and reports per-process CPU use
+(CpuMonitor) so detection throughput and control jitter can be traded off.
+
+The plan is applied from the supervisor to the child's pid right after
+Popen returns, not in a preexec_fn: the supervisor runs threads, and a
+forked child running Python before exec can deadlock on a lock one of them
+held. The child is still starting the interpreter at that point, long
+before it creates thread pools that would inherit the settings.
+
+The control loop is not real-time on purpose. main_combined.read_distance
+busy-polls the echo pin for up to ECHO_TIMEOUT per wait, and a SCHED_FIFO
+thread spinning there never gives its core up to anything at the same or a
+lower real-time priority - nor to any normal thread. On core 0 that is
+RPi.GPIO's software-PWM threads (the motor and servo pulses when no hardware
+PWM channel is used), the SpeedLoop, TickLog's writer and the metrics
+exporter. CTRL therefore runs under the normal scheduler at nice -10: it
+wins core 0 from everything else there without shutting it out, and only
+its Watchdog thread is promoted to SCHED_FIFO (it sleeps between checks).
+
+SCHED_FIFO needs root or CAP_SYS_NICE; without it the child falls back to
+the highest nice level it is allowed and the supervisor says so on stderr.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from telemetry import gauge
+
+# --- Plan ------------------------------------------------------------
+# cpus:     cores the process may run on (None = leave as is)
+# sched:    'fifo' for real-time, 'other' for the normal scheduler
+# priority: SCHED_FIFO priority (1-99)
+# nice:     nice value under 'other' (and the fallback for 'fifo')
+# threads:  thread budget for NCNN/OpenCV/BLAS pools (None = library default)
+RESOURCE_PLAN = {
+    # not 'fifo': read_distance busy-polls and would starve the PWM threads on core 0 (see above)
+    'CTRL': {'cpus': [0], 'sched': 'other', 'priority': 0, 'nice': -10, 'threads': 1},
+    'YOLO': {'cpus': [1, 2, 3], 'sched': 'other', 'priority': 0, 'nice': 5, 'threads': 3},
+    'CAPTURE': {'cpus': [1, 2, 3], 'sched': 'other', 'priority': 0, 'nice': 0, 'threads': 1},
+    # the supervisor itself: mostly asleep, but a stop gesture must not wait behind detection
+    'SUPERVISOR': {'cpus': None, 'sched': 'fifo', 'priority': 55, 'nice': -5, 'threads': None},
+}
+
+# Environment variables read by the BLAS/OpenMP runtimes at import time
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS')
+THREADS_ENV = 'SAYMOUR_THREADS'   # read by yolo_detect.py for OpenCV/NCNN/torch
+
+CPU_REPORT_INTERVAL = 10.0        # seconds between CPU use reports
+
+
+def _usable_cpus(cpus):
+    if cpus is None:
+        return None
+    usable = set(cpus) & os.sched_getaffinity(0)
+    return usable or None
+
+
+def apply_scheduling(entry, pid=0):
+    """Apply core pinning and scheduling to process `pid` (0: the calling process)."""
+    cpus = _usable_cpus(entry.get('cpus'))
+    if cpus:
+        os.sched_setaffinity(pid, cpus)
+
+    if entry.get('sched') == 'fifo':
+        try:
+            os.sched_setscheduler(pid, os.SCHED_FIFO, os.sched_param(entry.get('priority', 50)))
+            return
+        except (PermissionError, OSError) as e:
+            sys.stderr.write(f"resource_plan: SCHED_FIFO unavailable ({e}), using nice\n")
+    elif os.sched_getscheduler(pid) != os.SCHED_OTHER:
+        # children inherit the supervisor's real-time policy; drop back to the normal scheduler
+        os.sched_setscheduler(pid, os.SCHED_OTHER, os.sched_param(0))
+    nice = entry.get('nice')
+    if nice is not None:
+        try:
+            # absolute, not relative to whatever nice value was inherited
+            os.setpriority(os.PRIO_PROCESS, pid, nice)
+        except PermissionError:
+            # unprivileged processes may only lower their priority
+            if nice > 0:
+                raise
+            sys.stderr.write(f"resource_plan: cannot set nice {nice} without privileges\n")
+
+
+def child_env(entry, base=None):
+    env = dict(os.environ if base is None else base)
+    threads = entry.get('threads')
+    if threads:
+        for var in THREAD_ENV_VARS:
+            env[var] = str(threads)
+        env[THREADS_ENV] = str(threads)
+    return env
+
+
+def spawn(name, args, plan=None, **kwargs):
+    """subprocess.Popen(args, **kwargs) with the plan entry for `name` applied to the child."""
+    entry = (plan or RESOURCE_PLAN).get(name)
+    if entry is None:
+        return subprocess.Popen(args, **kwargs)
+    proc = subprocess.Popen(args, env=child_env(entry), **kwargs)
+    try:
+        apply_scheduling(entry, proc.pid)
+    except ProcessLookupError:
+        pass        # already gone; the supervisor's poll() will notice
+    except PermissionError as e:
+        sys.stderr.write(f"resource_plan: cannot apply the {name} plan ({e})\n")
+    return proc
+
+
+def thread_budget():
+    """Thread budget handed down by the supervisor, or None."""
+    value = os.environ.get(THREADS_ENV)
+    return int(value) if value else None
+
+
+def set_library_threads(threads):
+    """Cap OpenCV's and (if loaded) torch's thread pools."""
+    import cv2
+    cv2.setNumThreads(threads)
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+
+
+def set_ncnn_threads(model, threads):
+    """
+    Cap NCNN's thread count on an Ultralytics model. The NCNN net only exists
+    once the predictor has run, so call this after the first inference.
+    Returns True if an NCNN net was found.
+    """
+    backend = getattr(getattr(model, 'predictor', None), 'model', None)
+    net = getattr(backend, 'net', None)
+    if net is None or not hasattr(net, 'opt'):
+        return False
+    net.opt.num_threads = threads
+    return True
+
+
+def cpu_times(pid):
+    """User + system CPU seconds used so far by a process (all its threads)."""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    return (int(fields[11]) + int(fields[12])) / ticks
+
+
+class CpuMonitor(threading.Thread):
+    """Periodically prints how much CPU each supervised process used (100% = one core)."""
+
+    def __init__(self, get_procs, interval=CPU_REPORT_INTERVAL, log=print):
+        """
+        :param get_procs: callable returning {name: Popen or None}
+        """
+        super().__init__(daemon=True)
+        self.get_procs = get_procs
+        self.interval = interval
+        self.log = log
+        self._halt = threading.Event()
+        self.last = {}
+
+    def sample(self):
+        now = time.monotonic()
+        usage = {}
+        for name, proc in self.get_procs().items():
+            if proc is None or proc.poll() is not None:
+                self.last.pop(name, None)
+                continue
+            try:
+                used = cpu_times(proc.pid)
+                cpus = sorted(os.sched_getaffinity(proc.pid))
+            except (FileNotFoundError, ProcessLookupError):
+                continue
+            prev = self.last.get(name)
+            self.last[name] = (proc.pid, now, used)
+            if prev is not None and prev[0] == proc.pid and now > prev[1]:
+                usage[name] = ((used - prev[2]) / (now - prev[1]) * 100.0, cpus)
+                gauge('saymour_supervisor_child_cpu_percent', 'CPU use of a supervised process (100 = one core)',
+                      {'child': name}).set(usage[name][0])
+        return usage
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            usage = self.sample()
+            if usage:
+                self.log("📊 CPU " + "  ".join(
+                    f"{name} {pct:5.1f}% (cpus {','.join(map(str, cpus))})"
+                    for name, (pct, cpus) in sorted(usage.items())))
+
+    def stop(self):
+        self._halt.set()
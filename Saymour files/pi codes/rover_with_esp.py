@@ -1,15 +1,19 @@
 #!/usr/bin/env python3
-import os, sys, signal, socket, subprocess, threading
+import os, sys, signal, subprocess, threading, queue
+from config import get_config
+from esp_link import EspServer
+import tracing
 
-# ————— CONFIGURATION —————
-HOST = ''            # listen on all interfaces
-PORT = 5000          # match PI_PORT in FlexHaptic.ino
+# ————— CONFIGURATION (saymour.json, see config.py) —————
+CFG = get_config('rover-haptic')
+HOST = CFG.network.host          # listen on all interfaces
+PORT = CFG.network.haptic_port   # match PI_PORT in FlexHaptic.ino
 
 BASE = os.path.dirname(os.path.abspath(__file__))
 CTRL_SCRIPT = os.path.join(BASE, "main_combined.py")
 CTRL_CMD = [sys.executable, CTRL_SCRIPT]
 
-esp_conn   = None
+esp        = None
 ctrl_proc  = None
 
 def start_ctrl():
@@ -35,45 +39,47 @@ def stop_ctrl():
 
 def monitor_ctrl():
     for line in ctrl_proc.stdout:
+        line, trace = tracing.split_trace(line)
+        if trace is not None:
+            trace.mark('read')
         print("CTRL |", line, end='')
         if "angle=" in line:
             try:
                 angle_str = line.split("angle=")[1].split("°")[0]
                 angle = float(angle_str)
                 cmd = "STEER:LEFT\n" if angle < 0 else "STEER:RIGHT\n"
-                esp_conn.sendall(cmd.encode())
-                print(f"→ Sent to ESP32: {cmd.strip()}")
+                if esp.send_line(cmd, trace):
+                    print(f"→ Sent to ESP32: {cmd.strip()}")
             except Exception:
                 pass
 
 def main():
-    global esp_conn
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((HOST, PORT))
-    server.listen(1)
+    global esp
+    # gestures are handled here in arrival order; None means the glove dropped
+    inbox = queue.Queue()
+    esp = EspServer(HOST, PORT, on_line=inbox.put,
+                    on_disconnect=lambda link: inbox.put(None))
     print(f"🔌 Flex→Steer server listening on port {PORT}…")
+    esp.start()
 
-    while True:
-        esp_conn, addr = server.accept()
-        print("✅ ESP32 connected from", addr)
-        try:
-            while True:
-                data = esp_conn.recv(1024)
-                if not data:
-                    print("⚠ ESP32 disconnected")
-                    break
-                for line in data.decode().splitlines():
-                    print("← From ESP32:", line)
-                    if line.strip() == "GESTURE:INDEX":
-                        start_ctrl()
-                    elif line.strip() == "GESTURE:CLOSED":
-                        stop_ctrl()
-            stop_ctrl()
-            esp_conn.close()
-        except KeyboardInterrupt:
-            break
-
-    server.close()
+    try:
+        while True:
+            line = inbox.get()
+            if line is None:
+                stop_ctrl()
+                continue
+            print("← From ESP32:", line)
+            if line.strip() == "GESTURE:INDEX":
+                start_ctrl()
+            elif line.strip() == "GESTURE:CLOSED":
+                stop_ctrl()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        esp.close()
+        stop_ctrl()
+        for line in tracing.STATS.report():
+            print(line)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
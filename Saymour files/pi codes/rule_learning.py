@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Learn the follow-distance rule base from recorded demonstrations.
+
+The rules in fuzzydisttest.FuzzyForDistance (and the three in
+fuzzydistnew.fis) were written by hand for a 3 x 3 partition. This tool
+builds a rule base from logged (distance, change in distance, chosen speed)
+samples instead, for partitions as fine as the data supports, with the
+Wang-Mendel method:
+
+  1. each input and the output get a uniform partition of n MFs
+     (shoulder trapezoids at the ends, triangles inside)
+  2. every sample becomes a candidate rule: the MF with the highest
+     membership per variable, with degree mu_dist * mu_delta * mu_speed
+  3. candidates with the same antecedent conflict; per antecedent cell the
+     consequent with the largest degree wins ('max', classic Wang-Mendel)
+     or the one with the largest summed degree ('vote', steadier on noisy
+     logs). Both are a single np.maximum.at / np.bincount over the chunk
+  4. cells no sample reached take the consequent of the nearest cell that
+     has one, so the rule base is complete
+
+Samples are processed in chunks of CHUNK rows, so memory stays flat and a
+few million samples take seconds. The result is a two-input .fis file that
+fuzzydisttest.FuzzyForDistance.from_fis() and fuzzy_vec load. The learned
+controller and the hand-written one are then scored in batch (fuzzy_vec)
+on held-out samples: later sessions given with --eval, or a random
+--holdout fraction of the training logs.
+
+Logs are CSV files with a header containing 'distance' (cm) and 'speed'
+(commanded m/s), and either 'delta' (cm per tick) or consecutive rows from
+one run, from which the change in distance is rebuilt as in
+main_combined.py. .npz files with the same array names also work.
+
+    python rule_learning.py --log session1.csv --log session2.csv --mfs 7 5 5 --output learned.fis
+    python rule_learning.py --log field/*.csv --eval today.csv --conflict vote
+    python rule_learning.py --synthetic 2000000 --mfs 7 7 5
+"""
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+from fis_io import write_fis
+from fuzzy_vec import mamdani_from_fis, mf_batch
+
+# --- Constants -------------------------------------------------------
+CHUNK       = 1_000_000     # samples per learning pass, bounds memory
+EVAL_CHUNK  = 4096          # samples per batched Mamdani evaluation
+EVAL_MAX    = 100_000       # held-out samples scored (a random subset beyond this)
+EVAL_POINTS = 201           # output-universe samples while scoring
+HOLDOUT     = 0.2
+MFS         = (5, 5, 5)     # MFs for distance, change in distance, speed
+CONFLICTS   = ('max', 'vote')
+OUTPUT      = 'learned.fis'
+
+
+def uniform_partition(lo, hi, n, prefix):
+    """n evenly spaced MFs over [lo, hi]: trapmf shoulders at the ends, trimf in between."""
+    if n < 2:
+        raise ValueError(f"need at least 2 MFs per variable, got {n}")
+    c = np.linspace(lo, hi, n)
+    mfs = [(f"{prefix}1", 'trapmf', [lo, lo, c[0], c[1]])]
+    for k in range(1, n - 1):
+        mfs.append((f"{prefix}{k + 1}", 'trimf', [c[k - 1], c[k], c[k + 1]]))
+    mfs.append((f"{prefix}{n}", 'trapmf', [c[-2], c[-1], hi, hi]))
+    return [(name, t, [float(v) for v in p]) for name, t, p in mfs]
+
+
+def template(base, mfs=MFS, out_range=None, name='learned'):
+    """
+    Rule-less FIS dict with the base controller's variables and ranges and
+    uniform partitions of mfs = (n_dist, n_delta, n_speed) MFs.
+    """
+    (in1, in2), out = base['inputs'], base['outputs'][0]
+    out_range = tuple(out_range or out['range'])
+    variables = []
+    for var, var_range, n, prefix in ((in1, in1['range'], mfs[0], 'd'), (in2, in2['range'], mfs[1], 'dd'),
+                                      (out, out_range, mfs[2], 's')):
+        variables.append({'name': var['name'], 'range': tuple(var_range),
+                          'mfs': uniform_partition(var_range[0], var_range[1], n, prefix)})
+    return {
+        'name': name,
+        'type': 'mamdani',
+        'and_method': 'min', 'or_method': 'max', 'imp_method': 'min',
+        'agg_method': 'max', 'defuzz_method': 'centroid',
+        'inputs': variables[:2],
+        'outputs': variables[2:],
+        'rules': [],
+    }
+
+
+def _best_mf(x, var):
+    """Index of the MF with the highest membership per sample, and that membership."""
+    lo, hi = var['range']
+    x = np.clip(x, lo, hi)
+    mu = np.stack([mf_batch(x, t, p) for _, t, p in var['mfs']], axis=-1)
+    idx = mu.argmax(axis=1)
+    return idx, np.take_along_axis(mu, idx[:, None], axis=1)[:, 0]
+
+
+def learn_rules(fis, dist, delta, speed, conflict='max', fill=True, chunk=CHUNK):
+    """
+    Wang-Mendel rule base for the partitions in `fis` (see template()).
+    :return: (fis with rules filled in, per-cell support (n_dist, n_delta) sample counts)
+    """
+    if conflict not in CONFLICTS:
+        raise ValueError(f"conflict must be one of {CONFLICTS}, got {conflict!r}")
+    in1, in2 = fis['inputs']
+    out = fis['outputs'][0]
+    n1, n2, ny = len(in1['mfs']), len(in2['mfs']), len(out['mfs'])
+    score = np.zeros(n1 * n2 * ny)
+    support = np.zeros(n1 * n2, dtype=np.int64)
+
+    for start in range(0, len(dist), chunk):
+        stop = start + chunk
+        a1, m1 = _best_mf(dist[start:stop], in1)
+        a2, m2 = _best_mf(delta[start:stop], in2)
+        c, my = _best_mf(speed[start:stop], out)
+        cell = a1 * n2 + a2
+        key = cell * ny + c
+        degree = m1 * m2 * my
+        if conflict == 'max':
+            np.maximum.at(score, key, degree)
+        else:
+            score += np.bincount(key, weights=degree, minlength=score.size)
+        support += np.bincount(cell, minlength=support.size)
+
+    score = score.reshape(n1 * n2, ny)
+    consequent = score.argmax(axis=1)
+    have = score.max(axis=1) > 0
+    if fill and have.any() and not have.all():
+        # nearest populated cell in (distance MF, delta MF) index space
+        cells = np.stack(np.divmod(np.arange(n1 * n2), n2), axis=1)
+        known = np.flatnonzero(have)
+        empty = np.flatnonzero(~have)
+        d = np.abs(cells[empty, None, :] - cells[None, known, :]).sum(axis=2)
+        consequent[empty] = consequent[known[d.argmin(axis=1)]]
+        have[:] = True
+
+    learned = dict(fis)
+    learned['rules'] = [([int(k // n2) + 1, int(k % n2) + 1], [int(consequent[k]) + 1], 1.0, 1)
+                        for k in np.flatnonzero(have)]
+    return learned, support.reshape(n1, n2)
+
+
+def evaluate(fis, dist, delta, speed, n_points=EVAL_POINTS, chunk=EVAL_CHUNK):
+    """Batch error of a FIS against logged speeds: rmse, mae, max_abs, n."""
+    pred = np.empty(len(dist))
+    for start in range(0, len(dist), chunk):
+        stop = start + chunk
+        pred[start:stop] = mamdani_from_fis(fis, [dist[start:stop], delta[start:stop]], n_points=n_points)
+    err = pred - speed
+    return {
+        'rmse': float(np.sqrt(np.mean(err ** 2))),
+        'mae': float(np.mean(np.abs(err))),
+        'max_abs': float(np.max(np.abs(err))),
+        'n': len(err),
+    }
+
+
+# --- Logs -------------------------------------------------------------
+
+def _rebuild_delta(distance):
+    """Change in distance per tick, as main_combined.py computes it (0 on the first row)."""
+    return np.concatenate([[0.0], np.diff(distance)])
+
+
+def load_log(path):
+    """(distance, delta, speed) float arrays from one CSV or .npz log."""
+    if path.endswith('.npz'):
+        data = np.load(path)
+        distance = np.asarray(data['distance'], dtype=float)
+        speed = np.asarray(data['speed'], dtype=float)
+        delta = np.asarray(data['delta'], dtype=float) if 'delta' in data else _rebuild_delta(distance)
+        return distance, delta, speed
+
+    with open(path, newline='') as f:
+        header = [h.strip() for h in next(csv.reader(f))]
+    for column in ('distance', 'speed'):
+        if column not in header:
+            raise ValueError(f"{path}: no '{column}' column")
+    columns = ['distance', 'speed'] + (['delta'] if 'delta' in header else [])
+    table = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2,
+                       usecols=[header.index(c) for c in columns])
+    distance, speed = table[:, 0], table[:, 1]
+    delta = table[:, 2] if 'delta' in header else _rebuild_delta(distance)
+    return distance, delta, speed
+
+
+def load_logs(paths):
+    parts = [load_log(p) for p in paths]
+    return tuple(np.concatenate([p[i] for p in parts]) for i in range(3))
+
+
+def synthetic_samples(n, noise=0.08, seed=0):
+    """
+    Demonstrations from the hand-written controller plus speed noise, for
+    trying the tool without field logs. The teacher is the controller's
+    Sugeno fit (sugeno.py), which evaluates millions of points quickly.
+    """
+    from fuzzydisttest import FuzzyForDistance
+    from sugeno import fit_sugeno
+    base = FuzzyForDistance()
+    teacher = fit_sugeno(base.to_fis(), order=1)
+    rng = np.random.default_rng(seed)
+    dist = rng.uniform(*base.in1_range, n)
+    delta = np.clip(rng.normal(0.0, 12.0, n), *base.in2_range)
+    speed = teacher.evaluate_batch([dist, delta]) + rng.normal(0.0, noise, n)
+    return dist, delta, np.clip(speed, *base.out_range)
+
+
+def rule_table(fis):
+    """Consequent names laid out as distance MF rows x delta MF columns."""
+    in1, in2 = fis['inputs']
+    names = [name for name, _, _ in fis['outputs'][0]['mfs']]
+    table = {(ante[0], ante[1]): names[cons[0] - 1] for ante, cons, _, _ in fis['rules']}
+    width = max(len(n) for n in names + [name for name, _, _ in in2['mfs']]) + 1
+    lines = [' ' * 6 + ''.join(f"{name:>{width}s}" for name, _, _ in in2['mfs'])]
+    for i, (row, _, _) in enumerate(in1['mfs'], start=1):
+        lines.append(f"{row:6s}" + ''.join(f"{table.get((i, j), '-'):>{width}s}"
+                                           for j in range(1, len(in2['mfs']) + 1)))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wang-Mendel rule learning for the follow-distance controller')
+    parser.add_argument('--log', action='append', default=[], help='training log (CSV or .npz); can repeat')
+    parser.add_argument('--eval', action='append', default=[],
+                        help='held-out log to score on; default: a --holdout fraction of the training logs')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='add this many demonstrations from the hand-written controller plus noise')
+    parser.add_argument('--mfs', type=int, nargs=3, default=list(MFS), metavar=('DIST', 'DELTA', 'SPEED'),
+                        help='MFs per variable (default: %(default)s)')
+    parser.add_argument('--conflict', choices=CONFLICTS, default='max',
+                        help="'max': strongest sample wins (classic); 'vote': largest summed degree")
+    parser.add_argument('--no-fill', action='store_true', help='leave cells without samples out of the rule base')
+    parser.add_argument('--out-range', type=float, nargs=2, default=None, metavar=('LO', 'HI'),
+                        help="speed range (default: the hand-written controller's)")
+    parser.add_argument('--holdout', type=float, default=HOLDOUT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=OUTPUT)
+    args = parser.parse_args()
+
+    from fuzzydisttest import FuzzyForDistance
+    base = FuzzyForDistance().to_fis()
+
+    t0 = time.perf_counter()
+    parts = [load_logs(args.log)] if args.log else []
+    if args.synthetic:
+        parts.append(synthetic_samples(args.synthetic, seed=args.seed))
+    if not parts:
+        parser.error('no samples: give --log files or --synthetic N')
+    dist, delta, speed = (np.concatenate([p[i] for p in parts]) for i in range(3))
+    print(f"Loaded {len(dist)} samples in {time.perf_counter() - t0:.1f} s")
+
+    rng = np.random.default_rng(args.seed)
+    if args.eval:
+        test = load_logs(args.eval)
+    else:
+        held = rng.random(len(dist)) < args.holdout
+        test = (dist[held], delta[held], speed[held])
+        dist, delta, speed = dist[~held], delta[~held], speed[~held]
+
+    name = os.path.splitext(os.path.basename(args.output))[0]
+    t0 = time.perf_counter()
+    learned, support = learn_rules(template(base, args.mfs, args.out_range, name), dist, delta, speed,
+                                   args.conflict, fill=not args.no_fill)
+    elapsed = time.perf_counter() - t0
+    print(f"Learned {len(learned['rules'])} rules from {len(dist)} samples in {elapsed:.2f} s "
+          f"({len(dist) / max(elapsed, 1e-9) / 1e6:.1f} M samples/s); "
+          f"{int((support == 0).sum())} of {support.size} cells had no samples")
+    for line in rule_table(learned):
+        print('  ' + line)
+
+    if len(test[0]) > EVAL_MAX:
+        pick = rng.choice(len(test[0]), EVAL_MAX, replace=False)
+        test = tuple(a[pick] for a in test)
+    for label, fis in (('hand-written', base), ('learned', learned)):
+        e = evaluate(fis, *test)
+        print(f"  {label:12s} held-out RMSE {e['rmse']:.3f}  MAE {e['mae']:.3f}  "
+              f"max {e['max_abs']:.3f} m/s  (n={e['n']})")
+
+    write_fis(args.output, learned)
+    print(f"Wrote {args.output} (load with FuzzyForDistance.from_fis)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import subprocess, signal, sys, os
+from config import get_config, yolo_args
 
 def main():
+    cfg = get_config('combined')
+
     # Make sure we use the same python as this launcher
     PY = sys.executable
 
@@ -13,13 +16,8 @@ def main():
     procs = []
     try:
         # 1) Start YOLO detection
-        #    Adjust --model and --source to your needs:
-        procs.append(subprocess.Popen([
-            PY, YOLO,
-            "--model", "best_ncnn_model",
-            "--source", "picamera0",
-            "--resolution", "1280x720"
-        ]))
+        #    --model, --source etc. are in the detection section of saymour.json
+        procs.append(subprocess.Popen([PY, YOLO] + yolo_args(cfg)))
 
         # 2) Start your fuzzy + rover control loop
         procs.append(subprocess.Popen([PY, CTRL]))
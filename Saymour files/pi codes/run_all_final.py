@@ -1,132 +1,424 @@
 #!/usr/bin/env python3
+import argparse
 import os
+import queue
 import sys
 import subprocess
 import signal
-import socket
 import threading
+import time
+
+from resource_plan import RESOURCE_PLAN, apply_scheduling, spawn, CpuMonitor
+from telemetry import DEBUG, MetricsServer, counter, gauge, histogram
+from hazards import ESP_MESSAGES, parse_hazard
+from config import get_config, yolo_args
+from esp_link import EspServer
+from multi_detect import parse_sources, split_source
+import profiler
+import tracing
 
 # ————— CONFIGURATION —————
-HOST = ''           # listen on all interfaces
-PORT = 4000         # must match PI_PORT in your ESP32 sketch
+# Pins, ports and detector flags come from saymour.json (see config.py); the
+# children inherit the same file and profile through the environment
+CFG = get_config('full')
+HOST = CFG.network.host           # listen on all interfaces
+PORT = CFG.network.full_port      # must match PI_PORT in your ESP32 sketch
 
 # Paths to your two scripts (don’t change these)
 BASE = os.path.dirname(os.path.abspath(__file__))
 YOLO_SCRIPT = os.path.join(BASE, "yolo_detect.py")
 CTRL_SCRIPT = os.path.join(BASE, "main_combined.py")
+BUS_SCRIPT  = os.path.join(BASE, "frame_bus.py")
 
-# How to launch them (adjust model/source flags if needed)
-YOLO_CMD = [
-    sys.executable, YOLO_SCRIPT,
-    "--model", "best_ncnn_model",
-    "--source", "picamera0",
-    "--resolution", "1280x720"
-]
+# Let frame_bus.py own the camera so more consumers can share it
+USE_FRAME_BUS = CFG.detection.use_frame_bus
+
+# How to launch them (model/source flags are in the detection section)
+YOLO_CMD = [sys.executable, YOLO_SCRIPT] + yolo_args(CFG)
 CTRL_CMD = [sys.executable, CTRL_SCRIPT]
+CAPTURE_CMD = [
+    sys.executable, BUS_SCRIPT,
+    "--source", CFG.detection.source,
+    "--resolution", CFG.detection.resolution
+]
+
+# How often to sample the ESP32 link's round-trip time (seconds); framed
+# links also report their heartbeat RTT and per-command ack latency (esp_link.py)
+RTT_INTERVAL = 1.0
+
+# With SAYMOUR_TRACE=1, seconds between per-hop latency breakdowns (tracing.py)
+TRACE_REPORT_INTERVAL = 30.0
+
+# Seconds a child gets to exit after SIGINT before it is killed
+STOP_TIMEOUT = 1.0
+
+# Routine lines queued for the ESP32 before the oldest are dropped
+OUTBOX_SIZE = 64
+
+# L298N pins driven by main_combined.py (ENA, ENB, IN1-IN4); the supervisor
+# pulls them low itself so a stuck or killed CTRL cannot leave the motors on
+MOTOR_PINS = (CFG.pins.ena, CFG.pins.enb, CFG.pins.in1, CFG.pins.in2, CFG.pins.in3, CFG.pins.in4)
+
+# ————— METRICS —————
+M_SENT = {kind: counter('saymour_esp_messages_sent_total', 'Lines sent to the ESP32', {'kind': kind})
+          for kind in ('detect', 'steer', 'hazard', 'cue')}
+M_DROPPED   = counter('saymour_esp_messages_dropped_total', 'Routine lines dropped because the outbox was full')
+M_RECEIVED  = counter('saymour_esp_messages_received_total', 'Lines received from the ESP32')
+M_RTT       = histogram('saymour_esp_rtt_seconds', 'Round-trip time to the ESP32 (heartbeat, or TCP on text links)')
+M_RTT_LAST  = gauge('saymour_esp_rtt_last_seconds', 'Latest round-trip time to the ESP32')
+M_STOP_CUT  = histogram('saymour_stop_cut_seconds', 'Stop gesture to motor pins forced low by the supervisor')
+M_STOP_EXIT = histogram('saymour_stop_exit_seconds', 'Stop gesture to CTRL exited')
+M_CHILD_LINES = {name: counter('saymour_supervisor_child_lines_total', 'Lines read from a child', {'child': name})
+                 for name in ('YOLO', 'CTRL')}
+M_HAZARD_LATENCY = {kind: histogram('saymour_hazard_latency_seconds', 'Hazard capture to sent to the ESP32',
+                                    {'kind': kind})
+                    for kind in ESP_MESSAGES}
+M_SOURCE_LINES = {name: counter('saymour_yolo_source_lines_total', 'Detector lines per camera', {'source': name})
+                  for name, _ in (parse_sources(CFG.detection.sources) if CFG.detection.sources else ())}
 
 # ————— GLOBALS —————
-esp_conn   = None
-yolo_proc  = None
-ctrl_proc  = None
+esp          = None     # EspServer; the current link is esp.link
+outbox       = None
+yolo_proc    = None
+ctrl_proc    = None
+capture_proc = None
 
 
 def start_processes():
-    global yolo_proc, ctrl_proc, esp_conn
+    global yolo_proc, ctrl_proc, capture_proc
+
+    if USE_FRAME_BUS and (capture_proc is None or capture_proc.poll() is not None):
+        capture_proc = spawn("CAPTURE", CAPTURE_CMD)
+        print("✅ Frame bus capture started")
 
     if yolo_proc is None or yolo_proc.poll() is not None:
-        yolo_proc = subprocess.Popen(
-            YOLO_CMD,
+        yolo_proc = spawn(
+            "YOLO", YOLO_CMD,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
-            bufsize=1
+            bufsize=1,
         )
         threading.Thread(target=monitor_yolo, daemon=True).start()
         print("✅ YOLO process started")
 
     if ctrl_proc is None or ctrl_proc.poll() is not None:
-        ctrl_proc = subprocess.Popen(
-            CTRL_CMD,
+        ctrl_proc = spawn(
+            "CTRL", CTRL_CMD,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
-            bufsize=1
+            bufsize=1,
         )
         threading.Thread(target=monitor_ctrl, daemon=True).start()
         print("✅ CTRL process started")
 
 
-def stop_processes():
-    global yolo_proc, ctrl_proc
+class Outbox:
+    """
+    Lines to the ESP32. Routine traffic (DETECT, STEER) goes through a bounded
+    queue drained by one sender thread. Hazards take the priority lane and are
+    written immediately, waiting at most for the one line already being written.
+    Cues are latest-only: a new cue replaces one that has not gone out yet.
+    `conn` is anything with send_line(line, trace): the EspServer, or a
+    single EspLink. A line's trace, if any, travels with it to the link.
+    """
 
-    for proc, name in ((yolo_proc, "YOLO"), (ctrl_proc, "CTRL")):
-        if proc and proc.poll() is None:
-            print(f"🛑 Stopping {name}")
-            proc.send_signal(signal.SIGINT)
+    CUE_SLOT = object()     # queued in place of a cue; the sender takes whatever cue is newest
+
+    def __init__(self, conn, size=OUTBOX_SIZE):
+        self.conn = conn
+        self.queue = queue.Queue(maxsize=size)
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.cue = None
+        self.cue_lock = threading.Lock()     # not self.lock: that one is held for a whole write
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def send(self, line, trace=None):
+        self._put((line, trace))
+
+    def _put(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                # a stale steering or detection line is worth less than the new one
+                try:
+                    self.queue.get_nowait()
+                    M_DROPPED.inc()
+                except queue.Empty:
+                    pass
+
+    def send_latest(self, line, trace=None):
+        """Queue a cue; only the newest unsent cue is written."""
+        with self.cue_lock:
+            replaced = self.cue is not None
+            self.cue = (line, trace)
+        if replaced:
+            M_DROPPED.inc()
+        self._put(Outbox.CUE_SLOT)
+
+    def send_priority(self, line, trace=None):
+        with self.lock:
+            self.conn.send_line(line, trace)
+
+    def _drain(self):
+        while not self.closed.is_set():
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is Outbox.CUE_SLOT:
+                with self.cue_lock:
+                    item, self.cue = self.cue, None
+                if item is None:
+                    continue
+            try:
+                with self.lock:
+                    # with the ESP32 away the line is dropped; it is stale by the time it reconnects
+                    self.conn.send_line(*item)
+            except OSError:
+                pass
+
+    def close(self):
+        self.closed.set()
+        self.thread.join(timeout=1.0)
+
+
+def forward_hazard(kind, t_ns, trace=None):
+    """Send a hazard on the priority lane and record capture-to-wire latency."""
+    outbox.send_priority(ESP_MESSAGES.get(kind, f"DETECT:{kind}") + "\n", trace)
+    latency = (time.monotonic_ns() - t_ns) / 1e9
+    M_SENT["hazard"].inc()
+    m_latency = M_HAZARD_LATENCY.get(kind)
+    if m_latency is None:
+        m_latency = M_HAZARD_LATENCY[kind] = histogram('saymour_hazard_latency_seconds',
+                                                       'Hazard capture to sent to the ESP32', {'kind': kind})
+    m_latency.observe(latency)
+    print(f"⚠ Hazard {kind} → ESP32 {latency * 1000:.1f} ms after capture")
+
+
+def force_motors_off():
+    """Drive the motor pins low from this process. Returns False off-Pi."""
+    try:
+        import RPi.GPIO as GPIO
+    except (ImportError, RuntimeError):
+        return False
+    GPIO.setwarnings(False)
+    GPIO.setmode(GPIO.BCM)
+    for pin in MOTOR_PINS:
+        GPIO.setup(pin, GPIO.OUT, initial=GPIO.LOW)
+    return True
+
+
+def stop_processes(t_request=None):
+    """
+    Signal every child at once, cut the motors from here straight away, then
+    give the children until STOP_TIMEOUT to exit before killing them, so a
+    stalled child cannot hold up the stop.
+    """
+    global yolo_proc, ctrl_proc, capture_proc
+    t_request = time.monotonic() if t_request is None else t_request
+
+    running = [(proc, name) for proc, name in
+               ((ctrl_proc, "CTRL"), (yolo_proc, "YOLO"), (capture_proc, "CAPTURE"))
+               if proc and proc.poll() is None]
+    for proc, name in running:
+        proc.send_signal(signal.SIGINT)
+    if any(name == "CTRL" for _, name in running) and force_motors_off():
+        M_STOP_CUT.observe(time.monotonic() - t_request)
+
+    deadline = time.monotonic() + STOP_TIMEOUT
+    for proc, name in running:
+        print(f"🛑 Stopping {name}")
+        try:
+            proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            print(f"⚠ {name} did not exit within {STOP_TIMEOUT:.1f} s, killing it")
+            proc.kill()
             proc.wait()
+        if name == "CTRL":
+            # CTRL's GPIO.cleanup() leaves the pins floating; hold them low
+            force_motors_off()
+            elapsed = time.monotonic() - t_request
+            M_STOP_EXIT.observe(elapsed)
+            print(f"🛑 CTRL stopped {elapsed * 1000:.0f} ms after the request")
 
     yolo_proc = None
     ctrl_proc = None
+    capture_proc = None
 
 
 def monitor_ctrl():
     """Read lines from main_combined.py, parse angle, send STEER:… commands."""
-    for line in ctrl_proc.stdout:
-        print("CTRL |", line, end='')
-        if "angle=" in line:
+    lines = M_CHILD_LINES["CTRL"]
+    proc = ctrl_proc
+    for line in proc.stdout:
+        lines.inc()
+        line, trace = tracing.split_trace(line)
+        if trace is not None:
+            trace.mark('read')
+        if DEBUG:
+            print("CTRL |", line, end='')
+        hazard = parse_hazard(line)
+        if hazard is not None:
+            forward_hazard(*hazard, trace)
+        elif "angle=" in line:
             try:
                 angle_str = line.split("angle=")[1].split("°")[0]
                 angle = float(angle_str)
                 cmd = "STEER:LEFT\n" if angle < 0 else "STEER:RIGHT\n"
-                esp_conn.sendall(cmd.encode())
-                print(f"→ Sent to ESP32: {cmd.strip()}")
+                outbox.send(cmd, trace)
+                M_SENT["steer"].inc()
+                if DEBUG:
+                    print(f"→ Sent to ESP32: {cmd.strip()}")
             except Exception:
                 pass
+        elif not DEBUG:
+            # anything that is not the per-tick angle line is worth seeing
+            print("CTRL |", line, end='')
+    # CTRL is gone; unless it was replaced meanwhile, make sure it left the motors off
+    if ctrl_proc is proc or ctrl_proc is None:
+        force_motors_off()
 
 
 def monitor_yolo():
-    """Forward any DETECT:… lines from yolo_detect.py to the ESP32."""
+    """Forward HAZARD:… lines (priority lane), DETECT:… and CUE:… lines from yolo_detect.py to the ESP32."""
+    lines = M_CHILD_LINES["YOLO"]
     for line in yolo_proc.stdout:
-        print("YOLO |", line, end='')
-        if line.startswith("DETECT:"):
-            esp_conn.sendall((line.strip()+"\n").encode())
-            print(f"→ Sent to ESP32: {line.strip()}")
+        lines.inc()
+        line, trace = tracing.split_trace(line)
+        if trace is not None:
+            trace.mark('read')
+        # multi-camera detection tags lines with their source (multi_detect.py)
+        line, source = split_source(line)
+        if source is not None:
+            m_source = M_SOURCE_LINES.get(source)
+            if m_source is None:
+                m_source = M_SOURCE_LINES[source] = counter('saymour_yolo_source_lines_total',
+                                                            'Detector lines per camera', {'source': source})
+            m_source.inc()
+        hazard = parse_hazard(line)
+        if hazard is not None:
+            forward_hazard(*hazard, trace)
+        elif line.startswith("DETECT:"):
+            outbox.send(line.strip()+"\n", trace)
+            M_SENT["detect"].inc()
+            if DEBUG:
+                print("YOLO |", line, end='')
+                print(f"→ Sent to ESP32: {line.strip()}")
+        elif line.startswith("CUE:"):
+            outbox.send_latest(line.strip()+"\n", trace)
+            M_SENT["cue"].inc()
+            if DEBUG:
+                print("YOLO |", line, end='')
+        else:
+            print("YOLO |", line, end='')
+
 
+def sample_rtt(server, stop):
+    """Record the ESP32 link's RTT until `stop` is set."""
+    while not stop.wait(RTT_INTERVAL):
+        rtt = server.rtt()
+        if rtt is not None:
+            M_RTT.observe(rtt)
+            M_RTT_LAST.set(rtt)
 
-def main():
-    global esp_conn
 
-    # 1) Set up TCP server to accept ESP32 connection
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((HOST, PORT))
-    server.listen(1)
+def report_traces(stop):
+    """Print the per-hop latency breakdown every TRACE_REPORT_INTERVAL until `stop` is set."""
+    while not stop.wait(TRACE_REPORT_INTERVAL):
+        for line in tracing.STATS.report():
+            print(line, flush=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Gesture-driven supervisor for detection and the rover')
+    profiler.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global esp, outbox
+    args = parse_args(argv)
+
+    # --profile (or saymour.py --profiler) covers the children too; the
+    # supervisor's own work is on reader/sender threads, so instead of the
+    # main thread's CPU time it samples all of them on wall time
+    if args.profile is not None:
+        profiler.export_env(args.profile, args.profile_seconds)
+    mode, seconds = profiler.parse_env(os.environ.get(profiler.PROFILER_ENV, ''))
+    args.profile = 'wall' if mode == 'sample' else mode
+    args.profile_seconds = seconds
+    prof = profiler.from_args(args, 'supervisor', {
+        'port': PORT, 'model': CFG.detection.model, 'resolution': CFG.detection.resolution,
+        'loop_interval_s': CFG.control.loop_interval, 'use_frame_bus': USE_FRAME_BUS,
+    })
+
+    # Run above the children so a stop gesture is handled even when detection saturates the CPU
+    apply_scheduling(RESOURCE_PLAN["SUPERVISOR"])
+
+    # 1) Listen for the ESP32; it may drop and reconnect at any time. Lines
+    #    are handled here on the main thread, in arrival order, with their
+    #    arrival time; None means the link went down.
+    inbox = queue.Queue()
+    esp = EspServer(HOST, PORT,
+                    on_line=lambda line: inbox.put((line, time.monotonic())),
+                    on_disconnect=lambda link: inbox.put((None, time.monotonic())))
     print(f"🔌 Waiting for ESP32 on port {PORT}…")
-    esp_conn, addr = server.accept()
-    print("✅ ESP32 connected from", addr)
+    esp.start()
+    esp.wait_connected()
+    outbox = Outbox(esp)
+
+    # Metrics for this process and the children on http://<pi>:<metrics_port>/metrics
+    try:
+        metrics_server = MetricsServer(CFG.network.metrics_port).start()
+    except OSError as e:
+        print(f"⚠ Metrics endpoint unavailable: {e}")
+        metrics_server = None
+    rtt_stop = threading.Event()
+    threading.Thread(target=sample_rtt, args=(esp, rtt_stop), daemon=True).start()
+    if tracing.TRACE:
+        threading.Thread(target=report_traces, args=(rtt_stop,), daemon=True).start()
+
+    # Report per-process CPU use against the resource plan
+    cpu_monitor = CpuMonitor(lambda: {"YOLO": yolo_proc, "CTRL": ctrl_proc,
+                                      "CAPTURE": capture_proc})
+    cpu_monitor.start()
 
     try:
         # 2) Loop, handling incoming gestures
         while True:
-            data = esp_conn.recv(1024)
-            if not data:
-                print("⚠ ESP32 disconnected")
-                break
-
-            for line in data.decode().splitlines():
-                print("← From ESP32:", line)
-                if line.strip() == "GESTURE:INDEX":
-                    start_processes()
-                elif line.strip() == "GESTURE:CLOSED":
-                    stop_processes()
+            line, t_rx = inbox.get()
+            if line is None:
+                # without the glove nobody can send the stop gesture
+                stop_processes(t_rx)
+                continue
+            M_RECEIVED.inc()
+            print("← From ESP32:", line)
+            if line.strip() == "GESTURE:INDEX":
+                start_processes()
+            elif line.strip() == "GESTURE:CLOSED":
+                stop_processes(t_rx)
 
     except KeyboardInterrupt:
         print("\n⚠ Interrupted, shutting down…")
 
     finally:
+        rtt_stop.set()
+        if metrics_server is not None:
+            metrics_server.stop()
+        cpu_monitor.stop()
         stop_processes()
-        if esp_conn:
-            esp_conn.close()
-        server.close()
+        outbox.close()
+        esp.close()
+        for line in tracing.STATS.report():
+            print(line)
+        if prof is not None:
+            prof.stop()
 
 
 if __name__ == "__main__":
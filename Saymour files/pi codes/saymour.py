@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Single entry point: validate the configuration, then run the script for a
+profile with that configuration.
+
+    python saymour.py --profile full
+    python saymour.py --profile combined --config my_rover.json
+    python saymour.py --profile distance --print-config
+    python saymour.py --list
+
+A bad pin, port or value is reported before any GPIO is touched.
+"""
+import argparse
+import json
+import os
+import sys
+
+from config import (BASE, CONFIG_ENV, DEFAULT_PATH, PROFILE_ENV, PROFILES,
+                    ConfigError, load_config, to_dict, yolo_args)
+from profiler import export_env as export_profiler_env, parse_env as parse_profiler_env
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a Saymour profile')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='full',
+                        help='which mode to run (default: full)')
+    parser.add_argument('--config', default=os.environ.get(CONFIG_ENV, DEFAULT_PATH),
+                        help='configuration file (default: saymour.json next to this script)')
+    parser.add_argument('--print-config', action='store_true',
+                        help='print the merged configuration for the profile and exit')
+    parser.add_argument('--write-default', metavar='PATH',
+                        help='write the built-in defaults to PATH and exit')
+    parser.add_argument('--list', action='store_true', help='list the profiles and exit')
+    parser.add_argument('--profiler', metavar='MODE[:SECONDS]',
+                        help='profile the script (and any children it starts): sample, wall or cprofile')
+    args, extra = parser.parse_known_args()
+
+    if args.list:
+        for name, (script, what) in PROFILES.items():
+            print(f"{name:13s} {script:18s} {what}")
+        return 0
+
+    if args.write_default:
+        with open(args.write_default, 'w') as f:
+            json.dump(to_dict(load_config(None)), f, indent=2)
+            f.write('\n')
+        print(f"Wrote {args.write_default}")
+        return 0
+
+    path = args.config if os.path.exists(args.config) or args.config != DEFAULT_PATH else None
+    try:
+        cfg = load_config(path, args.profile)
+    except ConfigError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    if args.print_config:
+        data = to_dict(cfg)
+        del data['profiles']
+        print(json.dumps(data, indent=2))
+        return 0
+
+    if args.profiler:
+        try:
+            mode, seconds = parse_profiler_env(args.profiler)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 2
+        export_profiler_env(mode, seconds)
+
+    script = os.path.join(BASE, PROFILES[args.profile][0])
+    if args.profile == 'detect':
+        # yolo_detect.py takes its settings as flags; later flags override these
+        extra = yolo_args(cfg) + extra
+    os.environ[PROFILE_ENV] = args.profile
+    if path is not None:
+        os.environ[CONFIG_ENV] = os.path.abspath(path)
+    print(f"▶ {args.profile}: {os.path.basename(script)} ({path or 'built-in defaults'})", flush=True)
+    # replace this process so signals (Ctrl+C, the supervisor's SIGINT) reach the script directly
+    os.execv(sys.executable, [sys.executable, script] + extra)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Helpers for named multiprocessing.shared_memory blocks shared between the
+detection and control processes.
+
+Before Python 3.13, attaching to an existing block also registers it with
+this process's resource tracker, which then unlinks it at exit and pulls it
+out from under the process that created it. attach_shm() undoes that
+registration so only the creator owns the block's lifetime.
+
+A restarted writer replaces its block (create_shm unlinks the old one), and a
+reader attached to the old one keeps reading a mapping nobody writes any more.
+Readers compare shm_inode() with the inode they attached to every
+REATTACH_AFTER seconds and attach again when the name points elsewhere.
+"""
+import os
+import sys
+from multiprocessing import shared_memory
+
+# --- Constants -------------------------------------------------------
+SHM_DIR        = '/dev/shm'
+REATTACH_AFTER = 1.0        # s between checks that an attached block is still the named one
+
+
+def create_shm(name, size):
+    """Create a named block, replacing a stale one left behind by a crashed writer."""
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+
+def attach_shm(name):
+    """Attach to a block created by another process; raises FileNotFoundError if it is not there yet."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except (ImportError, AttributeError, KeyError):
+        pass
+    return shm
+
+
+def shm_inode(name):
+    """Identity of the block currently under name (its /dev/shm inode), or None if there is none."""
+    try:
+        return os.stat(os.path.join(SHM_DIR, name.lstrip('/'))).st_ino
+    except OSError:
+        return None
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Inner wheel-speed loop for the rover.
+
+The fuzzy distance controller asks for a speed in m/s. Instead of turning
+that straight into a duty cycle with a voltage model (which drifts with
+battery charge, load and surface), each motor gets:
+
+  * a WheelEncoder that counts optical/hall encoder edges on a GPIO
+    interrupt and estimates wheel speed from the edge period,
+  * a MotorCalibration table (speed -> duty) used as feed-forward,
+  * a PIController that trims the duty from the measured speed.
+
+SpeedLoop runs the PI loops for both motors on their own thread at
+SPEED_LOOP_HZ, well above the 10 Hz fuzzy loop, which just updates the
+setpoints.
+
+Calibrate the feed-forward tables once per rover (wheels off the ground):
+
+    python speed_control.py --calibrate
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# --- Constants -------------------------------------------------------
+# Encoder pins are pins.enc_left / pins.enc_right in saymour.json (config.py)
+SLOTS_PER_REV  = 20      # edges per wheel revolution (20-slot optical disc)
+WHEEL_DIAM_M   = 0.065   # wheel diameter (m)
+SPEED_LOOP_HZ  = 50      # inner loop rate (Hz)
+EDGE_TIMEOUT   = 0.25    # no edge for this long means the wheel has stopped (s)
+
+KP = 25.0                # duty % per m/s of speed error
+KI = 80.0                # duty % per (m/s * s) of accumulated error
+I_LIMIT = 30.0           # clamp on the integral contribution (duty %)
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+CALIBRATION_FILE = os.path.join(BASE, "motor_calibration.json")
+
+
+class WheelEncoder:
+    """
+    Counts encoder edges through an RPi.GPIO edge interrupt and estimates the
+    wheel speed from the time between edges. The callback runs on RPi.GPIO's
+    event thread; it only stores a timestamp and a count.
+    """
+
+    def __init__(self, gpio, pin, slots_per_rev=SLOTS_PER_REV, wheel_diam=WHEEL_DIAM_M):
+        self.gpio = gpio
+        self.pin = pin
+        self.dist_per_edge = np.pi * wheel_diam / slots_per_rev
+        self.count = 0
+        self._last_edge = None
+        self._period = None
+
+        gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+        gpio.add_event_detect(pin, gpio.RISING, callback=self._on_edge)
+
+    def _on_edge(self, channel):
+        now = time.monotonic()
+        if self._last_edge is not None:
+            self._period = now - self._last_edge
+        self._last_edge = now
+        self.count += 1
+
+    def speed(self):
+        """Wheel speed in m/s; decays towards 0 as soon as edges stop arriving."""
+        last, period = self._last_edge, self._period
+        if last is None or period is None:
+            return 0.0
+        since = time.monotonic() - last
+        if since > EDGE_TIMEOUT:
+            return 0.0
+        return self.dist_per_edge / max(period, since)
+
+    def close(self):
+        self.gpio.remove_event_detect(self.pin)
+
+
+class PIController:
+    """PI with feed-forward, output clamping and conditional-integration anti-windup."""
+
+    def __init__(self, kp=KP, ki=KI, out_min=0.0, out_max=100.0, i_limit=I_LIMIT):
+        self.kp = kp
+        self.ki = ki
+        self.out_min = out_min
+        self.out_max = out_max
+        self.i_limit = i_limit
+        self.integral = 0.0
+
+    def reset(self):
+        self.integral = 0.0
+
+    def update(self, setpoint, measured, dt, feedforward=0.0):
+        error = setpoint - measured
+        unclamped = feedforward + self.kp * error + self.integral
+        # only integrate while the output is not pinned in the direction of the error
+        saturated = (unclamped >= self.out_max and error > 0) or (unclamped <= self.out_min and error < 0)
+        if not saturated:
+            self.integral += self.ki * error * dt
+            self.integral = max(-self.i_limit, min(self.integral, self.i_limit))
+        out = feedforward + self.kp * error + self.integral
+        return max(self.out_min, min(out, self.out_max))
+
+
+class MotorCalibration:
+    """Per-motor feed-forward table mapping wheel speed (m/s) to duty (%)."""
+
+    def __init__(self, speeds, duties):
+        order = np.argsort(speeds)
+        self.speeds = np.asarray(speeds, dtype=float)[order]
+        self.duties = np.asarray(duties, dtype=float)[order]
+
+    def duty_for(self, speed):
+        if speed <= 0:
+            return 0.0
+        return float(np.interp(speed, self.speeds, self.duties))
+
+    @classmethod
+    def linear(cls, max_speed=1.4, vin=15.0, start_v=8.0):
+        """The open-loop voltage model from main_combined.map_speed_to_duty."""
+        start = start_v / vin * 100.0
+        return cls([0.0, 1e-3, max_speed], [0.0, start, 100.0])
+
+    def to_dict(self):
+        return {'speeds': self.speeds.tolist(), 'duties': self.duties.tolist()}
+
+
+def load_calibration(path=CALIBRATION_FILE, fallback=None):
+    """
+    Load {'left': MotorCalibration, 'right': MotorCalibration}; a motor that
+    has not been calibrated gets `fallback`, by default the linear voltage model.
+    """
+    tables = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+        for name, table in data.items():
+            tables[name] = MotorCalibration(table['speeds'], table['duties'])
+    for name in ('left', 'right'):
+        tables.setdefault(name, fallback or MotorCalibration.linear())
+    return tables
+
+
+def save_calibration(tables, path=CALIBRATION_FILE):
+    with open(path, 'w') as f:
+        json.dump({name: cal.to_dict() for name, cal in tables.items()}, f, indent=2)
+
+
+def calibrate(pwm, encoder, duties=range(20, 101, 10), settle=1.5, measure=1.0):
+    """Sweep the duty cycle on one motor and record the steady wheel speed at each step."""
+    speeds, used = [0.0], [0.0]
+    try:
+        for duty in duties:
+            pwm.ChangeDutyCycle(duty)
+            time.sleep(settle)
+            start_count, t0 = encoder.count, time.monotonic()
+            time.sleep(measure)
+            speed = (encoder.count - start_count) * encoder.dist_per_edge / (time.monotonic() - t0)
+            print(f"  duty={duty:5.1f}% → {speed:.3f} m/s")
+            if speed > speeds[-1]:
+                speeds.append(speed)
+                used.append(float(duty))
+    finally:
+        pwm.ChangeDutyCycle(0)
+    return MotorCalibration(speeds, used)
+
+
+class SpeedLoop(threading.Thread):
+    """
+    Runs one PI loop per motor at a fixed rate. The outer (fuzzy) loop only
+    calls set_setpoints(); the PWM outputs are owned by this thread.
+    """
+
+    def __init__(self, motors, rate_hz=SPEED_LOOP_HZ):
+        """
+        :param motors: dict name -> (pwm, WheelEncoder, MotorCalibration)
+        """
+        super().__init__(daemon=True)
+        self.motors = motors
+        self.period = 1.0 / rate_hz
+        self.pis = {name: PIController() for name in motors}
+        self.setpoints = {name: 0.0 for name in motors}
+        self.duties = {name: 0.0 for name in motors}
+        self._running = threading.Event()
+
+    def set_setpoints(self, left, right):
+        self.setpoints['left'] = left
+        self.setpoints['right'] = right
+
+    def measured(self):
+        return {name: enc.speed() for name, (_, enc, _) in self.motors.items()}
+
+    def run(self):
+        self._running.set()
+        next_tick = time.monotonic()
+        last = next_tick
+        while self._running.is_set():
+            now = time.monotonic()
+            dt = now - last
+            last = now
+            for name, (pwm, enc, cal) in self.motors.items():
+                sp = self.setpoints[name]
+                if sp <= 0:
+                    self.pis[name].reset()
+                    duty = 0.0
+                else:
+                    duty = self.pis[name].update(sp, enc.speed(), dt, feedforward=cal.duty_for(sp))
+                if duty != self.duties[name]:
+                    pwm.ChangeDutyCycle(duty)
+                    self.duties[name] = duty
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # overran; resynchronise instead of bursting to catch up
+                next_tick = time.monotonic()
+
+    def stop(self):
+        self._running.clear()
+        if self.is_alive():
+            self.join(timeout=1.0)
+        for name, (pwm, _, _) in self.motors.items():
+            pwm.ChangeDutyCycle(0)
+            self.duties[name] = 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wheel speed loop utilities')
+    parser.add_argument('--calibrate', action='store_true',
+                        help='sweep each motor and write the feed-forward tables')
+    parser.add_argument('--output', default=CALIBRATION_FILE)
+    args = parser.parse_args()
+    if not args.calibrate:
+        parser.print_help()
+        return
+
+    import RPi.GPIO as GPIO
+    import main_combined as mc
+
+    mc.setup_gpio()
+    GPIO.output(mc.IN1_PIN, GPIO.HIGH)
+    GPIO.output(mc.IN2_PIN, GPIO.LOW)
+    GPIO.output(mc.IN3_PIN, GPIO.HIGH)
+    GPIO.output(mc.IN4_PIN, GPIO.LOW)
+    pwm_a = GPIO.PWM(mc.ENA_PIN, mc.MOTOR_PWM_HZ)
+    pwm_b = GPIO.PWM(mc.ENB_PIN, mc.MOTOR_PWM_HZ)
+    pwm_a.start(0)
+    pwm_b.start(0)
+    encoders = {'left': WheelEncoder(GPIO, mc.ENC_LEFT_PIN), 'right': WheelEncoder(GPIO, mc.ENC_RIGHT_PIN)}
+
+    tables = {}
+    try:
+        for name, pwm in (('left', pwm_a), ('right', pwm_b)):
+            print(f"Calibrating {name} motor…")
+            tables[name] = calibrate(pwm, encoders[name])
+        save_calibration(tables, args.output)
+        print(f"Saved calibration to {args.output}")
+    except KeyboardInterrupt:
+        print("\nCalibration interrupted, nothing saved")
+    finally:
+        for enc in encoders.values():
+            enc.close()
+        pwm_a.stop()
+        pwm_b.stop()
+        GPIO.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Allocation-free control tick for main_combined.py (control.steady_state).
+
+A normal tick builds NumPy arrays inside the controllers (np.array([x]) per
+membership, the 1000-point linspace and a zeros_like per output MF), goes
+through skfuzzy's dict-based plumbing for the distance controller and
+formats the console lines with f-strings. On the Pi that churn shows up as
+GC pauses and loop jitter. In steady-state mode:
+
+  * Mamdani controllers run as PreallocMamdani: the output MFs sampled over
+    the universe, the clipping and aggregation buffers and the centroid
+    moments are built once. A tick fuzzifies on floats into a preallocated
+    list and reuses the buffers through ufunc out= arguments
+  * the skfuzzy distance controller (fuzzy_controller_dist.py) runs as
+    TabulatedDistance: skfuzzy itself, evaluated at start-up every
+    DIST_TABLE_STEP cm, linearly interpolated per tick (within 2e-4 m/s)
+  * the per-tick lines are written by TickLog's background thread from a
+    preallocated ring of values; the tick only stores floats. Other lines
+    the loop prints while it runs (hazards, idle/active changes, traced
+    ticks) go through TickLog.write so they cannot interleave with them
+  * fusion.TargetFusion runs its range filter on floats, and the tick
+    reuses one Stopwatch
+  * gc.freeze() after start-up keeps the long-lived set-up objects out of
+    every later collection
+
+What is left per tick are Python floats, which come from a free list, and
+loop iterators and the odd large int, which are released within the
+statement. benchmarks/bench_steady.py checks with tracemalloc, tick by
+tick, that nothing more is allocated and nothing is kept.
+"""
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from fuzzysteertest import MembershipFunction
+
+# --- Constants -------------------------------------------------------
+OUT_POINTS      = 1000      # output universe samples, as fuzzydisttest/fuzzysteertest
+DIST_TABLE_STEP = 0.25      # cm between the skfuzzy samples of TabulatedDistance
+RING_SLOTS      = 64        # lines TickLog can fall behind before values are overwritten
+SEPARATOR       = "––––––––––––––––––––––––––––––––––––––––"
+
+# TickLog ring fields, in steer() argument order
+LOG_FIELDS = ('front', 'delta', 'speed', 'duty_mot', 'wheel_a', 'wheel_b',
+              'left', 'right', 'angle', 'duty_srv')
+
+
+class PreallocMamdani:
+    """
+    A Mamdani FIS dict (see fis_io) with min AND, min implication, max
+    aggregation and a sampled centroid - the semantics of fuzzydisttest and
+    fuzzysteertest.MamdaniFIS - evaluated without allocating. Inputs are
+    clipped to their ranges like the controllers' compute().
+    """
+
+    def __init__(self, fis, n_points=OUT_POINTS):
+        self.name = fis['name']
+        self.ranges = [tuple(var['range']) for var in fis['inputs']]
+        self.mfs = [[(MembershipFunction.trapmf if t == 'trapmf' else MembershipFunction.trimf, list(p))
+                     for _, t, p in var['mfs']] for var in fis['inputs']]
+        for var in fis['inputs'] + fis['outputs']:
+            for name, t, _ in var['mfs']:
+                if t not in ('trapmf', 'trimf'):
+                    raise ValueError(f"{self.name}: MF {name!r} is {t}; only trapmf/trimf are preallocated")
+        out = fis['outputs'][0]
+        lo, hi = out['range']
+        self.fallback = (lo + hi) / 2
+        x = np.linspace(lo, hi, n_points)
+        self.out_mf = np.array([[MembershipFunction(name, t, p).compute(v) for v in x]
+                                for name, t, p in out['mfs']])
+        # [x; 1] . aggregated gives the centroid's numerator and denominator in one call
+        self.moments = np.vstack([x, np.ones_like(x)])
+
+        # The loops below run over flat, prebuilt tuples: enumerate(), range()
+        # and nested loops each allocate their iterators on every call.
+        # Per output MF and unbroadcast on purpose: a (n, 1) strength column
+        # broadcast over out_mf makes NumPy allocate an iteration buffer on
+        # every call, a 0-d array against one row does not
+        self._mu = [[0.0] * len(var) for var in self.mfs]
+        self._x = [0.0] * len(self.mfs)
+        self._ranges = [(i, lo, hi) for i, (lo, hi) in enumerate(self.ranges)]
+        self._fuzzify = [(self._mu[i], j, fn, params, i)
+                         for i, mfs in enumerate(self.mfs) for j, (fn, params) in enumerate(mfs)]
+        # a don't-care antecedent (0) leaves its input out of the rule
+        self.rules = [(tuple((self._mu[i], m - 1) for i, m in enumerate(ante) if m != 0),
+                       cons[0] - 1, float(weight))
+                      for ante, cons, weight, _ in fis['rules']]
+        self._strength = [0.0] * len(out['mfs'])
+        self._outputs = [(o, row, np.zeros(())) for o, row in enumerate(self.out_mf)]
+        self._clipped = np.zeros(n_points)
+        self._aggregated = np.zeros(n_points)
+        self._sums = np.zeros(2)
+
+    def evaluate(self, *values):
+        x = self._x
+        for i, lo, hi in self._ranges:
+            v = values[i]
+            x[i] = lo if v < lo else hi if v > hi else v
+        for mu, j, fn, params, i in self._fuzzify:
+            mu[j] = fn(x[i], params)
+
+        # all zero on entry: the output loop resets each entry once it is used
+        strength = self._strength
+        for terms, cons, weight in self.rules:
+            w = 1.0
+            for mu, m in terms:
+                v = mu[m]
+                if v < w:
+                    w = v
+            w *= weight
+            if w > strength[cons]:
+                strength[cons] = w
+
+        aggregated, clipped = self._aggregated, self._clipped
+        aggregated.fill(0.0)
+        for o, row, cut in self._outputs:
+            s = strength[o]
+            if s > 0.0:
+                strength[o] = 0.0
+                cut.fill(s)
+                np.minimum(row, cut, out=clipped)
+                np.maximum(aggregated, clipped, out=aggregated)
+        np.dot(self.moments, aggregated, out=self._sums)
+        den = self._sums.item(1)
+        if den == 0.0:
+            return self.fallback
+        return self._sums.item(0) / den
+
+    def compute(self, *values):
+        return self.evaluate(*values)
+
+
+class TabulatedDistance:
+    """
+    fuzzy_controller_dist.FuzzyForDistance (skfuzzy, distance only) as a
+    table sampled at start-up and interpolated per tick.
+    """
+
+    def __init__(self, controller=None, step=DIST_TABLE_STEP, lo=0.0, hi=80.0):
+        if controller is None:
+            from fuzzy_controller_dist import FuzzyForDistance
+            controller = FuzzyForDistance()
+        n = int(round((hi - lo) / step))
+        self.lo, self.hi = float(lo), float(hi)
+        self.inv_step = n / (hi - lo)
+        self.last = n - 1
+        self.table = [float(controller.compute(lo + k * (hi - lo) / n, 0.0)) for k in range(n + 1)]
+
+    def compute(self, current_dist, delta_dist):
+        x = current_dist
+        x = self.lo if x < self.lo else self.hi if x > self.hi else x
+        pos = (x - self.lo) * self.inv_step
+        i = int(pos)
+        if i > self.last:
+            i = self.last
+        y0 = self.table[i]
+        return y0 + (pos - i) * (self.table[i + 1] - y0)
+
+
+def steady_controllers(controller='mamdani', sugeno_order=1):
+    """(distance, steering) controllers for steady-state mode, same outputs as the regular ones."""
+    from fuzzysteertest import FuzzyForSteering
+    if controller == 'sugeno':
+        # SugenoController.compute already runs on preallocated lists
+        from sugeno import distance_controller, steering_controller
+        return distance_controller(sugeno_order), steering_controller(sugeno_order)
+    return TabulatedDistance(), PreallocMamdani(FuzzyForSteering(cache_size=0).fis.to_fis())
+
+
+class TickLog(threading.Thread):
+    """
+    Writes main_combined.py's per-tick lines from a background thread. The
+    tick stores its values in a preallocated ring slot and queues the slot
+    number; formatting and the console write happen here. Every write to
+    the stream, including write() from other threads, is a single call
+    under one lock, so lines never split into each other.
+    """
+
+    def __init__(self, debug=False, stream=None, slots=RING_SLOTS):
+        super().__init__(daemon=True)
+        self.debug = debug
+        self.stream = stream if stream is not None else sys.stdout
+        self.rows = [[0.0] * len(LOG_FIELDS) for _ in range(slots)]
+        self.slots = slots
+        self.next = 0
+        self.busy = False
+        self.pending = queue.SimpleQueue()
+        self.lock = threading.Lock()
+
+    def steer(self, front, delta, speed, duty_mot, wheel_a, wheel_b, left, right, angle, duty_srv):
+        slot = self.next
+        row = self.rows[slot]
+        row[0] = front
+        row[1] = delta
+        row[2] = speed
+        row[3] = duty_mot
+        row[4] = wheel_a
+        row[5] = wheel_b
+        row[6] = left
+        row[7] = right
+        row[8] = angle
+        row[9] = duty_srv
+        self.next = slot + 1 if slot + 1 < self.slots else 0
+        self.pending.put(slot)
+
+    def format(self, row):
+        front, delta, speed, duty_mot, wheel_a, wheel_b, left, right, angle, duty_srv = row
+        if not self.debug:
+            return f"angle={angle:.1f}°\n"
+        return (f"Front: {front:.1f}cm Δ{delta:.2f}cm → speed={speed:.2f} m/s, duty={duty_mot:.1f}%, "
+                f"wheels A={wheel_a:.2f} B={wheel_b:.2f} m/s\n"
+                f" Left: {left:.1f}cm | Right: {right:.1f}cm → angle={angle:.1f}°, duty={duty_srv:.1f}%\n"
+                f"{SEPARATOR}\n")
+
+    def _write(self, text):
+        with self.lock:
+            try:
+                self.stream.write(text)
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
+
+    def write(self, line, flush=True):
+        """Print one line right away from the calling thread (print-compatible for ActivityDetector's log)."""
+        self._write(line + "\n")
+
+    def run(self):
+        while True:
+            slot = self.pending.get()
+            if slot is None:
+                break
+            self.busy = True
+            self._write(self.format(self.rows[slot]))
+            self.busy = False
+
+    def drain(self, timeout=1.0):
+        """Wait until every queued line is written; False if that takes longer than timeout s."""
+        deadline = time.monotonic() + timeout
+        while not self.pending.empty() or self.busy:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def stop(self, timeout=1.0):
+        self.pending.put(None)
+        self.join(timeout)
@@ -0,0 +1,331 @@
+"""
+Takagi-Sugeno versions of the distance and steering controllers.
+
+The Mamdani controllers defuzzify by sampling the output universe (1000
+points in fuzzydisttest/fuzzysteertest, 141 in skfuzzy) on every call. A
+Sugeno system keeps the same input membership functions and rules but gives
+each rule a crisp consequent,
+
+    order 0:  z_r = c_r
+    order 1:  z_r = p_r . x + c_r
+
+and its output is the firing-strength weighted average sum(w_r z_r) / sum(w_r),
+a few dozen float operations per call with no arrays at all.
+
+fit_sugeno() chooses the consequents so the Sugeno surface matches a Mamdani
+one: it evaluates the Mamdani system on a dense grid over the input ranges
+and solves for the coefficients by least squares (the output is linear in
+them once the normalized firing strengths are known). The error against the
+Mamdani system is then measured on a second grid offset by half a step, so
+it covers points the fit did not see, and kept in SugenoFIS.fit_error.
+
+Fitted systems are FIS dicts with type 'sugeno' and 'constant'/'linear'
+output MFs, one per rule, so fis_io writes them as MATLAB-compatible .fis
+files:
+
+    python sugeno.py --controller steering --order 1 --output fuzzysteer_sugeno.fis
+    python sugeno.py --controller distance --order 0
+"""
+import argparse
+
+import numpy as np
+
+from fuzzy_vec import as_trap, firing_strengths, mamdani_from_fis
+
+# --- Constants -------------------------------------------------------
+GRID_POINTS  = 161      # fit grid per input (0.5 cm steps over 0-80 cm)
+FIT_CHUNK    = 4096     # grid rows per Mamdani evaluation, bounds the fit's memory
+SUGENO_ORDER = 1
+
+
+def _trap(x, a, b, c, d):
+    """Trapezoid with open shoulders, as fuzzy_vec.trap_batch, for one float."""
+    if b > a:
+        up = (x - a) / (b - a)
+    else:
+        up = 1.0 if x >= b else 0.0
+    if d > c:
+        down = (d - x) / (d - c)
+    else:
+        down = 1.0 if x <= c else 0.0
+    m = up if up < down else down
+    return 0.0 if m < 0.0 else 1.0 if m > 1.0 else m
+
+
+class SugenoFIS:
+    """
+    A single-output Sugeno system built from a FIS dict (see fis_io) whose
+    output MFs are 'constant' [c] or 'linear' [p1 .. pn c], rule r using
+    output MF r. evaluate() runs on plain floats and preallocated lists.
+    """
+
+    def __init__(self, fis):
+        out = fis['outputs'][0]
+        self.name = fis['name']
+        self.inputs = fis['inputs']
+        self.output = out
+        self.and_method = fis.get('and_method', 'min')
+        if self.and_method not in ('min', 'prod'):
+            raise ValueError(f"Unknown AND method: {self.and_method}")
+        n_in = len(self.inputs)
+        self.order = 1 if any(t == 'linear' for _, t, _ in out['mfs']) else 0
+
+        self._ranges = [(float(v['range'][0]), float(v['range'][1])) for v in self.inputs]
+        self._traps = [[tuple(float(p) for p in as_trap(t, p)) for _, t, p in v['mfs']]
+                       for v in self.inputs]
+        self._mu = [[0.0] * len(v['mfs']) for v in self.inputs]
+        self._x = [0.0] * n_in
+        self._rules = []
+        for ante, cons, weight, _ in fis['rules']:
+            _, mf_type, params = out['mfs'][cons[0] - 1]
+            if mf_type == 'constant':
+                coef = (0.0,) * n_in + (float(params[0]),)
+            elif mf_type == 'linear' and len(params) == n_in + 1:
+                coef = tuple(float(p) for p in params)
+            else:
+                raise ValueError(f"Unsupported Sugeno output MF: {mf_type} {params}")
+            self._rules.append((tuple(a - 1 for a in ante), float(weight), coef))
+        self._fallback = (float(out['range'][0]) + float(out['range'][1])) / 2
+        self.fit_error = None
+
+    def evaluate(self, input_values):
+        """Crisp output for a list of crisp inputs, clamped to the input ranges."""
+        x = self._x
+        mu = self._mu
+        for i, v in enumerate(input_values):
+            lo, hi = self._ranges[i]
+            v = lo if v < lo else hi if v > hi else float(v)
+            x[i] = v
+            row = mu[i]
+            for j, (a, b, c, d) in enumerate(self._traps[i]):
+                row[j] = _trap(v, a, b, c, d)
+
+        use_min = self.and_method == 'min'
+        num = den = 0.0
+        for ante, weight, coef in self._rules:
+            w = 1.0
+            for k, m in enumerate(ante):
+                if m < 0:
+                    continue
+                u = mu[k][m]
+                if use_min:
+                    if u < w:
+                        w = u
+                else:
+                    w *= u
+            if w == 0.0:
+                continue
+            w *= weight
+            z = coef[-1]
+            for k in range(len(x)):
+                z += coef[k] * x[k]
+            num += w * z
+            den += w
+        if den == 0.0:
+            return self._fallback
+        return num / den
+
+    def evaluate_batch(self, inputs):
+        """Vectorized evaluate over arrays of crisp inputs (offline use)."""
+        return _sugeno_batch(self.to_fis(), inputs)
+
+    def to_fis(self):
+        return {
+            'name': self.name,
+            'type': 'sugeno',
+            'and_method': self.and_method, 'or_method': 'max', 'imp_method': 'prod',
+            'agg_method': 'sum', 'defuzz_method': 'wtaver',
+            'inputs': self.inputs,
+            'outputs': [self.output],
+            'rules': [([m + 1 for m in ante], [r + 1], weight, 1)
+                      for r, (ante, weight, _) in enumerate(self._rules)],
+        }
+
+
+class SugenoController:
+    """
+    Drop-in for the Mamdani controllers: compute() takes the same positional
+    inputs and uses the first len(fis.inputs) of them, so the one-input
+    distance system still accepts (distance, delta).
+    """
+
+    def __init__(self, fis):
+        self.fis = fis
+        self.n_inputs = len(fis.inputs)
+        self._values = [0.0] * self.n_inputs
+
+    def compute(self, *values):
+        buf = self._values
+        for i in range(self.n_inputs):
+            buf[i] = values[i]
+        return self.fis.evaluate(buf)
+
+
+def _rule_arrays(fis):
+    rules = np.array([[a - 1 for a in ante] for ante, _, _, _ in fis['rules']], dtype=int)
+    weights = np.array([w for _, _, w, _ in fis['rules']], dtype=float)
+    in_mfs = [[(t, p) for _, t, p in var['mfs']] for var in fis['inputs']]
+    return rules, weights, in_mfs
+
+
+def _design(fis, inputs, order):
+    """Regression matrix (N, R*(n+1) or R), fallback mask; output is design @ coefficients."""
+    rules, weights, in_mfs = _rule_arrays(fis)
+    w = firing_strengths(inputs, in_mfs, rules, fis.get('and_method', 'min')) * weights
+    total = w.sum(axis=1)
+    fired = total > 0
+    wn = np.zeros_like(w)
+    wn[fired] = w[fired] / total[fired, None]
+    if order == 0:
+        return wn, fired
+    features = np.stack(list(inputs) + [np.ones_like(inputs[0])], axis=1)     # (N, n+1)
+    return (wn[:, :, None] * features[:, None, :]).reshape(len(inputs[0]), -1), fired
+
+
+def _sugeno_batch(fis, inputs):
+    out = fis['outputs'][0]
+    n_in = len(fis['inputs'])
+    ranges = [var['range'] for var in fis['inputs']]
+    x = [np.clip(np.asarray(v, dtype=float), lo, hi) for v, (lo, hi) in zip(inputs, ranges)]
+    coef = []
+    for ante, cons, _, _ in fis['rules']:
+        _, mf_type, params = out['mfs'][cons[0] - 1]
+        coef.append([0.0] * n_in + [params[0]] if mf_type == 'constant' else list(params))
+    design, fired = _design(fis, x, 1)
+    y = design @ np.asarray(coef, dtype=float).ravel()
+    y[~fired] = (out['range'][0] + out['range'][1]) / 2
+    return y
+
+
+def _grid(ranges, points, offset=0.0):
+    """Flattened grid over the ranges; offset (in steps) shifts it, e.g. 0.5 for the midpoints."""
+    axes = []
+    for lo, hi in ranges:
+        step = (hi - lo) / (points - 1)
+        n = points - 1 if offset else points
+        axes.append(lo + (np.arange(n) + offset) * step)
+    mesh = np.meshgrid(*axes, indexing='ij')
+    return [m.ravel() for m in mesh]
+
+
+def _mamdani_target(fis):
+    def target(inputs):
+        n = len(inputs[0])
+        y = np.empty(n)
+        for start in range(0, n, FIT_CHUNK):
+            y[start:start + FIT_CHUNK] = mamdani_from_fis(fis, [x[start:start + FIT_CHUNK] for x in inputs])
+        return y
+    return target
+
+
+def approximation_error(sugeno, target, points=GRID_POINTS):
+    """
+    RMSE and largest absolute difference between a SugenoFIS and a target
+    on the half-step-offset grid, the latter also as a fraction of the
+    output range.
+    """
+    x = _grid(sugeno._ranges, points, offset=0.5)
+    diff = sugeno.evaluate_batch(x) - np.asarray(target(x), dtype=float)
+    lo, hi = sugeno.output['range']
+    max_abs = float(np.max(np.abs(diff)))
+    return {
+        'rmse': float(np.sqrt(np.mean(diff ** 2))),
+        'max_abs': max_abs,
+        'max_rel': max_abs / (hi - lo),
+        'points': len(diff),
+    }
+
+
+def fit_sugeno(fis, order=SUGENO_ORDER, target=None, points=GRID_POINTS, name=None):
+    """
+    Least-squares Sugeno approximation of a Mamdani FIS dict.
+    :param fis: the Mamdani system (inputs, output range, rules are reused)
+    :param order: 0 for constant consequents, 1 for linear
+    :param target: callable(list of input arrays) -> outputs; defaults to
+        the FIS itself via fuzzy_vec. Pass the controller's own compute
+        (e.g. skfuzzy's) to fit what actually runs.
+    :param points: grid points per input
+    :return: SugenoFIS with fit_error filled in
+    """
+    if order not in (0, 1):
+        raise ValueError(f"order must be 0 or 1, got {order}")
+    target = target or _mamdani_target(fis)
+    ranges = [tuple(var['range']) for var in fis['inputs']]
+    x = _grid(ranges, points)
+    y = np.asarray(target(x), dtype=float)
+    design, fired = _design(fis, x, order)
+    coef, *_ = np.linalg.lstsq(design[fired], y[fired], rcond=None)
+
+    coef = coef.reshape(len(fis['rules']), -1)
+    out = fis['outputs'][0]
+    if order == 0:
+        mfs = [(f"r{r + 1}", 'constant', [float(c[0])]) for r, c in enumerate(coef)]
+    else:
+        mfs = [(f"r{r + 1}", 'linear', [float(v) for v in c]) for r, c in enumerate(coef)]
+    sugeno = SugenoFIS({
+        'name': name or f"{fis['name']}_sugeno",
+        'and_method': fis.get('and_method', 'min'),
+        'inputs': [dict(var) for var in fis['inputs']],
+        'outputs': [{'name': out['name'], 'range': tuple(out['range']), 'mfs': mfs}],
+        'rules': [(list(ante), [r + 1], weight, 1)
+                  for r, (ante, _, weight, _) in enumerate(fis['rules'])],
+    })
+    sugeno.fit_error = approximation_error(sugeno, target, points)
+    return sugeno
+
+
+def load_sugeno(path):
+    """SugenoFIS from a .fis file written by this module (or MATLAB)."""
+    from fis_io import read_fis
+    return SugenoFIS(read_fis(path))
+
+
+def distance_controller(order=SUGENO_ORDER, points=GRID_POINTS):
+    """Sugeno fit of fuzzy_controller_dist.FuzzyForDistance, against skfuzzy's own output."""
+    from fuzzy_controller_dist import FuzzyForDistance
+    mamdani = FuzzyForDistance()
+
+    def target(inputs):
+        return [mamdani.compute(float(d), 0.0) for d in inputs[0]]
+    return SugenoController(fit_sugeno(mamdani.to_fis(), order, target, points))
+
+
+def steering_controller(order=SUGENO_ORDER, points=GRID_POINTS):
+    """Sugeno fit of fuzzysteertest.FuzzyForSteering."""
+    from fuzzysteertest import FuzzyForSteering
+    return SugenoController(fit_sugeno(FuzzyForSteering(cache_size=0).fis.to_fis(), order, points=points))
+
+
+def format_error(fis):
+    e = fis.fit_error
+    return (f"{fis.name}: order {fis.order}, RMSE {e['rmse']:.4g}, max {e['max_abs']:.4g} "
+            f"({100 * e['max_rel']:.2f}% of range) over {e['points']} points")
+
+
+def main():
+    from fis_io import read_fis, write_fis
+    parser = argparse.ArgumentParser(description='Fit a Sugeno system to a Mamdani controller')
+    parser.add_argument('--controller', choices=('distance', 'steering'),
+                        help='on-robot controller to approximate')
+    parser.add_argument('--fis', help='or a Mamdani .fis file (evaluated with fuzzy_vec)')
+    parser.add_argument('--order', type=int, choices=(0, 1), default=SUGENO_ORDER)
+    parser.add_argument('--points', type=int, default=GRID_POINTS, help='grid points per input')
+    parser.add_argument('--output', help='write the fitted system as a .fis file')
+    args = parser.parse_args()
+
+    if args.fis:
+        fis = fit_sugeno(read_fis(args.fis), args.order, points=args.points)
+    elif args.controller == 'distance':
+        fis = distance_controller(args.order, args.points).fis
+    elif args.controller == 'steering':
+        fis = steering_controller(args.order, args.points).fis
+    else:
+        parser.error('give --controller or --fis')
+    print(format_error(fis))
+    if args.output:
+        write_fis(args.output, fis.to_fis())
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
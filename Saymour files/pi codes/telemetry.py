@@ -0,0 +1,260 @@
+"""
+In-process metrics with Prometheus text export.
+
+Counters, gauges and histograms are plain Python objects updated on the hot
+path with a few arithmetic operations and no string formatting; text is only
+produced when an exporter renders the registry.
+
+  * child processes (main_combined.py, yolo_detect.py) run a FileExporter
+    that rewrites METRICS_DIR/<process>.prom every EXPORT_INTERVAL seconds
+    (the node_exporter textfile format)
+  * the supervisor (run_all_final.py) runs a MetricsServer that serves its
+    own registry plus every .prom file in METRICS_DIR on
+    http://<pi>:METRICS_PORT/metrics
+
+Metric names carry the process prefix (saymour_ctrl_, saymour_yolo_,
+saymour_esp_) so the combined page never repeats a family.
+
+Console output is cut down unless SAYMOUR_DEBUG=1; callers guard their
+per-tick prints with `if DEBUG:` so disabled lines are never formatted.
+"""
+import glob
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Constants -------------------------------------------------------
+METRICS_DIR     = os.environ.get('SAYMOUR_METRICS_DIR', '/tmp/saymour_metrics')
+METRICS_PORT    = int(os.environ.get('SAYMOUR_METRICS_PORT', '9108'))
+EXPORT_INTERVAL = 5.0     # seconds between file exports
+DEBUG           = os.environ.get('SAYMOUR_DEBUG', '0') not in ('', '0')
+
+# latency buckets in seconds, 0.5 ms to 2.5 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _label_text(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _num(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)    # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        running = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            running += count
+            yield self.name + '_bucket', self.labels + (('le', _num(bound)),), running
+        yield self.name + '_sum', self.labels, self.sum
+        yield self.name + '_count', self.labels, running
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(name, help, key[1], **kwargs)
+        return metric
+
+    def counter(self, name, help='', labels=None):
+        """Get or create a counter; call once and keep the object for hot paths."""
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help='', labels=None):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help='', labels=None, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        """Prometheus text exposition of every metric in the registry."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = {}
+        for m in metrics:
+            families.setdefault(m.name, []).append(m)
+        lines = []
+        for name, members in families.items():
+            lines.append(f'# HELP {name} {members[0].help}')
+            lines.append(f'# TYPE {name} {members[0].kind}')
+            for m in members:
+                for sample, labels, value in m.samples():
+                    lines.append(f'{sample}{_label_text(labels)} {_num(value)}')
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+class FileExporter(threading.Thread):
+    """Rewrites a .prom file with the registry's contents every `interval` seconds."""
+
+    def __init__(self, path, registry=REGISTRY, interval=EXPORT_INTERVAL):
+        super().__init__(daemon=True)
+        self.path = path
+        self.registry = registry
+        self.interval = interval
+        self._halt = threading.Event()
+
+    def export(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.registry.render())
+        os.replace(tmp, self.path)      # readers never see a half-written file
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            try:
+                self.export()
+            except OSError:
+                pass
+
+    def stop(self):
+        """Stop exporting and remove the file, so the supervisor stops serving stale values."""
+        self._halt.set()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def start_file_exporter(process, registry=REGISTRY, metrics_dir=METRICS_DIR):
+    """Start exporting this process's metrics to METRICS_DIR/<process>.prom."""
+    os.makedirs(metrics_dir, exist_ok=True)
+    exporter = FileExporter(os.path.join(metrics_dir, f'{process}.prom'), registry)
+    exporter.start()
+    return exporter
+
+
+class MetricsServer:
+    """Serves /metrics: the local registry followed by the children's .prom files."""
+
+    def __init__(self, port=METRICS_PORT, registry=REGISTRY, metrics_dir=METRICS_DIR):
+        self.registry = registry
+        self.metrics_dir = metrics_dir
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = server.collect().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('', port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def collect(self):
+        parts = [self.registry.render()]
+        for path in sorted(glob.glob(os.path.join(self.metrics_dir, '*.prom'))):
+            try:
+                with open(path) as f:
+                    parts.append(f.read())
+            except OSError:
+                pass
+        return ''.join(parts)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class Stopwatch:
+    """t = Stopwatch(); ...; hist.observe(t.lap()) - seconds since the previous lap."""
+
+    __slots__ = ('last',)
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def lap(self):
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.last = now
+        return elapsed
@@ -0,0 +1,168 @@
+"""
+End-to-end latency tracing across the Saymour processes.
+
+With SAYMOUR_TRACE=1 every line a child prints for the ESP32 carries a
+trace context after a separator:
+
+    DETECT:Car |T| detect 1042 sensor=812345000 capture=812371000 convert=812374000 infer=812429000 emit=812431000
+    angle=-12.5° |T| steer 388 front=...  sides=... fuzzy=... pwm=... emit=...
+
+i.e. a path, an id (the frame or control tick number) and the
+time.monotonic_ns() at which the work reached each hop. Picamera2's
+SensorTimestamp (start of exposure, CLOCK_BOOTTIME) is converted to the same
+clock, so the first detection hop is the exposure itself. The clock is
+shared by every process on the Pi, so the supervisor can extend the
+trace it reads from a child:
+
+    read  - monitor_yolo / monitor_ctrl got the line off the pipe
+    send  - the line was handed to the kernel for the ESP32
+    ack   - the ESP32 acknowledged it (framed links only, see esp_link.py)
+
+Lines are stripped of the context before they reach the ESP32. A finished
+trace is recorded as per-hop latencies (time from the previous hop),
+exported as saymour_trace_hop_seconds{path,hop} and
+saymour_trace_seconds{path} and kept in a short window for a p50/p95
+breakdown (STATS.report()).
+
+Detection hops: sensor, capture, bus (frame bus sources), convert, infer,
+emit, read, send, ack. Control hops: front, sides, fuzzy, pwm, emit,
+read, send, ack.
+"""
+import collections
+import os
+import threading
+import time
+
+from telemetry import LATENCY_BUCKETS, histogram
+
+# --- Constants -------------------------------------------------------
+TRACE         = os.environ.get('SAYMOUR_TRACE', '0') not in ('', '0')
+SEPARATOR     = ' |T| '
+TRACE_WINDOW  = 1000        # recent traces kept per hop for the breakdown
+SENSOR_MAX_AGE_NS = 1_000_000_000   # a sensor timestamp older than this is not trusted
+
+# sub-millisecond hops (pipe, sendall) need finer buckets than the defaults
+TRACE_BUCKETS = (0.00005, 0.0001, 0.00025) + LATENCY_BUCKETS
+
+
+class Trace:
+    __slots__ = ('path', 'id', 'hops')
+
+    def __init__(self, path, trace_id, hops=None):
+        self.path = path
+        self.id = trace_id
+        self.hops = hops if hops is not None else []     # [(hop, t_ns), ...] in order
+
+    def mark(self, hop, t_ns=None):
+        self.hops.append((hop, time.monotonic_ns() if t_ns is None else t_ns))
+        return self
+
+    def fork(self, hop=None):
+        """A copy for one of several lines from the same frame, optionally marked."""
+        copy = Trace(self.path, self.id, list(self.hops))
+        return copy.mark(hop) if hop is not None else copy
+
+    def attach(self, line):
+        return line + SEPARATOR + self.encode()
+
+    def encode(self):
+        return f"{self.path} {self.id} " + ' '.join(f"{hop}={t}" for hop, t in self.hops)
+
+    @classmethod
+    def decode(cls, text):
+        parts = text.split()
+        if len(parts) < 2:
+            return None
+        hops = []
+        for part in parts[2:]:
+            hop, _, t = part.partition('=')
+            try:
+                hops.append((hop, int(t)))
+            except ValueError:
+                return None
+        return cls(parts[0], parts[1], hops)
+
+
+def split_trace(line):
+    """(line without the trace context, Trace or None). A trailing newline is kept."""
+    payload, sep, context = line.partition(SEPARATOR)
+    if not sep:
+        return line, None
+    if line.endswith('\n'):
+        payload += '\n'
+    return payload, Trace.decode(context)
+
+
+def sensor_to_monotonic(sensor_ns, now_ns=None):
+    """
+    Picamera2 SensorTimestamp (CLOCK_BOOTTIME) on the monotonic clock, or
+    None when it is missing or implausible.
+    """
+    if not sensor_ns:
+        return None
+    now_ns = time.monotonic_ns() if now_ns is None else now_ns
+    offset = time.clock_gettime_ns(time.CLOCK_BOOTTIME) - time.monotonic_ns()
+    t = sensor_ns - offset
+    return t if 0 <= now_ns - t < SENSOR_MAX_AGE_NS else None
+
+
+class TraceStats:
+    """Recent per-hop latencies by path, for the console breakdown."""
+
+    def __init__(self, window=TRACE_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.hops = {}          # path -> {hop: deque of ns}, hops in first-seen order
+        self.counts = collections.Counter()
+        self.metrics = {}
+
+    def _metric(self, path, hop):
+        key = (path, hop)
+        metric = self.metrics.get(key)
+        if metric is None:
+            if hop is None:
+                metric = histogram('saymour_trace_seconds', 'First to last hop of a trace',
+                                   {'path': path}, buckets=TRACE_BUCKETS)
+            else:
+                metric = histogram('saymour_trace_hop_seconds', 'Time from the previous hop to this one',
+                                   {'path': path, 'hop': hop}, buckets=TRACE_BUCKETS)
+            self.metrics[key] = metric
+        return metric
+
+    def record(self, trace):
+        hops = trace.hops
+        if len(hops) < 2:
+            return
+        with self.lock:
+            by_hop = self.hops.setdefault(trace.path, {})
+            for (_, t0), (hop, t1) in zip(hops, hops[1:]):
+                dt = t1 - t0
+                self._metric(trace.path, hop).observe(dt / 1e9)
+                by_hop.setdefault(hop, collections.deque(maxlen=self.window)).append(dt)
+            total = hops[-1][1] - hops[0][1]
+            self._metric(trace.path, None).observe(total / 1e9)
+            by_hop.setdefault('total', collections.deque(maxlen=self.window)).append(total)
+            self.counts[trace.path] += 1
+
+    def report(self):
+        """Per-path, per-hop p50/p95/max in ms over the recent window, as printable lines."""
+        lines = []
+        with self.lock:
+            snapshot = {path: {hop: sorted(v) for hop, v in by_hop.items()}
+                        for path, by_hop in self.hops.items()}
+            counts = dict(self.counts)
+        for path, by_hop in snapshot.items():
+            lines.append(f"trace {path}: {counts.get(path, 0)} traces")
+            total = by_hop.pop('total', None)
+            for hop, values in list(by_hop.items()) + [('total', total)]:
+                if not values:
+                    continue
+                p50 = values[len(values) // 2] / 1e6
+                p95 = values[min(len(values) - 1, int(0.95 * len(values)))] / 1e6
+                lines.append(f"  {hop:8s} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  "
+                             f"max {values[-1] / 1e6:8.2f} ms  (n={len(values)})")
+        return lines
+
+
+STATS = TraceStats()
+record = STATS.record
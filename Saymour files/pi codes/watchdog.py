@@ -0,0 +1,147 @@
+"""
+Emergency stop path for main_combined.py that does not depend on the
+control loop getting round to it.
+
+A Watchdog thread runs under SCHED_FIFO, ahead of the loop (which runs
+under the normal scheduler, see resource_plan.py), and watches two
+timestamps:
+
+  * the heartbeat, kicked once per completed control tick
+  * the last valid front echo, updated by the loop's sensor read
+
+If either is older than its deadline the thread calls stop_outputs(), which
+zeroes the motor PWM and drops the L298N direction pins, and keeps the
+watchdog tripped until both are fresh again. check_front() is the
+obstacle-too-close override: the loop feeds it the raw front range, before
+fusion can replace it with the person's range, and it cuts the motors on
+the spot, releasing with hysteresis.
+
+While main_combined.py's idle mode holds the outputs off it ticks slowly;
+relax() lengthens the heartbeat deadline and suspends the sensor check for
+that time only (a missed echo at the idle rate is not worth a trip with the
+outputs already off), and restore() puts the driving deadlines back, with
+both timestamps fresh, before the outputs are written again.
+
+A stall inside C code that holds the GIL would also stop this thread; that
+case is covered by run_all_final.py, which kills the control process after
+a timeout and forces the motor pins low itself.
+"""
+import os
+import sys
+import threading
+import time
+
+from telemetry import counter, histogram
+
+# --- Constants -------------------------------------------------------
+HEARTBEAT_DEADLINE = 0.6    # s without a completed tick (a tick is ~0.27 s with three sonar reads)
+SENSOR_DEADLINE    = 1.0    # s without a valid front echo
+STOP_DISTANCE_CM   = 15.0   # raw front range that cuts the motors
+RESUME_DISTANCE_CM = 20.0   # raw front range that releases the override
+CHECK_PERIOD       = 0.01   # s between watchdog checks
+WATCHDOG_PRIORITY  = 60     # SCHED_FIFO; the control loop itself is SCHED_OTHER (resource_plan.py)
+
+M_TRIPS = {reason: counter('saymour_ctrl_watchdog_trips_total', 'Motor cut-offs by cause', {'reason': reason})
+           for reason in ('heartbeat', 'sensor', 'front')}
+M_TRIP_DELAY = histogram('saymour_ctrl_watchdog_trip_delay_seconds',
+                         'Time from a deadline expiring to the motors being cut')
+
+
+class Watchdog(threading.Thread):
+    def __init__(self, stop_outputs, heartbeat_deadline=HEARTBEAT_DEADLINE,
+                 sensor_deadline=SENSOR_DEADLINE, period=CHECK_PERIOD, log=print):
+        """
+        :param stop_outputs: callable that cuts the motors; called from this
+            thread and from check_front(), so it must be safe to call at any time
+        """
+        super().__init__(daemon=True)
+        self.stop_outputs = stop_outputs
+        self.heartbeat_deadline = heartbeat_deadline
+        self.sensor_deadline = sensor_deadline
+        self.normal_deadlines = (heartbeat_deadline, sensor_deadline)
+        self.period = period
+        self.log = log
+        now = time.monotonic()
+        self.last_kick = now
+        self.last_sensor = now
+        self.stale = None               # 'heartbeat' or 'sensor' while tripped by a deadline
+        self.front_override = False
+        self._halt = threading.Event()
+
+    @property
+    def tripped(self):
+        """True while the motors must stay off."""
+        return self.stale is not None or self.front_override
+
+    def kick(self):
+        """Heartbeat; call once per completed control tick."""
+        self.last_kick = time.monotonic()
+
+    def sensor_update(self):
+        """Call on every valid front echo."""
+        self.last_sensor = time.monotonic()
+
+    def relax(self, heartbeat_deadline, sensor_deadline=None):
+        """
+        Longer deadlines, only while the loop keeps the outputs off (idle mode).
+        A sensor_deadline of None suspends the sensor check.
+        """
+        self.kick()
+        self.heartbeat_deadline = heartbeat_deadline
+        self.sensor_deadline = sensor_deadline
+
+    def restore(self):
+        """The driving deadlines again; call before the outputs are next written."""
+        # the last idle kick and echo may be older than the driving deadlines;
+        # a trip left over from idle would hold the first active tick
+        now = time.monotonic()
+        self.last_kick = now
+        self.last_sensor = now
+        self.heartbeat_deadline, self.sensor_deadline = self.normal_deadlines
+        if self.stale is not None:
+            self.log(f"✅ Watchdog: {self.stale} trip cleared on wake")
+            self.stale = None
+
+    def check_front(self, raw_cm):
+        """Obstacle-too-close override on the raw front range. Returns True while it holds."""
+        if not self.front_override and raw_cm < STOP_DISTANCE_CM:
+            self.front_override = True
+            self.stop_outputs()
+            M_TRIPS['front'].inc()
+            self.log(f"🛑 Watchdog: obstacle at {raw_cm:.1f} cm, motors cut")
+        elif self.front_override and raw_cm > RESUME_DISTANCE_CM:
+            self.front_override = False
+            self.log(f"✅ Watchdog: front clear at {raw_cm:.1f} cm")
+        return self.front_override
+
+    def _raise_priority(self):
+        # pid 0 is the calling thread on Linux, so only this thread is promoted
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(WATCHDOG_PRIORITY))
+        except (AttributeError, PermissionError, OSError) as e:
+            sys.stderr.write(f"watchdog: SCHED_FIFO unavailable ({e}), running at normal priority\n")
+
+    def run(self):
+        self._raise_priority()
+        while not self._halt.wait(self.period):
+            now = time.monotonic()
+            if now > self.last_kick + self.heartbeat_deadline:
+                reason, last, deadline = 'heartbeat', self.last_kick, self.heartbeat_deadline
+            elif self.sensor_deadline is not None and now > self.last_sensor + self.sensor_deadline:
+                reason, last, deadline = 'sensor', self.last_sensor, self.sensor_deadline
+            else:
+                if self.stale is not None:
+                    self.log(f"✅ Watchdog: {self.stale} back, motors released")
+                    self.stale = None
+                continue
+            if self.stale is None:
+                self.stale = reason
+                self.stop_outputs()
+                M_TRIP_DELAY.observe(time.monotonic() - (last + deadline))
+                M_TRIPS[reason].inc()
+                self.log(f"🛑 Watchdog: no {reason} for {now - last:.2f} s, motors cut")
+
+    def stop(self):
+        self._halt.set()
+        if self.is_alive():
+            self.join(timeout=1.0)
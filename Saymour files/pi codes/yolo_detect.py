@@ -1,204 +1,511 @@
 import sys
-print(f"=== DEBUG: yolo_detect running under {sys.executable} ({sys.version.splitlines()[0]}) ===")
-try:
-    import cv2
-    print(f"=== DEBUG: Imported cv2 v{cv2.__version__} from {cv2.__file__} ===", flush=True)
-except Exception as e:
-    print("=== DEBUG: Failed to import cv2:", e, flush=True)
-    sys.exit(1)
-
 import os
 import argparse
 import glob
 import time
 import numpy as np
-from ultralytics import YOLO
-
-# Define and parse user input arguments
-parser = argparse.ArgumentParser()
-parser.add_argument('--model', help='Path to YOLO model file (example: "runs/detect/train/weights/best.pt")',
-                    required=True)
-parser.add_argument('--source', help='Image source, can be image file ("test.jpg"), \
-                    image folder ("test_dir"), video file ("testvid.mp4"), or index of USB camera ("usb0")',
-                    required=True)
-parser.add_argument('--thresh', help='Minimum confidence threshold for displaying detected objects (example: "0.4")',
-                    default=0.5)
-parser.add_argument('--resolution', help='Resolution in WxH to display inference results at (example: "640x480"), \
-                    otherwise, match source resolution',
-                    default=None)
-parser.add_argument('--record', help='Record results from video or webcam and save it as "demo1.avi". Must specify --resolution argument to record.',
-                    action='store_true')
-args = parser.parse_args()
-
-# Parse user inputs
-model_path = args.model
-img_source = args.source
-min_thresh = float(args.thresh)
-user_res = args.resolution
-record = args.record
-
-# Check if model file exists and is valid
-if not os.path.exists(model_path):
-    print('ERROR: Model path is invalid or model was not found. Make sure the model filename was entered correctly.')
-    sys.exit(0)
-
-# Load the model into memory and get labemap
-model = YOLO(model_path, task='detect')
-labels = model.names
-
-# Determine source type
+import cv2
+
+from fusion import TargetWriter, CameraIntrinsics, pick_target, estimate_from_box
+from resource_plan import thread_budget, set_library_threads, set_ncnn_threads
+from frame_bus import FrameBusReader
+from hazards import CLASS_THRESHOLDS, HAZARD_CLASSES, HazardGate, format_hazard
+from governor import QualityGovernor, default_points, TARGET_FPS, TEMP_LIMIT_C
+from cue_planner import CuePlanner
+from telemetry import DEBUG, counter, gauge, histogram, start_file_exporter
+from tracing import TRACE, Trace, sensor_to_monotonic
+from activity import (ActivityBoard, ActivityDetector, EnergyMeter, FrameMotion,
+                      IDLE_AFTER, IDLE_FRAME_INTERVAL, IDLE_INFER_INTERVAL)
+import profiler
+
+# Image and video file extensions understood by the folder/file sources
 img_ext_list = ['.jpg','.JPG','.jpeg','.JPEG','.png','.PNG','.bmp','.BMP']
 vid_ext_list = ['.avi','.mov','.mp4','.mkv','.wmv']
 
-if os.path.isdir(img_source):
-    source_type = 'folder'
-elif os.path.isfile(img_source):
-    _, ext = os.path.splitext(img_source)
-    if ext in img_ext_list:
-        source_type = 'image'
-    elif ext in vid_ext_list:
-        source_type = 'video'
-    else:
-        print(f'File extension {ext} is not supported.')
-        sys.exit(0)
-elif 'usb' in img_source:
-    source_type = 'usb'
-    usb_idx = int(img_source[3:])
-elif 'picamera' in img_source:
-    source_type = 'picamera'
-    picam_idx = int(img_source[8:])
-else:
-    print(f'Input {img_source} is invalid. Please try again.')
-    sys.exit(0)
-
-# Parse display resolution
-resize = False
-if user_res:
-    resize = True
-    resW, resH = map(int, user_res.split('x'))
-
-# Recording setup
-if record:
-    if source_type not in ['video','usb']:
-        print('Recording only works for video and camera sources. Please try again.')
-        sys.exit(0)
-    if not user_res:
-        print('Please specify resolution to record video at.')
-        sys.exit(0)
-    record_name = 'demo1.avi'
-    record_fps = 30
-    recorder = cv2.VideoWriter(record_name, cv2.VideoWriter_fourcc(*'MJPG'), record_fps, (resW,resH))
-
-# Initialize image source
-if source_type == 'image':
-    imgs_list = [img_source]
-elif source_type == 'folder':
-    imgs_list = [f for f in glob.glob(img_source + '/*') if os.path.splitext(f)[1] in img_ext_list]
-elif source_type in ['video', 'usb']:
-    cap_arg = usb_idx if source_type == 'usb' else img_source
-    cap = cv2.VideoCapture(cap_arg)
-    if user_res:
-        cap.set(3, resW)
-        cap.set(4, resH)
-elif source_type == 'picamera':
-    from picamera2 import Picamera2
-    cap = Picamera2()
-    cap.configure(cap.create_video_configuration(main={"format": 'XRGB8888', "size": (resW, resH)}))
-    cap.start()
+# Metrics (see telemetry.py)
+M_INFER      = histogram('saymour_yolo_inference_seconds', 'Model call time')
+M_FRAME      = histogram('saymour_yolo_frame_seconds', 'Whole pipeline time per frame')
+M_FRAMES     = counter('saymour_yolo_frames_total', 'Frames read from the source')
+M_INFERENCES = counter('saymour_yolo_inferences_total', 'Frames run through the model')
+M_FPS        = gauge('saymour_yolo_fps', 'Average pipeline frame rate')
 
 # Colors for bounding boxes
 bbox_colors = [(164,120,87), (68,148,228), (93,97,209), (178,182,133), (88,159,106),
                (96,202,231), (159,124,168), (169,162,241), (98,118,150), (172,176,184)]
 
-# Loop variables
-avg_frame_rate = 0
-frame_rate_buffer = []
-fps_avg_len = 200
-img_count = 0
 
-# Inference loop
-while True:
-    t_start = time.perf_counter()
+def parse_args(argv=None):
+    # Define and parse user input arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', help='Path to YOLO model file (example: "runs/detect/train/weights/best.pt")',
+                        required=True)
+    parser.add_argument('--source', help='Image source, can be image file ("test.jpg"), \
+                        image folder ("test_dir"), video file ("testvid.mp4"), index of USB camera ("usb0"), \
+                        or a frame bus fed by frame_bus.py ("bus:saymour_frames")',
+                        required=True)
+    parser.add_argument('--thresh', help='Minimum confidence threshold for displaying detected objects (example: "0.4")',
+                        default=0.5)
+    parser.add_argument('--resolution', help='Resolution in WxH to display inference results at (example: "640x480"), \
+                        otherwise, match source resolution',
+                        default=None)
+    parser.add_argument('--record', help='Record results from video or webcam and save it as "demo1.avi". Must specify --resolution argument to record.',
+                        action='store_true')
+    parser.add_argument('--threads', help='Thread budget for OpenCV/NCNN/torch (default: set by the supervisor, else all cores)',
+                        type=int, default=thread_budget())
+    parser.add_argument('--share-target', help='Publish the followed person\'s bearing/range to shared memory for main_combined.py',
+                        action='store_true')
+    parser.add_argument('--governor', help='Adapt input size, frame skip, threads and model to hold --target-fps and --temp-limit',
+                        action='store_true')
+    parser.add_argument('--target-fps', help='Detection rate the governor tries to hold',
+                        type=float, default=TARGET_FPS)
+    parser.add_argument('--temp-limit', help='SoC temperature (°C) at which the governor steps quality down',
+                        type=float, default=TEMP_LIMIT_C)
+    parser.add_argument('--lite-model', help='Smaller model the governor switches to at its lowest operating points',
+                        default=None)
+    parser.add_argument('--governor-log', help='Append governor decisions as CSV to this file',
+                        default=None)
+    parser.add_argument('--offline', help='Headless batch run over an image folder or video with a process pool; writes detections to --output (see batch_infer.py)',
+                        action='store_true')
+    parser.add_argument('--output', help='Results file for --offline', default='detections.npz')
+    parser.add_argument('--workers', help='Worker processes for --offline (default: one per core)',
+                        type=int, default=None)
+    parser.add_argument('--cues', help='Print one rate-limited CUE line for the most urgent object instead of a DETECT line per detection',
+                        action='store_true')
+    parser.add_argument('--sources', help='Several cameras through one model, as name=source pairs (example: "front=picamera0,down=picamera1"); lines are tagged with the source name (see multi_detect.py)',
+                        default=None)
+    parser.add_argument('--idle', help='Go to idle mode (sparse frames and inference) when neither the camera nor the control loop sees motion (see activity.py)',
+                        action='store_true')
+    parser.add_argument('--idle-after', help='Seconds without motion before idle mode',
+                        type=float, default=IDLE_AFTER)
+    parser.add_argument('--idle-frame-interval', help='Seconds between frames in idle mode',
+                        type=float, default=IDLE_FRAME_INTERVAL)
+    parser.add_argument('--idle-infer-interval', help='Seconds between inferences in idle mode',
+                        type=float, default=IDLE_INFER_INTERVAL)
+    profiler.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def detect_source_type(img_source):
+    """
+    Work out what kind of source was passed on the command line.
+    Returns (source_type, index) where index is the camera number for
+    usb/picamera sources, the bus name for bus sources and None otherwise.
+    """
+    if img_source.startswith('bus:'):
+        return 'bus', img_source[4:]
+    elif os.path.isdir(img_source):
+        return 'folder', None
+    elif os.path.isfile(img_source):
+        _, ext = os.path.splitext(img_source)
+        if ext in img_ext_list:
+            return 'image', None
+        elif ext in vid_ext_list:
+            return 'video', None
+        else:
+            print(f'File extension {ext} is not supported.')
+            sys.exit(0)
+    elif 'usb' in img_source:
+        return 'usb', int(img_source[3:])
+    elif 'picamera' in img_source:
+        return 'picamera', int(img_source[8:])
+    else:
+        print(f'Input {img_source} is invalid. Please try again.')
+        sys.exit(0)
+
+
+def list_images(folder):
+    return [f for f in glob.glob(folder + '/*') if os.path.splitext(f)[1] in img_ext_list]
+
+
+def preprocess_frame(frame, source_type, resize_to=None):
+    """
+    Bring a raw frame into BGR at the display resolution.
+    :param frame: image as returned by the source (BGRA for picamera, BGR otherwise)
+    :param resize_to: (width, height) or None to keep the source resolution
+    """
+    if source_type == 'picamera':
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+    if resize_to is not None:
+        frame = cv2.resize(frame, resize_to)
+    return frame
+
+
+def extract_detections(result):
+    """
+    Pull the boxes out of an Ultralytics result as plain NumPy arrays.
+    :return: (xyxy int array Nx4, confidences N, class indices N)
+    """
+    boxes = result.boxes
+    xyxy = boxes.xyxy.cpu().numpy().astype(int).reshape(-1, 4)
+    conf = boxes.conf.cpu().numpy().reshape(-1)
+    cls = boxes.cls.cpu().numpy().astype(int).reshape(-1)
+    return xyxy, conf, cls
+
+
+def filter_detections(xyxy, conf, cls, labels, min_thresh, class_thresh=None):
+    """
+    Keep the detections above the confidence threshold.
+    :param class_thresh: optional {classname: threshold} overriding min_thresh per class
+    :return: list of (classname, classidx, conf, (xmin, ymin, xmax, ymax))
+    """
+    if class_thresh:
+        thresh = np.array([class_thresh.get(labels[int(c)], min_thresh) for c in cls])
+    else:
+        thresh = min_thresh
+    kept = []
+    for i in np.flatnonzero(conf > thresh):
+        classidx = int(cls[i])
+        xmin, ymin, xmax, ymax = (int(v) for v in xyxy[i])
+        kept.append((labels[classidx], classidx, float(conf[i]), (xmin, ymin, xmax, ymax)))
+    return kept
+
+
+def detection_counters(labels):
+    """Per-class detection counters for a model's class names, looked up once per model."""
+    names = labels.values() if isinstance(labels, dict) else labels
+    return {name: counter('saymour_yolo_detections_total', 'Detections above the threshold', {'class': name})
+            for name in names}
+
+
+def draw_detections(frame, detections):
+    for classname, classidx, conf, (xmin, ymin, xmax, ymax) in detections:
+        color = bbox_colors[classidx % len(bbox_colors)]
+        cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), color, 2)
+        label = f"{classname}: {int(conf*100)}%"
+        labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        label_ymin = max(ymin, labelSize[1] + 10)
+        cv2.rectangle(frame, (xmin, label_ymin - labelSize[1] - 10),
+                      (xmin + labelSize[0], label_ymin + baseLine - 10), color, cv2.FILLED)
+        cv2.putText(frame, label, (xmin, label_ymin - 7), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 1)
+
+
+def emit(line, trace=None):
+    """Print a line for the supervisor, with the frame's trace context when tracing."""
+    if trace is not None:
+        line = trace.fork('emit').attach(line)
+    print(line, flush=True)
+
+
+def main(argv=None):
+    if DEBUG:
+        print(f"=== DEBUG: yolo_detect running under {sys.executable} ({sys.version.splitlines()[0]}) ===")
+        print(f"=== DEBUG: Imported cv2 v{cv2.__version__} from {cv2.__file__} ===", flush=True)
+
+    args = parse_args(argv)
+
+    if args.offline:
+        from batch_infer import run_offline
+        try:
+            run_offline(args.model, args.source, args.output, args.workers,
+                        thresh=float(args.thresh), class_thresh=CLASS_THRESHOLDS)
+        except ValueError as e:
+            print(f'ERROR: {e}')
+            sys.exit(1)
+        return
+
+    if args.sources:
+        from multi_detect import parse_sources, run_multi
+        try:
+            sources = parse_sources(args.sources)
+        except ValueError as e:
+            print(f'ERROR: --sources: {e}')
+            sys.exit(1)
+        run_multi(args.model, sources, args.resolution, float(args.thresh), args.threads,
+                  share_target=args.share_target, cues=args.cues, prof_args=args)
+        return
 
-    # Read frame
-    if source_type in ['image', 'folder']:
-        if img_count >= len(imgs_list):
-            print('All images have been processed. Exiting program.')
+    from ultralytics import YOLO
+
+    # Parse user inputs
+    model_path = args.model
+    img_source = args.source
+    min_thresh = float(args.thresh)
+    user_res = args.resolution
+    record = args.record
+
+    # Check if model file exists and is valid
+    if not os.path.exists(model_path):
+        print('ERROR: Model path is invalid or model was not found. Make sure the model filename was entered correctly.')
+        sys.exit(0)
+
+    # Cap library thread pools before the model spins them up
+    if args.threads:
+        set_library_threads(args.threads)
+
+    # Load the model into memory and get labemap
+    model = YOLO(model_path, task='detect')
+    labels = model.names
+    m_detections = detection_counters(labels)
+    models = {None: model}
+
+    # Quality governor
+    governor = None
+    imgsz = None
+    if args.governor:
+        governor = QualityGovernor(default_points(args.threads, args.lite_model),
+                                   target_fps=args.target_fps, temp_limit=args.temp_limit,
+                                   temp_resume=args.temp_limit - 7.0, log_file=args.governor_log)
+
+    # Determine source type
+    source_type, cam_idx = detect_source_type(img_source)
+
+    # Parse display resolution
+    resize_to = None
+    if user_res:
+        resW, resH = map(int, user_res.split('x'))
+        resize_to = (resW, resH)
+
+    # Recording setup
+    if record:
+        if source_type not in ['video','usb','bus']:
+            print('Recording only works for video and camera sources. Please try again.')
             sys.exit(0)
-        frame = cv2.imread(imgs_list[img_count])
-        img_count += 1
+        if not user_res:
+            print('Please specify resolution to record video at.')
+            sys.exit(0)
+        record_name = 'demo1.avi'
+        record_fps = 30
+        recorder = cv2.VideoWriter(record_name, cv2.VideoWriter_fourcc(*'MJPG'), record_fps, (resW,resH))
+
+    # Initialize image source
+    if source_type == 'image':
+        imgs_list = [img_source]
+    elif source_type == 'folder':
+        imgs_list = list_images(img_source)
     elif source_type in ['video', 'usb']:
-        ret, frame = cap.read()
-        if not ret or frame is None:
-            print('Stream ended or camera error. Exiting program.')
+        cap_arg = cam_idx if source_type == 'usb' else img_source
+        cap = cv2.VideoCapture(cap_arg)
+        if user_res:
+            cap.set(3, resW)
+            cap.set(4, resH)
+    elif source_type == 'picamera':
+        from picamera2 import Picamera2
+        cap = Picamera2()
+        cap.configure(cap.create_video_configuration(main={"format": 'XRGB8888', "size": (resW, resH)}))
+        cap.start()
+    elif source_type == 'bus':
+        # frames arrive already in BGR at the capture resolution
+        cap = FrameBusReader(cam_idx)
+        bus_frame_no = -1
+
+    exporter = start_file_exporter('yolo')
+
+    # Person estimate shared with the control loop
+    target_writer = TargetWriter() if args.share_target else None
+    intr = None
+    target_bearing = None
+
+    # Loop variables
+    avg_frame_rate = 0
+    frame_rate_buffer = []
+    fps_avg_len = 200
+    img_count = 0
+    ncnn_threads_set = not args.threads
+    detections = []
+    hazard_gate = HazardGate()
+    cue_planner = CuePlanner() if args.cues else None
+    trace = None
+    activity = energy = None
+    idle = False
+    if args.idle:
+        # the board also carries the control loop's ultrasonic motion (main_combined.py)
+        activity = ActivityDetector('yolo', args.idle_after, board=ActivityBoard())
+        frame_motion = FrameMotion()
+        energy = EnergyMeter('yolo')
+        t_last_infer = 0.0
+    frame_no = 0
+    prof = profiler.from_args(args, 'yolo', {
+        'model': model_path, 'source': img_source, 'resolution': user_res, 'thresh': min_thresh,
+        'threads': args.threads, 'governor': args.governor, 'target_fps': args.target_fps,
+        'cues': args.cues,
+    })
+
+    # Inference loop
+    while True:
+        t_start = time.perf_counter()
+        t_frame_ns = time.monotonic_ns()
+
+        # Read frame
+        if source_type in ['image', 'folder']:
+            if img_count >= len(imgs_list):
+                print('All images have been processed. Exiting program.')
+                sys.exit(0)
+            frame = cv2.imread(imgs_list[img_count])
+            img_count += 1
+        elif source_type in ['video', 'usb']:
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                print('Stream ended or camera error. Exiting program.')
+                break
+        elif source_type == 'bus':
+            got = cap.wait_latest(bus_frame_no)
+            if got is None:
+                continue
+            bus_frame_no, t_frame_ns, view = got
+            # the capture process reuses the slot: take a private copy (resizing
+            # makes one anyway), then drop the frame if the slot moved on meanwhile
+            frame = view.copy() if resize_to is None else cv2.resize(view, resize_to)
+            if not cap.still_valid(bus_frame_no):
+                continue
+        elif TRACE:  # picamera; the request also carries the exposure time
+            request = cap.capture_request()
+            frame = request.make_array('main')
+            sensor_ns = request.get_metadata().get('SensorTimestamp')
+            request.release()
+        else:  # picamera
+            frame = cap.capture_array()
+        frame_no += 1
+
+        # Trace context: frame id and a timestamp per stage (tracing.py)
+        if TRACE:
+            trace = Trace('detect', bus_frame_no if source_type == 'bus' else frame_no)
+            sensor = sensor_to_monotonic(sensor_ns) if source_type == 'picamera' else None
+            if sensor is not None:
+                trace.mark('sensor', sensor)
+            if source_type == 'bus':
+                trace.mark('capture', t_frame_ns).mark('bus')
+            else:
+                trace.mark('capture')
+
+        # Colour convert and resize if needed
+        frame = preprocess_frame(frame, source_type, None if source_type == 'bus' else resize_to)
+        if trace is not None:
+            trace.mark('convert')
+
+        # Idle mode: difference every frame, run the model only now and then (activity.py)
+        if activity is not None:
+            energy.add('frame')
+            if frame_motion.update(frame):
+                activity.motion('camera', t_frame_ns)
+            idle = activity.update()
+            energy.set_idle(idle)
+
+        # Apply the governor's operating point when it changes
+        if governor is not None and governor.changed:
+            point = governor.point
+            governor.changed = False
+            if point.model not in models:
+                models[point.model] = YOLO(point.model, task='detect')
+            model = models[point.model]
+            labels = model.names        # the lite model may number its classes differently
+            m_detections = detection_counters(labels)
+            imgsz = point.imgsz
+            if point.threads:
+                set_library_threads(point.threads)
+                args.threads = point.threads
+                ncnn_threads_set = False
+            print(f"GOV: operating point {point}", flush=True)
+
+        # Frames the operating point skips are only shown, not inferred
+        infer = governor is None or governor.should_infer()
+        if idle and time.monotonic() - t_last_infer < args.idle_infer_interval:
+            infer = False
+
+        # Run inference
+        if infer:
+            t_infer = time.perf_counter()
+            if imgsz is None:
+                results = model(frame, verbose=False)
+            else:
+                results = model(frame, imgsz=imgsz, verbose=False)
+            M_INFER.observe(time.perf_counter() - t_infer)
+            if trace is not None:
+                trace.mark('infer')
+            M_INFERENCES.inc()
+            if energy is not None:
+                energy.add('inference')
+                t_last_infer = time.monotonic()
+            if not ncnn_threads_set:
+                # the NCNN net only exists after the first call
+                set_ncnn_threads(model, args.threads)
+                ncnn_threads_set = True
+            xyxy, conf, cls = extract_detections(results[0])
+
+            # Process detections
+            detections = filter_detections(xyxy, conf, cls, labels, min_thresh, CLASS_THRESHOLDS)
+            # hazards go out first, on their own line type (see hazards.py)
+            for classname, _, _, _ in detections:
+                if classname in HAZARD_CLASSES and hazard_gate.allow(classname):
+                    emit(format_hazard(classname, t_frame_ns), trace)
+            for classname, _, _, _ in detections:
+                if cue_planner is None and classname not in HAZARD_CLASSES:
+                    # notify run_all_final.py, which forwards these to the ESP32
+                    emit(f"DETECT:{classname}", trace)
+                m_detections[classname].inc()
+            if cue_planner is not None:
+                cue = cue_planner.update(detections, frame.shape[1], frame.shape[0])
+                if cue is not None:
+                    emit(cue, trace)
+            if governor is not None:
+                governor.record_latency(time.perf_counter() - t_start)
+                governor.update()
+        draw_detections(frame, detections)
+        object_count = len(detections)
+
+        # Publish the followed person's bearing and range
+        if infer and target_writer is not None:
+            if intr is None or intr.width != frame.shape[1] or intr.height != frame.shape[0]:
+                intr = CameraIntrinsics(frame.shape[1], frame.shape[0])
+            target = pick_target(detections, target_bearing, intr)
+            if target is not None:
+                target_bearing, target_range = estimate_from_box(target[3], intr)
+                target_writer.publish(target_bearing, target_range, target[2], t_frame_ns)
+            elif target_bearing is not None:
+                target_bearing = None
+                target_writer.clear()
+
+        # Display framerate and count
+        if source_type in ['video', 'usb', 'picamera', 'bus']:
+            cv2.putText(frame, f'FPS: {avg_frame_rate:.2f}', (10,20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,255), 2)
+        cv2.putText(frame, f'Number of objects: {object_count}', (10,40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,255), 2)
+
+        # Show frame
+        cv2.imshow('YOLO detection results', frame)
+        if record:
+            recorder.write(frame)
+
+        key = cv2.waitKey(5)
+        if key in [ord('q'), ord('Q')]:
             break
-    else:  # picamera
-        frame_bgra = cap.capture_array()
-        frame = cv2.cvtColor(frame_bgra, cv2.COLOR_BGRA2BGR)
-
-    # Resize if needed
-    if resize:
-        frame = cv2.resize(frame, (resW, resH))
-
-    # Run inference
-    results = model(frame, verbose=False)
-    detections = results[0].boxes
-    object_count = 0
-
-    # Process detections
-    for det in detections:
-        xyxy = det.xyxy.cpu().numpy().squeeze().astype(int)
-        xmin, ymin, xmax, ymax = xyxy
-        classidx = int(det.cls.item())
-        classname = labels[classidx]
-        conf = det.conf.item()
-
-        if conf > min_thresh:
-            color = bbox_colors[classidx % len(bbox_colors)]
-            cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), color, 2)
-            label = f"{classname}: {int(conf*100)}%"
-            labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-            label_ymin = max(ymin, labelSize[1] + 10)
-            cv2.rectangle(frame, (xmin, label_ymin - labelSize[1] - 10),
-                          (xmin + labelSize[0], label_ymin + baseLine - 10), color, cv2.FILLED)
-            cv2.putText(frame, label, (xmin, label_ymin - 7), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 1)
-
-            # Debug: notify run_all.py
-            print(f"DETECT:{classname}", flush=True)
-
-            object_count += 1
-
-    # Display framerate and count
-    if source_type in ['video', 'usb', 'picamera']:
-        cv2.putText(frame, f'FPS: {avg_frame_rate:.2f}', (10,20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,255), 2)
-    cv2.putText(frame, f'Number of objects: {object_count}', (10,40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,255), 2)
-
-    # Show frame
-    cv2.imshow('YOLO detection results', frame)
+        elif key in [ord('s'), ord('S')]:
+            cv2.waitKey()
+        elif key in [ord('p'), ord('P')]:
+            cv2.imwrite('capture.png', frame)
+
+        # Update framerate
+        t_stop = time.perf_counter()
+        frame_rate_buffer.append(1.0 / (t_stop - t_start))
+        if len(frame_rate_buffer) > fps_avg_len:
+            frame_rate_buffer.pop(0)
+        avg_frame_rate = float(np.mean(frame_rate_buffer))
+        M_FRAME.observe(t_stop - t_start)
+        M_FRAMES.inc()
+        M_FPS.set(avg_frame_rate)
+        if idle:
+            time.sleep(args.idle_frame_interval)
+
+    # Cleanup
+    print(f'Average pipeline FPS: {avg_frame_rate:.2f}')
+    if source_type in ['video', 'usb']:
+        cap.release()
+    elif source_type == 'picamera':
+        cap.stop()
+    elif source_type == 'bus':
+        cap.close()
     if record:
-        recorder.write(frame)
-
-    key = cv2.waitKey(5)
-    if key in [ord('q'), ord('Q')]:
-        break
-    elif key in [ord('s'), ord('S')]:
-        cv2.waitKey()
-    elif key in [ord('p'), ord('P')]:
-        cv2.imwrite('capture.png', frame)
-
-    # Update framerate
-    t_stop = time.perf_counter()
-    frame_rate_buffer.append(1.0 / (t_stop - t_start))
-    if len(frame_rate_buffer) > fps_avg_len:
-        frame_rate_buffer.pop(0)
-    avg_frame_rate = float(np.mean(frame_rate_buffer))
-
-# Cleanup
-print(f'Average pipeline FPS: {avg_frame_rate:.2f}')
-if source_type in ['video', 'usb']:
-    cap.release()
-elif source_type == 'picamera':
-    cap.stop()
-if record:
-    recorder.release()
-cv2.destroyAllWindows()
+        recorder.release()
+    if target_writer is not None:
+        target_writer.close()
+    if governor is not None:
+        governor.close()
+    if activity is not None:
+        print(energy.format())
+        activity.board.close()
+    exporter.stop()
+    if prof is not None:
+        prof.stop()
+    cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()